@@ -0,0 +1,339 @@
+# ELISA COCEANI SM3201340
+
+"""
+Array con elementi di tipo fisso in memoria contigua e operazioni su interi array.
+
+valloc crea una lista Python: ogni elemento è un puntatore (8 byte) a un oggetto int o float allocato a parte.
+ivalloc e fvalloc creano invece un TypedArray, con gli elementi (interi o float a 64 bit) memorizzati uno dopo
+l'altro in un ndarray NumPy se è installato, altrimenti in un array del modulo array. Se directory non è None gli
+elementi stanno in un file temporaneo di quella cartella mappato in memoria, così l'array può essere più grande
+della RAM. setv scrive negli array tipizzati con gli stessi controlli delle liste; i valori che il tipo non può
+rappresentare sollevano TypeError (un float in un array di interi) o OverflowError (interi fuori dai 64 bit).
+
+Le operazioni vfill, vsum, vmin, vmax, vcopy e vdot lavorano su interi array (liste, array tipizzati o array sparsi)
+senza un ciclo interpretato; sugli array sparsi il costo dipende dal numero di elementi scritti. I risultati sono quelli del calcolo in Python: le somme di interi sono esatte (NumPy viene usato
+solo quando non c'è rischio di overflow) e le somme di float sono calcolate con math.fsum, che ha arrotondamento
+corretto e quindi non dipende dall'ordine delle addizioni né dalla rappresentazione dell'array.
+"""
+
+import math
+import mmap
+import operator
+import os
+import tempfile
+from array import array
+from fractions import Fraction
+
+from expressions import Expression, MissingVariableException, InvalidIndexError, writable_array
+from batch import np, INT_LIMIT
+from sparse import SparseArray
+
+
+INT, FLOAT = "int", "float"
+TYPECODES = {INT: "q", FLOAT: "d"}
+
+# Cartella dei file su cui mappare gli array creati da ivalloc e fvalloc (None: array in memoria)
+directory = None
+
+# Elementi scritti alla volta da fill senza NumPy
+BLOCK = 2 ** 16
+
+
+class TypedArray:
+    """
+    Array di n elementi dello stesso tipo (INT: interi a 64 bit, FLOAT: float a 64 bit), inizializzati a zero,
+    con l'interfaccia delle liste usata da setv (len, lettura e scrittura per indice).
+    path può essere il nome di un file o un file binario aperto: in quel caso gli elementi stanno nel file,
+    mappato in memoria.
+    """
+    def __init__(self, n, kind=INT, path=None):
+        if kind not in TYPECODES:
+            raise ValueError(f"Tipo di array sconosciuto: {kind}")
+        self.kind = kind
+        self.typecode = TYPECODES[kind]
+        self.file = None
+        self.map = None
+        if path is not None and n > 0:
+            self.file = open(path, "w+b") if isinstance(path, (str, os.PathLike)) else path
+            self.file.truncate(8 * n)
+            if np is not None:
+                self.data = np.memmap(self.file, dtype=self.typecode, mode="r+", shape=(n,))
+            else:
+                self.map = mmap.mmap(self.file.fileno(), 8 * n)
+                self.data = memoryview(self.map).cast(self.typecode)
+        elif np is not None:
+            self.data = np.zeros(n, dtype=self.typecode)
+        else:
+            self.data = array(self.typecode, bytes(8 * n))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        value = self.data[index]
+        return int(value) if self.kind == INT else float(value)
+
+    def __setitem__(self, index, value):
+        self.data[index] = self.convert(value)
+
+    def convert(self, value):
+        # valore da memorizzare nell'array: stesso controllo per setv, vfill e vcopy
+        kind = type(value)
+        if self.kind == INT:
+            if kind is bool:
+                return int(value)
+            if kind is not int:
+                raise TypeError(f"L'array di interi non può contenere il valore {value!r}")
+            if not -INT_LIMIT <= value < INT_LIMIT:
+                raise OverflowError(f"Il valore {value} non è rappresentabile con un intero a 64 bit")
+            return value
+        if kind not in (int, float, bool):
+            raise TypeError(f"L'array di float non può contenere il valore {value!r}")
+        return float(value)
+
+    def tolist(self):
+        return self.data.tolist()
+
+    def tobytes(self):
+        return self.data.tobytes()
+
+    def __eq__(self, other):
+        if isinstance(other, TypedArray):
+            return self.tolist() == other.tolist()
+        if isinstance(other, list):
+            return self.tolist() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # copia e pickle (ad esempio verso altri processi) producono un array in memoria con gli stessi elementi
+        return _restore, (self.kind, self.tobytes())
+
+    def __repr__(self):
+        values = self.tolist() if len(self) <= 20 else self.data[:10].tolist() + ["..."]
+        return f"{self.kind}array({', '.join(map(str, values))})"
+
+    def close(self):
+        # rilascia il file mappato in memoria; l'array diventa vuoto
+        if self.file is None:
+            return
+        if self.map is not None:
+            self.data.release()
+            self.map.close()
+        else:
+            self.data.flush()
+        self.data = np.zeros(0, dtype=self.typecode) if np is not None else array(self.typecode)
+        self.file.close()
+        self.file = self.map = None
+
+
+def _restore(kind, data):
+    result = TypedArray(0, kind)
+    if np is not None:
+        result.data = np.frombuffer(data, dtype=result.typecode).copy()
+    else:
+        result.data = array(result.typecode, data)
+    return result
+
+
+def allocate(n, kind):
+    # array tipizzato creato da ivalloc e fvalloc: in memoria oppure in un file temporaneo di directory
+    if directory is None:
+        return TypedArray(n, kind)
+    return TypedArray(n, kind, tempfile.TemporaryFile(dir=directory))
+
+
+# --- argomenti delle operazioni ---
+
+def value(arg, env):
+    # argomento valutato se è un'espressione, letto dall'ambiente se è una variabile, altrimenti costante
+    if isinstance(arg, Expression):
+        return arg.evaluate(env)
+    if isinstance(arg, str):
+        if arg not in env:
+            raise MissingVariableException(f"La variabile {arg} non è presente nell'ambiente")
+        return env[arg]
+    return arg
+
+
+def lookup(name, env, write=False):
+    # array name dell'ambiente; con write l'array viene modificato sul posto (vedi writable_array)
+    name = str(name)
+    if name not in env:
+        raise MissingVariableException(f"L'array {name} non è presente nell'ambiente")
+    return writable_array(env, name) if write else env[name]
+
+
+def position(arg, env):
+    n = value(arg, env)
+    if not isinstance(n, int) or n < 0:
+        raise InvalidIndexError(f" La dimensione dell'array {n} deve essere un numero intero positivo")
+    return n
+
+
+def _numpy(values):
+    # True se gli elementi sono in un ndarray
+    return isinstance(values, TypedArray) and np is not None and isinstance(values.data, np.ndarray)
+
+
+def _sum(values):
+    # somma esatta se gli elementi sono interi, con arrotondamento corretto se c'è almeno un float
+    if any(type(item) is float for item in values):
+        return math.fsum(values)
+    return sum(values)
+
+
+def _repeated_sum(items, default, count):
+    # come _sum(items + [default] * count), senza costruire le copie di default
+    if not count:
+        return _sum(items)
+    if type(default) is not float and not any(type(item) is float for item in items):
+        return sum(items) + default * count
+    if default == 0 or any(type(item) is float and not math.isfinite(item) for item in items + [default]):
+        # gli zeri ripetuti e i valori infiniti o NaN non cambiano il risultato se compaiono una volta sola
+        return _sum(items + [default])
+    # somma esatta con le frazioni, arrotondata una volta sola come math.fsum
+    return float(sum(map(Fraction, items), Fraction(default) * count))
+
+
+def _same_default(first, second):
+    # True se gli elementi non scritti dei due array sparsi sono lo stesso intero
+    return type(first.default) in (int, bool) and type(first.default) is type(second.default) \
+        and first.default == second.default
+
+
+def _elements(values):
+    # elementi dell'array come valori Python (gli scalari NumPy avrebbero l'overflow a 64 bit)
+    if not isinstance(values, TypedArray):
+        return values
+    return values.tolist() if _numpy(values) else values.data
+
+
+def _bound(values):
+    # massimo valore assoluto degli elementi di un array di interi NumPy
+    return max(-int(values.data.min()), int(values.data.max()))
+
+
+# --- operazioni su interi array ---
+
+def fill(x, item, env):
+    target = lookup(x, env, write=True)
+    item = value(item, env)
+    if isinstance(target, SparseArray):
+        target.fill(item)
+        return
+    if not isinstance(target, TypedArray):
+        target[:] = [item] * len(target)
+        return
+    item = target.convert(item)
+    if np is not None and isinstance(target.data, np.ndarray):
+        target.data.fill(item)
+        return
+    block = array(target.typecode, [item]) * min(BLOCK, len(target))
+    for start in range(0, len(target), BLOCK):
+        stop = min(start + BLOCK, len(target))
+        target.data[start:stop] = block[:stop - start]
+
+
+def total(x, env):
+    values = lookup(x, env)
+    if isinstance(values, SparseArray):
+        return _repeated_sum(list(values.values.values()), values.default, values.hidden())
+    if not isinstance(values, TypedArray):
+        return _sum(values)
+    if values.kind == FLOAT:
+        return math.fsum(values.tolist() if _numpy(values) else values.data)
+    if _numpy(values):
+        if not len(values):
+            return 0
+        if _bound(values) * len(values) < INT_LIMIT:
+            return int(values.data.sum())
+        return sum(values.tolist())
+    return sum(values.data)
+
+
+def extreme(x, env, function):
+    # minimo o massimo (function: min o max) degli elementi
+    values = lookup(x, env)
+    if not len(values):
+        raise IndexError(f"Errore: l'array {x} è vuoto")
+    if isinstance(values, SparseArray):
+        # con valori uguali (o NaN) il risultato dipende dalla posizione: gli elementi restano in ordine di indice
+        # e gli elementi non scritti sono rappresentati dal primo di loro
+        first = values.first_hidden()
+        items = values.items()
+        if first is None:
+            return function(item for _, item in items)
+        return function([item for i, item in items if i < first] + [values.default] +
+                        [item for i, item in items if i > first])
+    if not isinstance(values, TypedArray):
+        return function(values)
+    if _numpy(values):
+        result = values.data.min() if function is min else values.data.max()
+        if values.kind == INT:
+            return int(result)
+        if not math.isnan(result):
+            return float(result)
+        # con NaN il risultato di min e max di Python dipende dalla posizione: viene calcolato come in Python
+        return function(values.tolist())
+    return function(values.data)
+
+
+def copy(source, start, stop, target, at, env):
+    # copia gli elementi source[start:stop] in target a partire dalla posizione at
+    start = position(start, env)
+    stop = position(stop, env)
+    at = position(at, env)
+    origin = lookup(source, env)
+    destination = lookup(target, env, write=True)
+    count = stop - start
+    if stop > len(origin) or count < 0 or at + count > len(destination):
+        raise IndexError("Errore: si sta provando ad accedere ad un indice che non esiste")
+
+    if isinstance(origin, TypedArray) and isinstance(destination, TypedArray) and origin.kind == destination.kind:
+        chunk = origin.data[start:stop]
+        if not isinstance(chunk, np.ndarray if np is not None else array):
+            chunk = array(origin.typecode, chunk.tobytes())   # copia della vista: origine e destinazione possono sovrapporsi
+        destination.data[at:at + count] = chunk
+        return
+    if isinstance(origin, SparseArray) and isinstance(destination, SparseArray) and _same_default(origin, destination):
+        moved = {i - start + at: item for i, item in origin.values.items() if start <= i < stop}
+        for i in [i for i in destination.values if at <= i < at + count]:
+            del destination.values[i]
+        destination.values.update(moved)
+        return
+    items = origin.data[start:stop].tolist() if isinstance(origin, TypedArray) else origin[start:stop]
+    if not isinstance(destination, TypedArray):
+        destination[at:at + count] = items
+        return
+    items = [destination.convert(item) for item in items]
+    destination.data[at:at + count] = items if np is not None and isinstance(destination.data, np.ndarray) \
+        else array(destination.typecode, items)
+
+
+def dot(x, y, env):
+    left = lookup(x, env)
+    right = lookup(y, env)
+    if len(left) != len(right):
+        raise IndexError(f"Errore: gli array {x} e {y} hanno dimensioni diverse")
+    if _numpy(left) and _numpy(right):
+        if left.kind == INT and right.kind == INT:
+            if not len(left):
+                return 0
+            if _bound(left) * _bound(right) * len(left) < INT_LIMIT:
+                return int(np.dot(left.data, right.data))
+        else:
+            # i prodotti di NumPy sono quelli di Python; la somma viene fatta con math.fsum
+            return math.fsum((left.data * right.data).tolist())
+    if isinstance(left, SparseArray) and isinstance(right, SparseArray) and left.default * right.default == 0:
+        # i prodotti degli elementi non scritti in nessuno dei due array sono tutti zero: ne basta uno
+        keys = left.values.keys() | right.values.keys()
+        products = [left[i] * right[i] for i in keys]
+        if len(keys) < len(left):
+            products.append(left.default * right.default)
+        return _sum(products)
+    items = [_elements(values) for values in (left, right)]
+    if any(isinstance(values, TypedArray) and values.kind == FLOAT for values in (left, right)):
+        return math.fsum(map(operator.mul, *items))
+    return _sum(list(map(operator.mul, *items)))
@@ -0,0 +1,302 @@
+# ELISA COCEANI SM3201340
+
+"""
+Valutazione di una stessa espressione su molti ambienti.
+
+I valori delle variabili sono dati per colonne: un array (o una lista) per ogni variabile, con un elemento per riga.
+Se l'albero contiene solo costanti, variabili, operazioni aritmetiche e di confronto e If, viene valutato una sola
+volta con le operazioni vettoriali di NumPy (If diventa np.where); altrimenti, o se NumPy non è installato,
+ogni riga viene valutata con evaluate e il risultato indica il motivo.
+
+Gli errori non interrompono il batch: le righe in cui la valutazione solleverebbe un'eccezione (ad esempio una
+divisione per zero) vengono segnate durante il calcolo vettoriale e poi valutate di nuovo una alla volta con evaluate,
+così l'eccezione riportata per la riga è esattamente quella di evaluate. Lo stesso accade per le righe in cui il
+risultato di NumPy potrebbe essere diverso da quello di Python (interi oltre 64 bit, potenze con risultato complesso
+o troppo grande). Le potenze tra float sono calcolate con la funzione vettoriale di NumPy, che può differire
+da quella di Python nell'ultima cifra.
+"""
+
+try:
+    import numpy as np
+except ImportError:   # numpy è opzionale: senza numpy ogni riga viene valutata con evaluate
+    np = None
+
+# Limiti oltre i quali gli interi di NumPy (a 64 bit) o la conversione in float non sono esatti
+# (definiti prima degli import: arrays li importa da batch anche quando batch è importato per primo)
+INT_LIMIT = 2 ** 63
+FLOAT_EXACT = 2 ** 53
+
+from expressions import (Expression, Variable, Constant, Addition, Subtraction, Division,
+                         Multiplication, Power, Modulus, Reciprocal, AbsoluteValue,
+                         Grater, GraterEq, Equal, NotEqual, Less, LessEq, If, Setq, While, Print, d)
+from tree import walk
+
+
+# Operazioni che hanno un equivalente vettoriale
+ARITHMETIC = (Addition, Subtraction, Division, Multiplication, Power, Modulus, Reciprocal, AbsoluteValue)
+COMPARISONS = (Grater, GraterEq, Equal, NotEqual, Less, LessEq)
+
+# Motivi per cui alcuni nodi costringono a valutare le righe una alla volta
+REASONS = {
+    Setq: "setq modifica l'ambiente durante la valutazione",
+    While: "il numero di iterazioni di while dipende dai valori di ogni riga",
+    Print: "print deve stampare i valori riga per riga",
+}
+
+_names = {operation: item for item, operation in d.items()}
+
+
+def scalar(value):
+    # True se il valore può essere un elemento di un array NumPy senza cambiare il risultato delle operazioni
+    return type(value) in (bool, float) or (type(value) is int and -INT_LIMIT <= value < INT_LIMIT)
+
+
+def unsupported(tree):
+    # motivo per cui l'albero non ha una versione vettoriale, None se ce l'ha
+    for node in walk(tree):
+        kind = type(node)
+        if kind in REASONS:
+            return REASONS[kind]
+        if kind not in (Constant, Variable, If) + ARITHMETIC + COMPARISONS:
+            return f"il nodo {_names.get(kind, kind.__name__)} non ha una versione vettoriale"
+        for arg in [node.value] if kind is Constant else getattr(node, "args", []):
+            if not isinstance(arg, (Expression, str)) and not scalar(arg):
+                return f"la costante {arg!r} non è rappresentabile in NumPy"
+        if kind is If:
+            # la condizione può essere il nome di una variabile, i rami no: una stringa viene ritornata così com'è
+            for arg in (node.true, node.false) if isinstance(node.cond, str) else (node.true, node.false, node.cond):
+                if not isinstance(arg, Expression) and not scalar(arg):
+                    return f"la costante {arg!r} non è rappresentabile in NumPy"
+    return None
+
+
+class BatchResult:
+    """
+    Risultato di evaluate_batch.
+
+    values contiene un valore per riga (un array NumPy se la valutazione è vettoriale, altrimenti una lista);
+    errors associa ad ogni riga in cui la valutazione ha sollevato un'eccezione l'eccezione stessa, e in values
+    quella riga contiene un valore non significativo. vectorized indica se è stato usato NumPy, reason perché no.
+    """
+    def __init__(self, values, errors, vectorized, reason=None, rechecked=0):
+        self.values = values
+        self.errors = errors
+        self.vectorized = vectorized
+        self.reason = reason
+        self.rechecked = rechecked   # righe valutate di nuovo con evaluate dopo il calcolo vettoriale
+
+    def __len__(self):
+        return len(self.values)
+
+    def __str__(self):
+        mode = "vettoriale" if self.vectorized else f"riga per riga ({self.reason})"
+        return (f"righe: {len(self.values)}, errori: {len(self.errors)}, valutazione {mode}, "
+                f"righe ricontrollate: {self.rechecked}")
+
+
+class BatchEvaluator:
+    def __init__(self, tree, columns, rows=None):
+        self.tree = tree
+        self.columns = dict(columns)
+        lengths = {len(column) for column in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Le colonne devono avere tutte lo stesso numero di righe")
+        if lengths:
+            n = lengths.pop()
+            if rows is not None and rows != n:
+                raise ValueError(f"Le colonne hanno {n} righe, non {rows}")
+            rows = n
+        if rows is None:
+            raise ValueError("Senza colonne bisogna indicare il numero di righe")
+        self.rows = rows
+        self.lists = {}   # colonne convertite in liste di valori Python, per la valutazione riga per riga
+
+    def run(self):
+        reason = self.check()
+        if reason is not None:
+            values, errors = self.each(range(self.rows))
+            return BatchResult(values, errors, False, reason)
+
+        with np.errstate(all="ignore"):
+            values, flags = self.visit(self.tree)
+        values = np.array(values)   # copia: il risultato può essere una colonna passata come argomento
+        rows = np.flatnonzero(flags).tolist()
+        results, errors = self.each(rows)
+        for row, value in zip(rows, results):
+            if row in errors:
+                continue
+            if values.dtype != object and (type(value) is not type(values[:1].tolist()[0])
+                                           or np.result_type(values.dtype, np.asarray(value).dtype) != values.dtype):
+                # valore di un tipo diverso da quello dell'array (ad esempio un intero in un array di float,
+                # un intero oltre 64 bit o un numero complesso): l'array diventa di oggetti Python
+                values = values.astype(object)
+            values[row] = value
+        return BatchResult(values, errors, True, rechecked=len(rows))
+
+    # --- valutazione riga per riga ---
+
+    def column(self, name):
+        if name not in self.lists:
+            column = self.columns[name]
+            self.lists[name] = column.tolist() if hasattr(column, "tolist") else list(column)
+        return self.lists[name]
+
+    def each(self, rows):
+        # valuta le righe indicate con evaluate, raccogliendo le eccezioni
+        names = list(self.columns)
+        columns = [self.column(name) for name in names]
+        values = []
+        errors = {}
+        for row in rows:
+            env = {name: column[row] for name, column in zip(names, columns)}
+            try:
+                values.append(self.tree.evaluate(env))
+            except Exception as ex:
+                values.append(None)
+                errors[row] = ex
+        return values, errors
+
+    # --- valutazione vettoriale ---
+
+    def check(self):
+        # motivo per cui l'albero non può essere valutato con NumPy, None se può esserlo
+        if np is None:
+            return "numpy non è installato"
+        reason = unsupported(self.tree)
+        if reason is not None:
+            return reason
+        for name, column in self.columns.items():
+            kind = np.asarray(column).dtype
+            if kind.kind not in "biuf" or kind == np.uint64:
+                return f"la colonna {name} non contiene numeri ({kind})"
+        return None
+
+    def full(self, value):
+        return np.full(self.rows, value)
+
+    def array(self, name):
+        # colonna della variabile come array NumPy; se manca, tutte le righe vengono valutate con evaluate
+        if name not in self.columns:
+            return np.zeros(self.rows, dtype=np.int64), np.ones(self.rows, dtype=bool)
+        column = np.asarray(self.columns[name])
+        if column.dtype.kind in "iu":
+            column = column.astype(np.int64, copy=False)
+        elif column.dtype.kind == "f":
+            column = column.astype(np.float64, copy=False)
+        return column, np.zeros(self.rows, dtype=bool)
+
+    def operand(self, arg):
+        # stessi casi di Operation.evaluate: sottoespressione, nome di una variabile o valore
+        if isinstance(arg, Expression):
+            return self.visit(arg)
+        if isinstance(arg, str):
+            return self.array(arg)
+        return self.full(arg), np.zeros(self.rows, dtype=bool)
+
+    def visit(self, node):
+        # ritorna (valori, righe da ricontrollare)
+        kind = type(node)
+        if kind is Constant:
+            return self.full(node.value), np.zeros(self.rows, dtype=bool)
+        if kind is Variable:
+            return self.array(node.name)
+        if kind is If:
+            return self.branch(node)
+
+        args = []
+        flags = np.zeros(self.rows, dtype=bool)
+        for arg in node.args:
+            value, arg_flags = self.operand(arg)
+            args.append(value)
+            flags |= arg_flags
+        if kind in COMPARISONS:
+            if not all(arg.dtype.kind in "bi" for arg in args) and any(arg.dtype.kind == "i" for arg in args):
+                # Python confronta interi e float in modo esatto, NumPy converte gli interi in float
+                for arg in args:
+                    if arg.dtype.kind == "i":
+                        flags |= np.abs(arg) > FLOAT_EXACT
+            return node.op(*args), flags
+        # in Python True + True vale 2: i booleani vengono convertiti in interi prima dei calcoli
+        args = [arg.astype(np.int64) if arg.dtype == np.bool_ else arg for arg in args]
+        value, unsafe = self.arithmetic(kind, args)
+        return value, flags | unsafe
+
+    def branch(self, node):
+        if isinstance(node.cond, Expression):
+            cond, flags = self.visit(node.cond)
+        elif isinstance(node.cond, str):
+            cond, flags = self.array(node.cond)
+        else:
+            cond, flags = self.full(node.cond), np.zeros(self.rows, dtype=bool)
+        false, false_flags = self.operand(node.false) if isinstance(node.false, Expression) else \
+            (self.full(node.false), np.zeros(self.rows, dtype=bool))
+        if cond.dtype != np.bool_:
+            # If.evaluate sceglie il ramo vero solo se la condizione è True: un numero sceglie sempre il ramo falso
+            return false, flags | false_flags
+        true, true_flags = self.operand(node.true) if isinstance(node.true, Expression) else \
+            (self.full(node.true), np.zeros(self.rows, dtype=bool))
+        # gli errori del ramo non scelto vengono ignorati, come in If.evaluate
+        value = np.where(cond, true, false)
+        flags |= np.where(cond, true_flags, false_flags)
+        if true.dtype != false.dtype:
+            # np.where converte i due rami nello stesso tipo: le righe convertite vengono ricontrollate
+            flags |= np.where(cond, true.dtype != value.dtype, false.dtype != value.dtype)
+        return value, flags
+
+    def arithmetic(self, kind, args):
+        # ritorna (valori, righe in cui il risultato di NumPy non è quello di Python)
+        integer = all(arg.dtype.kind == "i" for arg in args)
+
+        if kind is AbsoluteValue:
+            x, = args
+            return np.abs(x), (x == -INT_LIMIT) if integer else np.zeros(self.rows, dtype=bool)
+
+        if kind is Reciprocal:
+            x, = args
+            unsafe = x == 0
+            if integer:
+                unsafe |= np.abs(x) > FLOAT_EXACT
+            return 1 / x, unsafe
+
+        x, y = args
+        if kind is Division or kind is Modulus:
+            unsafe = y == 0
+            if kind is Division:
+                value = x / y
+                if integer:
+                    # Python divide gli interi in modo esatto, NumPy li converte prima in float
+                    unsafe |= (np.abs(x) > FLOAT_EXACT) | (np.abs(y) > FLOAT_EXACT)
+            else:
+                value = np.mod(x, y)
+            return value, unsafe
+
+        if kind is Power:
+            if integer and (y < 0).any():
+                # in Python un intero elevato a un intero negativo è un float
+                x, y = x.astype(np.float64), y.astype(np.float64)
+                value = x ** y
+                # le righe con esponente positivo danno un intero in Python e vengono ricontrollate
+                unsafe = (y >= 0) | (x == 0) & (y < 0) | (np.abs(value) > FLOAT_EXACT)
+                return value, unsafe
+            value = x ** y
+            if integer:
+                return value, np.abs(x.astype(np.float64) ** y.astype(np.float64)) >= INT_LIMIT
+            # risultato complesso (nan) o troppo grande (OverflowError o ZeroDivisionError in Python)
+            finite = np.isfinite(x) & np.isfinite(y)
+            return value, finite & ~np.isfinite(value)
+
+        value = {Addition: np.add, Subtraction: np.subtract, Multiplication: np.multiply}[kind](x, y)
+        if integer:
+            # gli interi di Python non hanno limiti: le righe che superano i 64 bit vengono ricontrollate
+            shadow = {Addition: np.add, Subtraction: np.subtract, Multiplication: np.multiply}[kind](
+                x.astype(np.float64), y.astype(np.float64))
+            return value, np.abs(shadow) >= INT_LIMIT
+        return value, np.zeros(self.rows, dtype=bool)
+
+
+def evaluate_batch(tree, columns, rows=None):
+    """
+    Valuta l'albero su ogni riga delle colonne: columns associa al nome di ogni variabile un array (o una lista)
+    con un valore per riga. rows è necessario solo se l'espressione non usa colonne.
+    """
+    return BatchEvaluator(tree, columns, rows).run()
@@ -0,0 +1,746 @@
+# ELISA COCEANI SM3201340
+
+import argparse
+import asyncio
+import copy
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from expressions import Expression, Interner, d
+from tree import size, walk
+import arrays
+import batch
+import budget
+import bytecode
+import cache
+import frames
+import environment
+import incremental
+import inline
+import iterative
+import loops
+import memo
+import optimizer
+import output
+import parallel
+import pfor
+import profiler
+import server
+import sparse
+import specialize
+import transpiler
+import vectorize
+
+
+# Programmi di prova con cicli: N viene sostituito con il numero di iterazioni
+LOOP_PROGRAMS = {
+    # somma dei primi N numeri con for e setq
+    "for_sum": "s 0 +  s i + s setq N 0 i for  s alloc  prog3",
+    # contatore incrementato da un while
+    "while_count": "x 0 +  x 1 + x setq N x < while  x alloc  prog3",
+    # riempimento di un array con valloc e setv
+    "array_fill": "nop  i i * i a setv N 0 i for  N a valloc  prog3",
+    # ciclo con un if nel corpo
+    "for_if": "s 0 +  s i + s setq  s 1 + s setq  2 i % 0 = if  N 0 i for  s alloc  prog3",
+}
+
+
+def program(name, n):
+    # costruisce il testo del programma con n iterazioni
+    return LOOP_PROGRAMS[name].replace("N", str(n))
+
+
+def timeit(f, repeat=5):
+    # ritorna il tempo minimo (in secondi) su repeat esecuzioni
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_vm(n=50000, repeat=5):
+    # confronta la valutazione dell'albero con la macchina virtuale sui programmi con cicli
+    print(f"{'programma':<14} {'albero (s)':>12} {'vm (s)':>12} {'speedup':>9}")
+    for name in LOOP_PROGRAMS:
+        tree = Expression.from_program(program(name, n), d)
+        code = bytecode.compile_tree(tree)
+
+        # i due motori devono dare lo stesso risultato
+        assert tree.evaluate({}) == code.evaluate({})
+
+        t_tree = timeit(lambda: tree.evaluate({}), repeat)
+        t_vm = timeit(lambda: code.evaluate({}), repeat)
+        print(f"{name:<14} {t_tree:>12.4f} {t_vm:>12.4f} {t_tree / t_vm:>8.2f}x")
+
+
+def bench_transpiler(n=50000, repeat=5):
+    # confronta la valutazione dell'albero con la funzione Python generata dal transpiler
+    print(f"{'programma':<14} {'albero (s)':>12} {'python (s)':>12} {'speedup':>9}")
+    for name in LOOP_PROGRAMS:
+        tree = Expression.from_program(program(name, n), d)
+        function = transpiler.transpile(tree)
+
+        assert tree.evaluate({}) == function({})
+
+        t_tree = timeit(lambda: tree.evaluate({}), repeat)
+        t_python = timeit(lambda: function({}), repeat)
+        print(f"{name:<14} {t_tree:>12.4f} {t_python:>12.4f} {t_tree / t_python:>8.2f}x")
+
+    # molte valutazioni di un'espressione senza cicli su ambienti diversi
+    tree = Expression.from_program("x y * 2 ** x y - abs 3 x % - 0 y > if", d)
+    function = transpiler.transpile(tree)
+    envs = [{"x": i + 1, "y": i % 7 - 3} for i in range(n)]
+    t_tree = timeit(lambda: [tree.evaluate(env) for env in envs], repeat)
+    t_python = timeit(lambda: [function(env) for env in envs], repeat)
+    print(f"{'many_envs':<14} {t_tree:>12.4f} {t_python:>12.4f} {t_tree / t_python:>8.2f}x")
+
+
+def chain_program(n):
+    # programma con n addizioni in catena: lo stack del parser rimane piccolo
+    return "1" + " 1 +" * n
+
+
+def wide_program(n):
+    # programma con n costanti seguite da n - 1 addizioni: lo stack del parser arriva a n elementi
+    return " ".join(["1"] * n) + " +" * (n - 1)
+
+
+def bench_parser(sizes=(1000, 10000, 100000, 300000), repeat=3):
+    # tempo di parsing di programmi di dimensione crescente, da stringa e da file
+    print(f"{'programma':<8} {'elementi':>9} {'MB':>6} {'from_program':>13} {'from_stream':>12} {'file':>9} {'us/elem':>8}")
+    for shape, make in (("chain", chain_program), ("wide", wide_program)):
+        for n in sizes:
+            text = make(n)
+            t_program = timeit(lambda: Expression.from_program(text, d), repeat)
+            t_stream = timeit(lambda: Expression.from_stream(text, d), repeat)
+            t_file = timeit(lambda: Expression.from_stream(io.StringIO(text), d), repeat)
+            items = len(text.split())
+            print(f"{shape:<8} {items:>9} {len(text) / 1e6:>6.1f} {t_program:>13.4f} {t_stream:>12.4f} "
+                  f"{t_file:>9.4f} {t_stream / items * 1e6:>8.2f}")
+
+
+def bench_cache(n=2000, programs=8, repeat=3):
+    # n richieste che ripetono pochi programmi: parsing ogni volta contro cache degli alberi
+    texts = [chain_program(200 + i) for i in range(programs)]
+    requests = [texts[i % programs] for i in range(n)]
+    parse_cache = cache.ParseCache(maxsize=programs)
+
+    t_parse = timeit(lambda: [Expression.from_program(text, d) for text in requests], repeat)
+    t_cache = timeit(lambda: [parse_cache.get(text, d) for text in requests], repeat)
+    print(f"parsing: {t_parse:.4f} s   cache: {t_cache:.4f} s   speedup: {t_parse / t_cache:.1f}x")
+    print(parse_cache)
+
+
+def bench_fold(n=20000, repeat=5):
+    # ciclo con sottoespressioni costanti e identità nel corpo, prima e dopo la passata di constant folding
+    text = "s 0 +  s 2 3 ** 4 * i 1 * abs abs + 0 + + s setq  N 0 i for  s alloc  prog3".replace("N", str(n))
+    tree = Expression.from_program(text, d)
+    folded, folder = optimizer.fold_constants(tree)
+    assert tree.evaluate({}) == folded.evaluate({})
+
+    t_tree = timeit(lambda: tree.evaluate({}), repeat)
+    t_folded = timeit(lambda: folded.evaluate({}), repeat)
+    print(folder)
+    print(f"originale: {t_tree:.4f} s   ottimizzato: {t_folded:.4f} s   speedup: {t_tree / t_folded:.2f}x")
+
+
+def bench_frames(n=50000, repeat=5):
+    # confronta la valutazione con l'ambiente dizionario e con le variabili risolte in posizioni del frame
+    print(f"{'programma':<14} {'albero (s)':>12} {'frame (s)':>12} {'speedup':>9}")
+    for name in LOOP_PROGRAMS:
+        tree = Expression.from_program(program(name, n), d)
+        resolved = frames.resolve(tree)
+
+        env_tree, env_frame = {}, {}
+        assert tree.evaluate(env_tree) == resolved.evaluate(env_frame) and env_tree == env_frame
+
+        t_tree = timeit(lambda: tree.evaluate({}), repeat)
+        t_frame = timeit(lambda: resolved.evaluate({}), repeat)
+        print(f"{name:<14} {t_tree:>12.4f} {t_frame:>12.4f} {t_tree / t_frame:>8.2f}x")
+
+
+def bench_batch(rows=100000, repeat=3):
+    # una espressione senza cicli su molti ambienti: una chiamata di evaluate per riga contro evaluate_batch
+    tree = Expression.from_program("2 x ** 3 y * + x y / abs - 0 0 y = if", d)
+    columns = {"x": [i % 97 - 48 for i in range(rows)], "y": [i % 13 - 6 for i in range(rows)]}
+    envs = [{"x": x, "y": y} for x, y in zip(columns["x"], columns["y"])]
+    if batch.np is not None:
+        columns = {name: batch.np.array(column) for name, column in columns.items()}
+
+    def each():
+        # valutazione riga per riga: un errore non interrompe le altre righe
+        for env in envs:
+            try:
+                tree.evaluate(env)
+            except Exception:
+                pass
+
+    result = batch.evaluate_batch(tree, columns)
+    t_rows = timeit(each, repeat)
+    t_batch = timeit(lambda: batch.evaluate_batch(tree, columns), repeat)
+    print(result)
+    print(f"evaluate per riga: {t_rows:.4f} s   batch: {t_batch:.4f} s   speedup: {t_rows / t_batch:.1f}x")
+
+
+def bench_vectorize(n=200000, repeat=3):
+    # ciclo for che riempie un array, eseguito un'iterazione alla volta e con NumPy
+    text = "nop  7 i i * 3 i * + % i a setv N 0 i for  N a valloc  prog3".replace("N", str(n))
+    tree = Expression.from_program(text, d)
+    vectorized, vectorizer = vectorize.vectorize_loops(tree)
+    print(vectorizer)
+
+    env_tree, env_vector = {}, {}
+    tree.evaluate(env_tree)
+    with vectorize.collect() as statistics:
+        vectorized.evaluate(env_vector)
+    assert env_tree == env_vector and statistics.fallbacks == 0
+
+    t_tree = timeit(lambda: tree.evaluate({}), repeat)
+    t_vector = timeit(lambda: vectorized.evaluate({}), repeat)
+    print(f"albero: {t_tree:.4f} s   vettorizzato: {t_vector:.4f} s   speedup: {t_tree / t_vector:.1f}x")
+
+
+def bench_parallel(programs=400, n=2000, repeat=3):
+    # molti programmi indipendenti: valutazione in questo processo e su un processo per core
+    texts = [program(name, n + i) for i in range(programs // len(LOOP_PROGRAMS)) for name in LOOP_PROGRAMS]
+    pairs = [(text, {}) for text in texts]
+    workers = os.cpu_count() or 1
+
+    assert [r.value for r in parallel.evaluate_many(pairs, workers=1)] == \
+        [r.value for r in parallel.evaluate_many(pairs, workers=max(2, workers))]
+
+    t_serial = timeit(lambda: parallel.evaluate_many(pairs, workers=1), repeat)
+    print(f"programmi: {len(pairs)}, core: {workers}")
+    print(f"{'processi':>9} {'tempo (s)':>10} {'speedup':>9}")
+    print(f"{1:>9} {t_serial:>10.4f} {1:>8.2f}x")
+    for count in sorted({2, workers} - {1}):
+        with parallel.ProcessPoolExecutor(max_workers=count) as executor:
+            parallel.evaluate_many(pairs[:count], workers=count, executor=executor)   # avvio dei processi
+            t_pool = timeit(lambda: parallel.evaluate_many(pairs, workers=count, executor=executor), repeat)
+        print(f"{count:>9} {t_pool:>10.4f} {t_serial / t_pool:>8.2f}x")
+
+
+def bench_pfor(n=200000, repeat=3):
+    # ciclo che riempie un array: for in sequenza e pfor con un numero crescente di processi
+    text = "nop  1000 7 i i * % 3 i ** + %  i a setv N 0 i LOOP  N a valloc  prog3".replace("N", str(n))
+    serial = Expression.from_program(text.replace("LOOP", "for"), d)
+    parallel_tree = Expression.from_program(text.replace("LOOP", "pfor"), d)
+
+    t_serial = timeit(lambda: serial.evaluate({}), repeat)
+    print(f"core: {os.cpu_count()}")
+    print(f"{'processi':>9} {'tempo (s)':>10} {'speedup':>9}")
+    print(f"{'for':>9} {t_serial:>10.4f} {1:>8.2f}x")
+    for count in sorted({2, os.cpu_count() or 1} - {1}):
+        pfor.workers = count
+        env_serial, env_parallel = {}, {}
+        serial.evaluate(env_serial)
+        with pfor.collect() as statistics:
+            parallel_tree.evaluate(env_parallel)   # avvia anche i processi
+        assert env_serial == env_parallel and statistics.serial == 0
+        t_parallel = timeit(lambda: parallel_tree.evaluate({}), repeat)
+        print(f"{count:>9} {t_parallel:>10.4f} {t_serial / t_parallel:>8.2f}x")
+    # lo stesso array riempito da dieci pfor: resta in memoria condivisa tra un ciclo e l'altro
+    text = "nop  1000 7 i i * % 3 i ** + %  i a setv N 0 i LOOP  10 0 r for  N a valloc  prog3".replace("N", str(n))
+    serial = Expression.from_program(text.replace("LOOP", "for"), d)
+    parallel_tree = Expression.from_program(text.replace("LOOP", "pfor"), d)
+    t_serial = timeit(lambda: serial.evaluate({}), 1)
+    print(f"{'10 cicli':>9} {'for':>10} {t_serial:.4f} s")
+    for count in sorted({2, os.cpu_count() or 1} - {1}):
+        pfor.workers = count
+        t_parallel = timeit(lambda: parallel_tree.evaluate({}), 1)
+        print(f"{'10 cicli':>9} {count:>10} {t_parallel:.4f} s  {t_serial / t_parallel:>6.2f}x")
+    pfor.workers = None
+
+
+# Programmi profondi: N viene sostituito con la profondità dell'albero o delle chiamate
+DEEP_PROGRAMS = {
+    # catena di addizioni annidate
+    "chain": lambda n: chain_program(n),
+    # catena di prog2 annidati
+    "prog2": lambda n: "nop" + " nop prog2" * n,
+    # subroutine che chiama se stessa n volte
+    "call": lambda n: f"f call  nop f call 1 n - n setq prog2 0 n > if f desub  {n} n setq  n alloc  prog4",
+}
+
+
+def bench_deep(sizes=(100000, 300000), repeat=3):
+    # valutazione ricorsiva e con lo stack esplicito; per gli alberi profondi solo quella senza ricorsione
+    print(f"{'programma':<9} {'profondità':>11} {'ricorsiva (s)':>14} {'iterativa (s)':>14} {'memoria (MB)':>13}")
+    for name, make in DEEP_PROGRAMS.items():
+        for n in (200,) + sizes:
+            tree = Expression.from_program(make(n), d)
+            t_iterative = timeit(lambda: iterative.evaluate(tree, {}), repeat)
+            tracemalloc.start()
+            iterative.evaluate(tree, {})
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+            try:
+                t_recursive = f"{timeit(lambda: tree.evaluate({}), repeat):>14.4f}"
+            except RecursionError:
+                t_recursive = f"{'RecursionError':>14}"
+            print(f"{name:<9} {n:>11} {t_recursive} {t_iterative:>14.4f} {peak:>13.1f}")
+
+
+def bench_profile(n=20000, repeat=3):
+    # costo della profilazione: evaluate normale, valutazione iterativa e valutazione con il profiler
+    print(f"{'programma':<14} {'evaluate (s)':>13} {'iterativa (s)':>14} {'profiler (s)':>13}")
+    for name in LOOP_PROGRAMS:
+        tree = Expression.from_program(program(name, n), d)
+        t_tree = timeit(lambda: tree.evaluate({}), repeat)
+        t_iterative = timeit(lambda: iterative.evaluate(tree, {}), repeat)
+        t_profile = timeit(lambda: profiler.profile(tree, {}), repeat)
+        print(f"{name:<14} {t_tree:>13.4f} {t_iterative:>14.4f} {t_profile:>13.4f}")
+    print(profiler.profile(tree, {})[1].report(limit=5))
+
+
+def bench_arrays(n=1000000, repeat=3):
+    # array di n interi: memoria di valloc e ivalloc, operazioni su tutto l'array contro i cicli for interpretati
+    print(f"numpy: {'sì' if batch.np is not None else 'no'}")
+    print(f"{'array':<8} {'memoria (MB)':>13}")
+    for name in ("valloc", "ivalloc"):
+        tree = Expression.from_program(f"i 7 + i a setv {n} 0 i for  {n} a {name}  prog2", d)
+        env = {}
+        tracemalloc.start()
+        tree.evaluate(env)
+        peak = tracemalloc.get_traced_memory()[0] / 2 ** 20
+        tracemalloc.stop()
+        print(f"{name:<8} {peak:>13.1f}")
+
+    print(f"{'operazione':<12} {'ciclo for (s)':>14} {'lista (s)':>10} {'ivalloc (s)':>12}")
+    cases = {
+        "fill": ("7 i a setv {n} 0 i for", "7 a vfill"),
+        # il ciclo somma gli indici: nel linguaggio non c'è un'operazione che legge un elemento dell'array
+        "sum": ("s i + s setq {n} 0 i for  s alloc  prog2", "a vsum"),
+        "copy": ("i 0 + i b setv {n} 0 i for", "a 0 {n} b 0 vcopy"),
+    }
+    for operation, (loop, bulk) in cases.items():
+        t_loop = timeit(lambda: Expression.from_program(loop.format(n=n), d).evaluate({"a": [0] * n, "b": [0] * n}),
+                        1)
+        times = []
+        for kind in ("valloc", "ivalloc"):
+            tree = Expression.from_program(f"{bulk.format(n=n)}  {n} b {kind}  {n} a {kind}  prog3", d)
+            times.append(timeit(lambda: tree.evaluate({}), repeat))
+        print(f"{operation:<12} {t_loop:>14.4f} {times[0]:>10.4f} {times[1]:>12.4f}")
+    # il prodotto scalare non ha un equivalente con un ciclo for: nel linguaggio non si leggono gli elementi
+    times = []
+    for kind in ("valloc", "ivalloc"):
+        env = {}
+        Expression.from_program(f"i 2 * i b setv  i 0 + i a setv  prog2 {n} 0 i for  {n} b {kind}  {n} a {kind}  prog3",
+                                d).evaluate(env)
+        dot = Expression.from_program("a b vdot", d)
+        times.append(timeit(lambda: dot.evaluate(env), repeat))
+    print(f"{'dot':<12} {'-':>14} {times[0]:>10.4f} {times[1]:>12.4f}")
+
+
+def bench_sparse(sizes=(10 ** 7, 10 ** 9), writes=(1000, 100000), repeat=3):
+    # valloc di array grandi con poche scritture: lista (dove entra in memoria) e array sparso
+    print(f"{'dimensione':>11} {'scritture':>10} {'array':<7} {'tempo (s)':>10} {'memoria (MB)':>13}")
+    threshold = sparse.threshold
+    for n in sizes:
+        for count in writes:
+            text = f"a vsum  i i * i {n // count} * a setv {count} 0 i for  {n} a valloc  prog3"
+            tree = Expression.from_program(text, d)
+            for name, value in (("lista", None), ("sparso", 0)):
+                if name == "lista" and n > 10 ** 8:
+                    continue
+                sparse.threshold = value
+                elapsed = timeit(lambda: tree.evaluate({}), repeat)
+                tracemalloc.start()
+                tree.evaluate({})
+                peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                tracemalloc.stop()
+                print(f"{n:>11} {count:>10} {name:<7} {elapsed:>10.4f} {peak:>13.1f}")
+    sparse.threshold = threshold
+
+
+def _balanced_sum(first, last):
+    # somma bilanciata dei termini xk * k, per k da first a last
+    if first == last:
+        return f"x{first} {first} *"
+    middle = (first + last) // 2
+    return f"{_balanced_sum(first, middle)} {_balanced_sum(middle + 1, last)} +"
+
+
+def bench_incremental(n=4096, changes=200, repeat=3):
+    # valutazioni ripetute di un albero con n variabili, cambiando una variabile per volta
+    tree = Expression.from_program(_balanced_sum(0, n - 1), d)
+    envs = []
+    env = {f"x{k}": k for k in range(n)}
+    for step in range(changes):
+        env = dict(env)
+        env[f"x{step * 7 % n}"] += 1
+        envs.append(env)
+
+    def run(evaluate):
+        for env in envs:
+            evaluate(env)
+
+    full = timeit(lambda: run(tree.evaluate), repeat)
+    evaluator = incremental.IncrementalEvaluator(tree)
+    fast = timeit(lambda: run(evaluator.evaluate), repeat)
+    print(f"nodi: {size(tree)}, valutazioni: {changes}")
+    print(f"evaluate:     {full:.4f} s")
+    print(f"incrementale: {fast:.4f} s ({full / fast:.1f}x), {evaluator}")
+
+
+def bench_server(clients=(1, 8, 32), requests=50, workers=None):
+    # richieste concorrenti al server di valutazione: ogni client usa la propria sessione
+    async def run(count):
+        evaluation = server.EvaluationServer(workers, max_pending=count)
+        await evaluation.start_tcp()
+        host, port = evaluation.address[:2]
+        connections = [await server.Client.connect_tcp(host, port) for _ in range(count)]
+
+        async def session(client):
+            await client.request("s alloc")
+            for _ in range(requests):
+                await client.request("s i + s setq 200 0 i for")
+
+        begin = time.perf_counter()
+        await asyncio.gather(*(session(client) for client in connections))
+        elapsed = time.perf_counter() - begin
+        stats = await connections[0].stats()
+        for client in connections:
+            await client.close()
+        await evaluation.close()
+        return elapsed, stats
+
+    print(f"{'client':>7} {'richieste':>10} {'tempo (s)':>10} {'richieste/s':>12} {'media (ms)':>11} {'p95 (ms)':>9}")
+    for count in clients:
+        elapsed, stats = asyncio.run(run(count))
+        total = count * (requests + 1)
+        print(f"{count:>7} {total:>10} {elapsed:>10.3f} {total / elapsed:>12.1f} "
+              f"{stats['latency_mean'] * 1000:>11.2f} {stats['latency_p95'] * 1000:>9.2f}")
+
+
+def bench_budget(n=200000, repeat=3):
+    # costo dei limiti di esecuzione su un ciclo e su chiamate in un ciclo
+    programs = {"for": f"s i + s setq {n} 0 i for  s alloc  prog2",
+                "while": f"i 1 + i setq {n} i < while  0 i setq  i alloc  prog3",
+                "call": f"f call {n // 10} 0 i for  s i + s setq f desub  s alloc  prog3"}
+    print(f"{'programma':<10} {'evaluate (s)':>13} {'senza limiti (s)':>17} {'con limiti (s)':>15} {'costo':>7}")
+    for name, text in programs.items():
+        tree = Expression.from_program(text, d)
+        plain = timeit(lambda: tree.evaluate({}), repeat)
+        free = timeit(lambda: budget.evaluate(tree, {}), repeat)
+        limited = timeit(lambda: budget.evaluate(tree, {}, steps=10 ** 12, seconds=3600), repeat)
+        print(f"{name:<10} {plain:>13.4f} {free:>17.4f} {limited:>15.4f} {limited / plain - 1:>7.1%}")
+
+
+def bench_specialize(n=200000, repeat=3):
+    # nodi specializzati per i tipi inferiti su cicli con aritmetica intera, confronti e array
+    programs = {"sum": f"s i + s setq {n} 0 i for  0 s setq  s alloc  prog3",
+                "while": f"i 1 + i setq {n} i < while  0 i setq  i alloc  prog3",
+                "if": f"s 1 + s setq  s i + s setq  2 i % 0 = if {n} 0 i for  s alloc  prog2",
+                "setv": f"7 i % i a setv {n} 0 i for  {n} a valloc  prog2"}
+    print(f"{'programma':<10} {'evaluate (s)':>13} {'specializzato (s)':>18} {'speedup':>8}  nodi")
+    for name, text in programs.items():
+        tree = Expression.from_program(text, d)
+        plain = timeit(lambda: tree.evaluate({}), repeat)
+        special, specializer = specialize.specialize(tree)
+        fast = timeit(lambda: special.evaluate({}), repeat)
+        print(f"{name:<10} {plain:>13.4f} {fast:>18.4f} {plain / fast:>7.2f}x  {specializer}")
+
+
+def bench_loops(n=200000, repeat=3):
+    # spostamento delle espressioni invarianti e riduzione di forza su programmi con cicli
+    programs = {"invariant": f"s n 2 ** n 1 - * + s setq {n} 0 i for  0 s setq  s alloc  prog3  "
+                             f"10 n setq  n alloc  prog3",
+                "while": f"i 1 + i setq  1 n 2 * - i < while  0 i setq  i alloc  prog3  {n // 2} n setq  n alloc  prog3",
+                "index": f"1 i 4 * a setv {n} 0 i for  {4 * n} a valloc  prog2",
+                "nested": f"s k 8 * n n * + + s setq 100 0 k for {n // 100} 0 i for  0 s setq  s alloc  prog3  "
+                          f"7 n setq  n alloc  prog3"}
+    print(f"{'programma':<10} {'evaluate (s)':>13} {'ottimizzato (s)':>16} {'speedup':>8}  passata")
+    for name, text in programs.items():
+        tree = Expression.from_program(text, d)
+        plain = timeit(lambda: tree.evaluate({}), repeat)
+        optimized, optimizer = loops.optimize_loops(tree)
+        fast = timeit(lambda: optimized.evaluate({}), repeat)
+        print(f"{name:<10} {plain:>13.4f} {fast:>16.4f} {plain / fast:>7.2f}x  {optimizer}")
+
+
+def bench_inline(n=200000, repeat=3):
+    # espansione delle chiamate a subroutine in un ciclo, da sola e seguita dall'ottimizzazione dei cicli
+    programs = {"call": f"s f call + s setq {n} 0 i for  i 2 * 1 + f desub  0 s setq  s alloc  prog4",
+                "nested": f"s g call + s setq {n} 0 i for  f call 3 * g desub  i 1 + f desub  prog3  "
+                          f"0 s setq  s alloc  prog3",
+                "invariant": f"s f call i + + s setq {n} 0 i for  n 2 ** n 1 - * f desub  0 s setq  prog3  "
+                             f"s alloc  10 n setq  n alloc  prog4"}
+    print(f"{'programma':<10} {'evaluate (s)':>13} {'inline (s)':>11} {'+ loops (s)':>12} {'speedup':>8}  passata")
+    for name, text in programs.items():
+        tree = Expression.from_program(text, d)
+        plain = timeit(lambda: tree.evaluate({}), repeat)
+        inlined, inliner = inline.inline_calls(tree)
+        fast = timeit(lambda: inlined.evaluate({}), repeat)
+        optimized, _ = loops.optimize_loops(inlined)
+        fastest = timeit(lambda: optimized.evaluate({}), repeat)
+        print(f"{name:<10} {plain:>13.4f} {fast:>11.4f} {fastest:>12.4f} {plain / fastest:>7.2f}x  {inliner}")
+
+
+def bench_environment(arrays=10, length=10000, variations=50, n=200000, repeat=3):
+    # varianti di un ambiente grande: copia completa (deepcopy) contro fork dell'ambiente con copia alla scrittura
+    base = {f"a{k}": [k] * length for k in range(arrays)}
+    base.update({f"x{k}": k for k in range(1000)})
+    programs = {"lettura": "x1 x2 * x3 +", "setv": "x1 0 + 1 a0 setv"}
+    print(f"{'programma':<10} {'deepcopy (s)':>13} {'fork (s)':>10} {'speedup':>8}")
+    for name, text in programs.items():
+        tree = Expression.from_program(text, d)
+
+        def copies():
+            for _ in range(variations):
+                tree.evaluate(copy.deepcopy(base))
+
+        shared = environment.Environment(base)
+
+        def forks():
+            for _ in range(variations):
+                tree.evaluate(shared.fork())
+
+        slow = timeit(copies, 1)
+        fast = timeit(forks, repeat)
+        print(f"{name:<10} {slow:>13.4f} {fast:>10.4f} {slow / fast:>7.1f}x")
+    # costo delle letture e scritture nei livelli durante la valutazione di un ciclo
+    tree = Expression.from_program(f"s i x1 * + s setq {n} 0 i for  0 s setq  s alloc  prog3", d)
+    plain = timeit(lambda: tree.evaluate(dict(base)), repeat)
+    layered = timeit(lambda: tree.evaluate(environment.Environment(base).fork()), repeat)
+    print(f"ciclo: dizionario {plain:.4f} s, ambiente a livelli {layered:.4f} s ({layered / plain:.2f}x)")
+
+
+def bench_output(n=200000, repeat=3):
+    # print in un ciclo con le diverse destinazioni dell'output; lo stream è os.devnull bufferizzato per righe,
+    # come un terminale: una write di sistema per ogni print
+    tree = Expression.from_program(f"i print {n} 0 i for", d)
+    with open(os.devnull, "w", buffering=1) as stream:
+        sinks = {"stream": lambda: output.StreamSink(stream), "buffered": lambda: output.BufferedSink(stream),
+                 "callback": lambda: output.CallbackSink([].append), "null": output.NullSink}
+
+        def run(make):
+            with output.using(make()):
+                tree.evaluate({})
+
+        times = {name: timeit(lambda: run(make), repeat) for name, make in sinks.items()}
+    print(f"{'destinazione':<12} {'tempo (s)':>10} {'speedup':>8}")
+    for name, elapsed in times.items():
+        print(f"{name:<12} {elapsed:>10.4f} {times['stream'] / elapsed:>7.2f}x")
+
+
+# Programmi con una subroutine pura chiamata in un ciclo: N viene sostituito con il numero di iterazioni
+MEMO_PROGRAMS = {
+    # la subroutine legge solo x, che il ciclo non modifica: tutte le chiamate tranne la prima usano la cache
+    "invariant": lambda n: f"s 0 +  s f call + s setq {n} 0 i for  x{' x * 3 +' * 20} f desub  "
+                           f"5 x setq  x alloc  s alloc  prog3  prog4",
+    # la subroutine legge j = i % 10: i risultati vengono eliminati a ogni assegnazione di j
+    "changing": lambda n: f"s 0 +  s f call + s setq 10 i % j setq prog2 {n} 0 i for  "
+                          f"j{' j * 3 +' * 20} f desub  j alloc  s alloc  prog2  prog4",
+}
+
+
+def bench_memo(n=20000, repeat=3):
+    # chiamate a una subroutine pura con e senza memoizzazione
+    print(f"{'programma':<10} {'normale (s)':>12} {'memo (s)':>10} {'speedup':>8}  cache")
+    for name, make in MEMO_PROGRAMS.items():
+        tree = Expression.from_program(make(n), d)
+        plain = timeit(lambda: tree.evaluate({}), repeat)
+        memoized, memoizer = memo.memoize_calls(tree)
+        fast = timeit(lambda: memoized.evaluate({}), repeat)
+        print(f"{name:<10} {plain:>12.4f} {fast:>10.4f} {plain / fast:>7.1f}x  {memoizer.cache}")
+
+
+# Programmi generati con molte sottoespressioni ripetute: N viene sostituito con il numero di ripetizioni
+GENERATED_PROGRAMS = {
+    # somma di N termini uguali
+    "sum": lambda n: "x y * 2 +" + " x y * 2 + +" * n,
+    # N istruzioni uguali in sequenza
+    "statements": lambda n: "nop" + " i 1 + x setq nop prog3" * n,
+    # N condizioni con rami costanti
+    "conditions": lambda n: "0" + " 1 2 3 * + 4 x i % 2 = if +" * n,
+}
+
+
+def bench_memory(sizes=(10000, 100000)):
+    # memoria degli alberi costruiti da from_program, senza e con la condivisione dei sottoalberi uguali
+    print(f"{'programma':<11} {'ripetizioni':>11} {'nodi':>9} {'oggetti':>9} {'MB':>7} {'MB intern':>10} "
+          f"{'byte/nodo':>10} {'risparmio':>10}")
+    for name, make in GENERATED_PROGRAMS.items():
+        for n in sizes:
+            text = make(n)
+            memory = []
+            for intern in (False, True):
+                tracemalloc.start()
+                tree = Expression.from_program(text, d, intern=Interner() if intern else False)
+                memory.append(tracemalloc.get_traced_memory()[0])
+                tracemalloc.stop()
+            nodes = size(tree)
+            objects = len({id(node) for node in walk(tree)})
+            print(f"{name:<11} {n:>11} {nodes:>9} {objects:>9} {memory[0] / 2 ** 20:>7.1f} {memory[1] / 2 ** 20:>10.1f} "
+                  f"{memory[0] / nodes:>10.1f} {1 - memory[1] / memory[0]:>9.0%}")
+
+
+# Suite di riferimento: per ogni caso (categoria, funzione che costruisce il caso).
+# La funzione ritorna la funzione da misurare e il numero di operazioni che esegue: elementi letti per il parsing,
+# nodi valutati per la valutazione (contati una volta con il profiler).
+def _parse_case(make, n):
+    text = make(n)
+    return lambda: Expression.from_program(text, d), len(text.split())
+
+
+def _evaluate_case(text, evaluate=None, times=1):
+    # times: valutazioni per misura, per i programmi troppo brevi da misurare con una sola valutazione
+    tree = Expression.from_program(text, d)
+    nodes = sum(stats.count for stats in profiler.profile(tree, {})[1].stats.values())
+    evaluate = evaluate or (lambda tree, env: tree.evaluate(env))
+
+    def run():
+        for _ in range(times):
+            evaluate(tree, {})
+    return run, nodes * times
+
+
+SUITE = {
+    "parse_chain_1k": ("parsing", lambda: _parse_case(chain_program, 1000)),
+    "parse_chain_10k": ("parsing", lambda: _parse_case(chain_program, 10000)),
+    "parse_chain_100k": ("parsing", lambda: _parse_case(chain_program, 100000)),
+    "parse_wide_100k": ("parsing", lambda: _parse_case(wide_program, 100000)),
+    "for_sum": ("cicli", lambda: _evaluate_case(program("for_sum", 20000))),
+    "while_count": ("cicli", lambda: _evaluate_case(program("while_count", 20000))),
+    "for_if": ("cicli", lambda: _evaluate_case(program("for_if", 20000))),
+    "array_fill": ("array", lambda: _evaluate_case(program("array_fill", 20000))),
+    # scansione dell'array con while: ogni elemento viene riscritto con il doppio dell'indice
+    "array_scan": ("array", lambda: _evaluate_case(
+        "nop  x 1 + x setq  x 2 * x a setv  prog2  20000 x < while  x alloc  20000 a valloc  prog4")),
+    # subroutine chiamata a ogni iterazione di un for
+    "call_loop": ("subroutine", lambda: _evaluate_case(
+        "s 0 +  f call 20000 0 i for  s i + s setq f desub  s alloc  prog4")),
+    "call_recursive": ("subroutine", lambda: _evaluate_case(DEEP_PROGRAMS["call"](200), times=50)),
+    "nested_200": ("annidamento", lambda: _evaluate_case(chain_program(200), times=200)),
+    "nested_chain_100k": ("annidamento", lambda: _evaluate_case(chain_program(100000), iterative.evaluate)),
+    "nested_prog2_100k": ("annidamento", lambda: _evaluate_case(DEEP_PROGRAMS["prog2"](100000), iterative.evaluate)),
+}
+
+
+def run_suite(names=None, repeat=3):
+    # esegue i casi della suite: per ognuno operazioni, tempo minimo, operazioni al secondo e picco di memoria in KB
+    results = {}
+    for name in names or SUITE:
+        category, make = SUITE[name]
+        f, ops = make()
+        seconds = timeit(f, repeat)
+        tracemalloc.start()
+        f()
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 10
+        tracemalloc.stop()
+        results[name] = {"category": category, "ops": ops, "seconds": seconds,
+                         "ops_per_sec": ops / seconds if seconds else float("inf"), "peak_kb": peak}
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}
+
+
+def print_suite(run):
+    print(f"{'caso':<20} {'categoria':<12} {'operazioni':>11} {'tempo (s)':>10} {'op/s':>12} {'picco (KB)':>11}")
+    for name, result in run["results"].items():
+        print(f"{name:<20} {result['category']:<12} {result['ops']:>11} {result['seconds']:>10.4f} "
+              f"{result['ops_per_sec']:>12.0f} {result['peak_kb']:>11.1f}")
+
+
+def save_suite(run, path):
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+
+
+def load_suite(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold=0.10):
+    """
+    Confronta due esecuzioni della suite caso per caso.
+    Ritorna le righe (caso, op/s prima, op/s dopo, rapporto, rapporto della memoria, esito): un caso è una regressione
+    se le operazioni al secondo scendono o il picco di memoria cresce di più di threshold (frazione).
+    """
+    rows = []
+    for name, after in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            rows.append((name, None, after["ops_per_sec"], None, None, "nuovo"))
+            continue
+        speed = after["ops_per_sec"] / before["ops_per_sec"]
+        memory = after["peak_kb"] / before["peak_kb"] if before["peak_kb"] else 1.0
+        problems = []
+        if speed < 1 - threshold:
+            problems.append("più lento")
+        if memory > 1 + threshold:
+            problems.append("più memoria")
+        if problems:
+            status = "REGRESSIONE (" + ", ".join(problems) + ")"
+        elif speed > 1 + threshold:
+            status = "più veloce"
+        else:
+            status = "invariato"
+        rows.append((name, before["ops_per_sec"], after["ops_per_sec"], speed, memory, status))
+    return rows
+
+
+def print_comparison(rows):
+    # stampa il confronto e ritorna il numero di regressioni
+    print(f"{'caso':<20} {'op/s prima':>12} {'op/s dopo':>12} {'velocità':>9} {'memoria':>8}  esito")
+    for name, before, after, speed, memory, status in rows:
+        if before is None:
+            print(f"{name:<20} {'-':>12} {after:>12.0f} {'-':>9} {'-':>8}  {status}")
+        else:
+            print(f"{name:<20} {before:>12.0f} {after:>12.0f} {speed:>8.2f}x {memory:>7.2f}x  {status}")
+    return sum(status.startswith("REGRESSIONE") for *_, status in rows)
+
+
+def bench_suite(repeat=3, save=None):
+    run = run_suite(repeat=repeat)
+    print_suite(run)
+    if save is not None:
+        save_suite(run, save)
+    return run
+
+
+BENCHMARKS = {"vm": bench_vm, "transpiler": bench_transpiler, "parser": bench_parser, "cache": bench_cache,
+              "fold": bench_fold, "frames": bench_frames,
+              "batch": bench_batch, "vectorize": bench_vectorize,
+              "parallel": bench_parallel, "pfor": bench_pfor,
+              "deep": bench_deep, "profile": bench_profile, "arrays": bench_arrays,
+              "sparse": bench_sparse, "memory": bench_memory, "memo": bench_memo,
+              "incremental": bench_incremental, "server": bench_server,
+              "budget": bench_budget, "specialize": bench_specialize, "loops": bench_loops, "inline": bench_inline,
+              "environment": bench_environment, "output": bench_output, "suite": bench_suite}
+
+
+if __name__ == "__main__":
+    # uso: python3 benchmark.py [nome ...] [--save FILE]
+    #      python3 benchmark.py --compare PRIMA.json DOPO.json [--threshold 0.1]
+    parser = argparse.ArgumentParser(description="Benchmark dei motori di valutazione")
+    parser.add_argument("names", nargs="*", metavar="nome", help="benchmark da eseguire (tutti se non indicati)")
+    parser.add_argument("--save", metavar="FILE", help="salva i risultati della suite in JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("PRIMA", "DOPO"), help="confronta due risultati salvati")
+    parser.add_argument("--threshold", type=float, default=0.10, help="variazione oltre la quale segnalare (0.10)")
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"benchmark sconosciuto: {name} (disponibili: {', '.join(BENCHMARKS)})")
+
+    if args.compare:
+        regressions = print_comparison(compare(load_suite(args.compare[0]), load_suite(args.compare[1]),
+                                               args.threshold))
+        print(f"regressioni: {regressions}")
+        sys.exit(1 if regressions else 0)
+
+    names = args.names or (["suite"] if args.save else list(BENCHMARKS))
+    for name in names:
+        print(f"== {name}")
+        if name == "suite":
+            bench_suite(save=args.save)
+        else:
+            BENCHMARKS[name]()
@@ -0,0 +1,225 @@
+# ELISA COCEANI SM3201340
+
+"""
+Limiti di esecuzione per le valutazioni: numero massimo di passi e tempo massimo.
+
+evaluate(tree, env, steps, seconds) valuta l'albero come tree.evaluate(env) e solleva BudgetExceeded se la
+valutazione supera steps passi o dura più di seconds secondi. Senza limiti viene chiamato direttamente tree.evaluate,
+quindi non c'è nessun costo aggiuntivo.
+
+Con i limiti l'albero viene valutato in una copia in cui while, for e call sono sostituiti da versioni che contano
+i passi: a ogni iterazione di un ciclo vengono aggiunti i nodi del corpo (e della condizione per while), a ogni
+chiamata i nodi del corpo della subroutine. I passi sono quindi una stima dei nodi valutati, ed è solo in questi
+punti (dove una valutazione può non terminare) che vengono controllati i limiti; l'orologio viene letto ogni
+CLOCK_INTERVAL passi. Anche i corpi delle subroutine definite in valutazioni precedenti vengono convertiti alla
+prima chiamata.
+
+L'eccezione contiene i passi eseguiti, il tempo trascorso, il ciclo o la chiamata in corso e le iterazioni di quel
+ciclo. Le modifiche all'ambiente fatte prima dell'eccezione restano, come per le altre eccezioni.
+"""
+
+import threading
+import time
+import weakref
+
+from expressions import Expression, While, For, Call, BudgetExceeded, MissingFunctionException
+from tree import arguments, is_node, rebuild, size
+
+
+# Passi tra due letture dell'orologio
+CLOCK_INTERVAL = 1000
+
+# Lunghezza massima della forma testuale del nodo nell'eccezione
+DESCRIPTION = 80
+
+_current = threading.local()             # limiti della valutazione in corso in questo thread
+_limited = weakref.WeakKeyDictionary()   # albero -> copia con i cicli e le chiamate che contano i passi
+_costs = weakref.WeakKeyDictionary()     # albero convertito -> numero di nodi
+
+
+def _describe(node):
+    try:
+        text = str(node).strip()
+    except RecursionError:
+        text = f"<{type(node).__name__} troppo profondo>"
+    return text if len(text) <= DESCRIPTION else text[:DESCRIPTION - 3] + "..."
+
+
+class Budget:
+    """
+    Limiti di una valutazione: steps passi (None: nessun limite) e seconds secondi (None: nessun limite).
+    Dopo run, used contiene i passi eseguiti.
+    """
+    def __init__(self, steps=None, seconds=None):
+        self.limit = steps
+        self.seconds = seconds
+        self.used = 0
+        self.start = None
+        self.deadline = None
+        self.clock = CLOCK_INTERVAL   # passi alla prossima lettura dell'orologio
+        self.threshold = 0            # passi al prossimo controllo dei limiti
+
+    def run(self, tree, env):
+        self.used = 0
+        self.clock = CLOCK_INTERVAL
+        self.start = time.monotonic()
+        self.deadline = None if self.seconds is None else self.start + self.seconds
+        self.update()
+        previous = getattr(_current, "budget", None)
+        _current.budget = self
+        try:
+            return limited(tree).evaluate(env)
+        finally:
+            _current.budget = previous
+
+    def update(self):
+        # prossimo numero di passi a cui va chiamato check: il limite oppure la prossima lettura dell'orologio
+        limit = float("inf") if self.limit is None else self.limit + 1
+        self.threshold = min(limit, self.clock) if self.deadline is not None else limit
+
+    def check(self, node, iterations):
+        # chiamata quando used raggiunge threshold: solleva BudgetExceeded se un limite è stato superato
+        if self.limit is not None and self.used > self.limit:
+            raise self.exceeded(f"superato il limite di {self.limit} passi", node, iterations)
+        if self.deadline is not None and self.used >= self.clock:
+            self.clock = self.used + CLOCK_INTERVAL
+            if time.monotonic() > self.deadline:
+                raise self.exceeded(f"superato il tempo massimo di {self.seconds} s", node, iterations)
+        self.update()
+
+    def exceeded(self, reason, node, iterations):
+        elapsed = time.monotonic() - self.start
+        where = f"nel ciclo {_describe(node)} dopo {iterations} iterazioni" if iterations else \
+            f"nella chiamata {_describe(node)}"
+        return BudgetExceeded(f"Valutazione interrotta: {reason} ({self.used} passi in {elapsed:.3f} s, {where})",
+                              self.used, elapsed, _describe(node), iterations)
+
+
+class LimitedWhile(While):
+    __slots__ = ("cost",)
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.cost = size(self.expr) + size(self.cond)
+
+    def evaluate(self, env):
+        budget = getattr(_current, "budget", None)
+        if budget is None:
+            return super().evaluate(env)
+        cost = self.cost
+        iterations = 0
+        while self.cond.evaluate(env):
+            # i passi vengono aggiunti a used; check viene chiamato solo quando used raggiunge threshold
+            iterations += 1
+            budget.used += cost
+            if budget.used >= budget.threshold:
+                budget.check(self, iterations)
+            self.expr.evaluate(env)
+
+
+class LimitedFor(For):
+    __slots__ = ("cost",)
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.cost = size(self.expr)
+
+    def evaluate(self, env):
+        budget = getattr(_current, "budget", None)
+        if budget is None:
+            return super().evaluate(env)
+        start = self.start.evaluate(env) if isinstance(self.start, Expression) else self.start
+        end = self.end.evaluate(env) if isinstance(self.end, Expression) else self.end
+        name = str(self.i)
+        cost = self.cost
+        iterations = 0
+        for i in range(start, end):
+            env[name] = i
+            iterations += 1
+            budget.used += cost
+            if budget.used >= budget.threshold:
+                budget.check(self, iterations)
+            self.expr.evaluate(env)
+
+
+class LimitedCall(Call):
+    # last: (ultimo corpo chiamato, sua copia convertita, numero di nodi), per non cercare la copia a ogni chiamata.
+    # È una sola tupla, assegnata in un passo: thread diversi che chiamano corpi diversi con lo stesso nodo leggono
+    # sempre un corpo con la sua copia
+    __slots__ = ("last",)
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.last = (None, None, 0)
+
+    def evaluate(self, env):
+        budget = getattr(_current, "budget", None)
+        if budget is None:
+            return super().evaluate(env)
+        if self.f not in env:
+            raise MissingFunctionException(f"La funzione {self.f} non è presente nell'ambiente")
+        body = env[str(self.f)]
+        last, target, cost = self.last
+        if body is not last:
+            if not isinstance(body, Expression):
+                return body.evaluate(env)
+            target = limited(body)
+            cost = _costs[target]
+            self.last = (body, target, cost)
+        budget.used += cost
+        if budget.used >= budget.threshold:
+            budget.check(self, 0)
+        return target.evaluate(env)
+
+
+# nodi sostituiti (solo i tipi esatti: le sottoclassi, come pfor, ridefiniscono evaluate)
+REPLACEMENTS = {While: LimitedWhile, For: LimitedFor, Call: LimitedCall}
+
+
+class Limiter:
+    """
+    Passata che sostituisce while, for e call con le versioni che contano i passi.
+    L'albero originale non viene modificato.
+    """
+    def __init__(self):
+        self.loops = 0
+        self.calls = 0
+
+    def run(self, tree):
+        return self.visit(tree)
+
+    def visit(self, node):
+        if not is_node(node):
+            return node
+        node = rebuild(node, [self.visit(arg) for arg in arguments(node)])
+        replacement = REPLACEMENTS.get(type(node))
+        if replacement is None:
+            return node
+        if replacement is LimitedCall:
+            self.calls += 1
+        else:
+            self.loops += 1
+        return replacement(arguments(node))
+
+    def __str__(self):
+        return f"cicli limitati: {self.loops}, chiamate limitate: {self.calls}"
+
+
+def limited(tree):
+    # copia dell'albero con i cicli e le chiamate che contano i passi, costruita una volta per albero
+    if tree in _costs:
+        return tree   # albero già convertito
+    result = _limited.get(tree)
+    if result is None:
+        result = Limiter().run(tree)
+        if result is not tree:
+            _limited[tree] = result
+        _costs[result] = size(result)
+    return result
+
+
+def evaluate(tree, env, steps=None, seconds=None):
+    # valuta l'albero con al massimo steps passi e seconds secondi; senza limiti è tree.evaluate(env)
+    if steps is None and seconds is None:
+        return tree.evaluate(env)
+    return Budget(steps, seconds).run(tree, env)
@@ -0,0 +1,482 @@
+# ELISA COCEANI SM3201340
+
+import operator
+import sys
+import weakref
+
+from expressions import (Expression, Variable, Constant, Operation,
+                         Addition, Subtraction, Division, Multiplication, Power, Modulus,
+                         Reciprocal, AbsoluteValue, Grater, GraterEq, Equal, NotEqual, Less, LessEq,
+                         Alloc, Valloc, Setq, Setv, Prog, If, While, For, DefSub, Call, Print, Nop,
+                         MissingVariableException, MissingFunctionException, ZeroDivisionError,
+                         InvalidIndexError, writable_array)
+import output
+import sparse
+
+
+# Codici delle istruzioni della macchina virtuale.
+# Ogni istruzione è una coppia (codice, argomento); l'ordine dei codici segue quello dei controlli
+# nel ciclo della VM, le istruzioni più frequenti vengono riconosciute per prime
+LOAD_NAME = 0       # inserisce nello stack il valore di una variabile, argomento: (nome, messaggio d'errore)
+LOAD_CONST = 1      # inserisce nello stack una costante
+BINARY = 2          # operazione binaria sui due valori in cima allo stack, argomento: funzione
+BINARY_NN = 3       # operazione binaria tra due variabili, argomento: (funzione, nome, messaggio, nome, messaggio)
+BINARY_NC = 4       # operazione binaria tra una variabile e una costante, argomento: (funzione, nome, messaggio, costante)
+BINARY_CN = 5       # operazione binaria tra una costante e una variabile, argomento: (funzione, costante, nome, messaggio)
+SETQ_POP = 6        # setq il cui risultato non viene usato
+FOR_NEXT = 7        # assegna il prossimo indice alla variabile del ciclo e torna all'inizio del corpo
+SETV_CHECK_N = 8    # come LOAD_NAME seguito da SETV_CHECK, argomento: (nome, messaggio, array)
+SETV_STORE_POP = 9  # setv il cui risultato non viene usato
+JUMP = 10
+JUMP_IF_FALSE = 11      # salto se la cima dello stack è falsa (semantica di While)
+JUMP_IF_NOT_TRUE = 12   # salto se la cima dello stack non è esattamente True (semantica di If)
+POP = 13
+UNARY = 14          # operazione unaria sul valore in cima allo stack, argomento: funzione
+SETQ = 15
+SETV_CHECK = 16     # controlla indice e array prima della valutazione dell'espressione, argomento: array
+SETV_STORE = 17
+CALL = 18
+RETURN = 19         # fine del codice: ritorno dalla subroutine o fine del programma
+FOR_SETUP = 20      # estrae end e start e inserisce l'iteratore range(start, end)
+ALLOC = 21
+VALLOC = 22
+DEFSUB = 23
+PRINT = 24
+GENERIC_OP = 25     # operazione con un numero diverso di argomenti, argomento: (op, arità)
+EVAL_NODE = 26      # valuta un nodo con il suo metodo evaluate (nodi non supportati dal compilatore)
+
+OPNAMES = {value: name for name, value in globals().items() if name.isupper() and isinstance(value, int)}
+
+
+def divide(x, y):
+    # come Division.op
+    if y == 0:
+        raise ZeroDivisionError("Non è possibile dividere per zero")
+    return x / y
+
+
+def reciprocal(x):
+    # come Reciprocal.op
+    if x == 0:
+        raise ZeroDivisionError("Non è possibile dividere per zero")
+    return 1 / x
+
+
+# Funzioni usate al posto del metodo op per le operazioni del dizionario d
+OPERATORS = {Addition: operator.add, Subtraction: operator.sub, Division: divide,
+             Multiplication: operator.mul, Power: operator.pow, Modulus: operator.mod,
+             Grater: operator.gt, GraterEq: operator.ge, Equal: operator.eq, NotEqual: operator.ne,
+             Less: operator.lt, LessEq: operator.le,
+             Reciprocal: reciprocal, AbsoluteValue: abs}
+
+
+class Code:
+    """
+    Programma compilato: un array di istruzioni (codice, argomento) che termina sempre con RETURN.
+    Mantiene un riferimento all'albero da cui è stato generato.
+    """
+    def __init__(self, code, tree):
+        self.code = code
+        self.tree = tree
+
+    def evaluate(self, env):
+        # permette di usare il programma compilato al posto dell'albero
+        return run(self, env)
+
+    def __len__(self):
+        return len(self.code)
+
+    def __str__(self):
+        lines = []
+        for pc, (op, arg) in enumerate(self.code):
+            if op in (LOAD_NAME, DEFSUB, GENERIC_OP, SETV_CHECK_N):
+                arg = arg[0]
+            elif op in (BINARY, UNARY):
+                arg = getattr(arg, "__name__", arg)
+            elif op == BINARY_NN:
+                arg = f"{arg[0].__name__} {arg[1]} {arg[3]}"
+            elif op == BINARY_NC:
+                arg = f"{arg[0].__name__} {arg[1]} {arg[3]}"
+            elif op == BINARY_CN:
+                arg = f"{arg[0].__name__} {arg[1]} {arg[2]}"
+            lines.append(f"{pc:5} {OPNAMES[op]:<16} {'' if arg is None else arg}")
+        return "\n".join(lines)
+
+
+class Compiler:
+    """
+    Il compilatore traduce un albero di espressioni in un array di istruzioni.
+
+    Ogni nodo lascia nello stack esattamente un valore, il risultato che avrebbe restituito il suo metodo evaluate.
+    I costrutti di controllo (If, While, For) sono tradotti in salti, le chiamate a subroutine vengono
+    compilate al momento della chiamata dalla macchina virtuale.
+
+    I diversi metodi di compilazione degli argomenti (expr, value, lookup) riproducono esattamente i controlli
+    fatti dai metodi evaluate dei nodi, in modo che risultati ed eccezioni siano identici.
+    Al termine una passata peephole unisce le sequenze più frequenti in un'unica istruzione.
+    """
+    def __init__(self):
+        self.code = []
+
+    def emit(self, op, arg=None):
+        self.code.append((op, arg))
+        return len(self.code) - 1
+
+    def patch(self, pos, arg):
+        # aggiorna l'argomento di un'istruzione già emessa (destinazione dei salti)
+        self.code[pos] = (self.code[pos][0], arg)
+
+    def compile(self, tree):
+        self.expr(tree)
+        self.emit(RETURN)
+        return Code(peephole(self.code), tree)
+
+    # argomento valutato sempre con il suo metodo evaluate (es. Prog, While, Valloc)
+    def expr(self, node):
+        kind = type(node)
+
+        if kind is Constant:
+            self.emit(LOAD_CONST, node.value)
+
+        elif kind is Variable:
+            self.emit(LOAD_NAME, (node.name, f"La variabile {node.name} non è presente nell'ambiente"))
+
+        elif isinstance(node, Operation) and type(node).evaluate is Operation.evaluate:
+            for arg in node.args:
+                self.lookup(arg, "Manca il valore della variabile '{}")
+            f = OPERATORS.get(kind, node.op)
+            if len(node.args) == 2:
+                self.emit(BINARY, f)
+            elif len(node.args) == 1:
+                self.emit(UNARY, f)
+            else:
+                self.emit(GENERIC_OP, (f, len(node.args)))
+
+        elif kind is Alloc:
+            self.emit(ALLOC, node.var)
+
+        elif kind is Valloc:
+            self.expr(node.n)
+            self.emit(VALLOC, node.x)
+
+        elif kind is Setq:
+            self.value(node.expr)
+            self.emit(SETQ, node.x)
+
+        elif kind is Setv:
+            self.lookup(node.n, "La variabile {} non è presente nell'ambiente")
+            self.emit(SETV_CHECK, node.x)
+            self.expr(node.expr)
+            self.emit(SETV_STORE, str(node.x))
+
+        elif isinstance(node, Prog) and type(node).evaluate is Prog.evaluate:
+            # le espressioni vengono valutate in ordine inverso, rimane nello stack l'ultima valutata
+            args = node.args[::-1]
+            for i, arg in enumerate(args):
+                self.expr(arg)
+                if i < len(args) - 1:
+                    self.emit(POP)
+
+        elif kind is If:
+            self.lookup(node.cond, "La varibaile {} non è presente nell'ambiente")
+            jump_false = self.emit(JUMP_IF_NOT_TRUE)
+            self.value(node.true)
+            jump_end = self.emit(JUMP)
+            self.patch(jump_false, len(self.code))
+            self.value(node.false)
+            self.patch(jump_end, len(self.code))
+
+        elif kind is While:
+            start = len(self.code)
+            self.expr(node.cond)
+            jump_end = self.emit(JUMP_IF_FALSE)
+            self.expr(node.expr)
+            self.emit(POP)
+            self.emit(JUMP, start)
+            self.patch(jump_end, len(self.code))
+            self.emit(LOAD_CONST, None)
+
+        elif kind is For:
+            # il controllo del ciclo è in fondo al corpo: una sola istruzione di salto per iterazione
+            self.value(node.start)
+            self.value(node.end)
+            self.emit(FOR_SETUP)
+            jump_next = self.emit(JUMP)
+            body = len(self.code)
+            self.expr(node.expr)
+            self.emit(POP)
+            self.patch(jump_next, len(self.code))
+            self.emit(FOR_NEXT, (str(node.i), body))
+            self.emit(LOAD_CONST, None)
+
+        elif kind is DefSub:
+            self.emit(DEFSUB, (str(node.var), node.expr))
+
+        elif kind is Call:
+            self.emit(CALL, node.f)
+
+        elif kind is Print:
+            self.lookup(node.expr, "Valore mancante per la variabile '{}'")
+            self.emit(PRINT)
+
+        elif kind is Nop:
+            self.emit(LOAD_CONST, None)
+
+        else:
+            # nodo sconosciuto (o valore che non è un'espressione): viene valutato dall'albero
+            self.emit(EVAL_NODE, node)
+
+    # argomento valutato solo se è un'espressione, altrimenti usato così com'è (es. Setq, For, rami di If)
+    def value(self, node):
+        if isinstance(node, Expression):
+            self.expr(node)
+        else:
+            self.emit(LOAD_CONST, node)
+
+    # argomento che può essere un'espressione, il nome di una variabile o una costante (es. operazioni, If, Setv).
+    # message è il messaggio d'errore del nodo, {} viene sostituito con il nome della variabile
+    def lookup(self, node, message):
+        if isinstance(node, Expression):
+            self.expr(node)
+        elif isinstance(node, str):
+            self.emit(LOAD_NAME, (node, message.format(node)))
+        else:
+            self.emit(LOAD_CONST, node)
+
+
+def peephole(code):
+    """
+    Unisce le sequenze di istruzioni più frequenti nei cicli:
+    - LOAD_NAME/LOAD_CONST seguiti da BINARY diventano BINARY_NN, BINARY_NC o BINARY_CN
+    - SETQ e SETV_STORE seguiti da POP diventano SETQ_POP e SETV_STORE_POP
+    - LOAD_NAME seguito da SETV_CHECK diventa SETV_CHECK_N
+    - LOAD_CONST seguito da POP viene eliminato (es. nop nel corpo di un ciclo)
+
+    Le istruzioni che sono destinazione di un salto non vengono unite, le destinazioni vengono poi ricalcolate.
+    """
+    targets = set()
+    for op, arg in code:
+        if op in (JUMP, JUMP_IF_FALSE, JUMP_IF_NOT_TRUE):
+            targets.add(arg)
+        elif op == FOR_NEXT:
+            targets.add(arg[1])
+
+    result = []
+    position = {}   # posizione vecchia -> posizione nuova
+    pc = 0
+    while pc < len(code):
+        op, arg = code[pc]
+        position[pc] = len(result)
+        window = [c[0] for c in code[pc:pc + 3]]
+        free = not (targets & {pc + 1, pc + 2})
+
+        if free and window[1:] == [LOAD_NAME, BINARY] and op in (LOAD_NAME, LOAD_CONST):
+            other = code[pc + 1][1]
+            f = code[pc + 2][1]
+            if op == LOAD_NAME:
+                result.append((BINARY_NN, (f, arg[0], arg[1], other[0], other[1])))
+            else:
+                result.append((BINARY_CN, (f, arg, other[0], other[1])))
+            pc += 3
+        elif free and window[1:] == [LOAD_CONST, BINARY] and op == LOAD_NAME:
+            result.append((BINARY_NC, (code[pc + 2][1], arg[0], arg[1], code[pc + 1][1])))
+            pc += 3
+        elif window[:2] == [LOAD_CONST, POP] and pc + 1 not in targets:
+            pc += 2
+        elif window[:2] == [SETQ, POP] and pc + 1 not in targets:
+            result.append((SETQ_POP, arg))
+            pc += 2
+        elif window[:2] == [SETV_STORE, POP] and pc + 1 not in targets:
+            result.append((SETV_STORE_POP, arg))
+            pc += 2
+        elif window[:2] == [LOAD_NAME, SETV_CHECK] and pc + 1 not in targets:
+            result.append((SETV_CHECK_N, (arg[0], arg[1], str(code[pc + 1][1]))))
+            pc += 2
+        else:
+            result.append((op, arg))
+            pc += 1
+    position[len(code)] = len(result)
+
+    # aggiornamento delle destinazioni dei salti
+    for i, (op, arg) in enumerate(result):
+        if op in (JUMP, JUMP_IF_FALSE, JUMP_IF_NOT_TRUE):
+            result[i] = (op, position[arg])
+        elif op == FOR_NEXT:
+            result[i] = (op, (arg[0], position[arg[1]]))
+    return result
+
+
+def check_index(env, index, array):
+    # controlli di Setv.evaluate sull'indice e sull'array, prima della valutazione dell'espressione.
+    # La VM controlla prima il caso frequente di indice valido e chiama questa funzione solo per sollevare l'errore
+    if not isinstance(index, int) or index < 0:
+        raise InvalidIndexError(f" La dimensione dell'array {index} deve essere un numero intero positivo")
+    var = str(array)
+    if var not in env:
+        raise MissingVariableException(f"L'array {array} non è presente nell'ambiente")
+    if index >= len(env[var]):
+        raise IndexError("Errore: si sta provando ad accedere ad un indice che non esiste")
+
+
+def compile_tree(tree):
+    # compila l'albero ritornato da Expression.from_program
+    return Compiler().compile(tree)
+
+
+class VM:
+    """
+    Macchina virtuale a stack che esegue i programmi compilati.
+
+    Le chiamate a subroutine non usano la ricorsione di Python: il corpo della subroutine
+    viene compilato (una sola volta, poi riusato) e la VM salta al suo codice salvando
+    il punto di ritorno in una lista di frame. Come evaluate, una ricorsione senza fine solleva
+    RecursionError: le chiamate annidate sono al massimo sys.getrecursionlimit().
+    """
+    def __init__(self):
+        self.subroutines = weakref.WeakKeyDictionary()
+
+    def subroutine(self, body):
+        # codice compilato del corpo di una subroutine
+        try:
+            return self.subroutines[body]
+        except (KeyError, TypeError):
+            pass
+        code = compile_tree(body)
+        try:
+            self.subroutines[body] = code
+        except TypeError:
+            pass   # il corpo non supporta riferimenti deboli: non viene memorizzato
+        return code
+
+    def run(self, code, env):
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        frames = []
+        depth = sys.getrecursionlimit()   # chiamate annidate oltre le quali, come evaluate, solleva RecursionError
+        stop = object()   # valore che segnala la fine di un ciclo for
+        code = code.code
+        pc = 0
+
+        while True:
+            op, arg = code[pc]
+            pc += 1
+
+            if op == LOAD_NAME:
+                if arg[0] not in env:
+                    raise MissingVariableException(arg[1])
+                push(env[arg[0]])
+            elif op == LOAD_CONST:
+                push(arg)
+            elif op == BINARY:
+                y = pop()
+                stack[-1] = arg(stack[-1], y)
+            elif op == BINARY_NN:
+                f, x, message_x, y, message_y = arg
+                if x not in env:
+                    raise MissingVariableException(message_x)
+                if y not in env:
+                    raise MissingVariableException(message_y)
+                push(f(env[x], env[y]))
+            elif op == BINARY_NC:
+                f, x, message_x, y = arg
+                if x not in env:
+                    raise MissingVariableException(message_x)
+                push(f(env[x], y))
+            elif op == BINARY_CN:
+                f, x, y, message_y = arg
+                if y not in env:
+                    raise MissingVariableException(message_y)
+                push(f(x, env[y]))
+            elif op == SETQ_POP:
+                if arg not in env:
+                    raise MissingVariableException(f" La variabile {arg} non è presente nell'ambiente")
+                env[arg] = pop()
+            elif op == FOR_NEXT:
+                i = next(stack[-1], stop)
+                if i is stop:
+                    pop()
+                else:
+                    env[arg[0]] = i
+                    pc = arg[1]
+            elif op == SETV_CHECK_N:
+                name, message, var = arg
+                if name not in env:
+                    raise MissingVariableException(message)
+                index = env[name]
+                if type(index) is not int or index < 0 or var not in env or index >= len(env[var]):
+                    check_index(env, index, var)
+                push(index)
+            elif op == SETV_STORE_POP:
+                value = pop()
+                writable_array(env, arg)[pop()] = value
+            elif op == JUMP:
+                pc = arg
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == JUMP_IF_NOT_TRUE:
+                if pop() is not True:
+                    pc = arg
+            elif op == POP:
+                pop()
+            elif op == UNARY:
+                stack[-1] = arg(stack[-1])
+            elif op == SETQ:
+                if arg not in env:
+                    raise MissingVariableException(f" La variabile {arg} non è presente nell'ambiente")
+                env[arg] = stack[-1]
+                stack[-1] = env[arg]
+            elif op == SETV_CHECK:
+                check_index(env, stack[-1], arg)
+            elif op == SETV_STORE:
+                value = pop()
+                writable_array(env, arg)[stack[-1]] = value
+                stack[-1] = value
+            elif op == CALL:
+                if arg not in env:
+                    raise MissingFunctionException(f"La funzione {arg} non è presente nell'ambiente")
+                if len(frames) >= depth:
+                    raise RecursionError("Superata la profondità massima delle chiamate di subroutine")
+                frames.append((code, pc))
+                code = self.subroutine(env[str(arg)]).code
+                pc = 0
+            elif op == RETURN:
+                # fine del codice: ritorno dalla subroutine oppure fine del programma
+                if not frames:
+                    return stack[-1]
+                code, pc = frames.pop()
+            elif op == FOR_SETUP:
+                end = pop()
+                stack[-1] = iter(range(stack[-1], end))
+            elif op == ALLOC:
+                env[arg] = 0
+                push(None)
+            elif op == VALLOC:
+                size = stack[-1]
+                if not isinstance(size, int) or size < 0:
+                    raise InvalidIndexError(f" La dimensione dell'array {size} deve essere un numero intero positivo")
+                env[arg] = sparse.allocate(size)
+                stack[-1] = None
+            elif op == DEFSUB:
+                env[arg[0]] = arg[1]
+                push(None)
+            elif op == PRINT:
+                output.emit(stack[-1])
+            elif op == GENERIC_OP:
+                f, arity = arg
+                args = stack[-arity:]
+                del stack[-arity:]
+                push(f(*args))
+            elif op == EVAL_NODE:
+                push(arg.evaluate(env))
+            else:
+                raise ValueError(f"Istruzione sconosciuta {op}")
+
+
+_vm = VM()
+
+
+def run(code, env):
+    # esegue un programma compilato nell'ambiente env
+    return _vm.run(code, env)
@@ -0,0 +1,186 @@
+# ELISA COCEANI SM3201340
+
+import hashlib
+import itertools
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from expressions import Expression, d
+
+
+# Versione del formato dei file salvati su disco: va incrementata se cambia il contenuto dei file
+FORMAT_VERSION = 1
+
+
+# id del dizionario delle operazioni -> (copia del dizionario, impronta, versione)
+_fingerprints = {}
+_versions = itertools.count()
+
+
+def _entry(dispatch):
+    """
+    Impronta del dizionario, calcolata una volta sola: le chiamate successive confrontano il dizionario con la copia
+    memorizzata (confronto delle classi per identità, senza ordinamenti né nuove tuple) e la ricalcolano solo se è
+    cambiato. La versione è un intero diverso per ogni impronta calcolata, usato nelle chiavi della cache.
+    """
+    entry = _fingerprints.get(id(dispatch))
+    if entry is not None and entry[0] == dispatch:
+        return entry
+    entry = (dict(dispatch), tuple(sorted((item, id(operation)) for item, operation in dispatch.items())),
+             next(_versions))
+    _fingerprints[id(dispatch)] = entry
+    return entry
+
+
+def fingerprint(dispatch):
+    """
+    Impronta del dizionario delle operazioni.
+    Cambia se viene aggiunta, rimossa o sostituita un'operazione.
+    """
+    return _entry(dispatch)[1]
+
+
+_sources = {}
+
+
+def _module_hash(module_name):
+    # hash del file sorgente di un modulo: se il codice delle classi cambia, i file su disco non sono più validi
+    if module_name not in _sources:
+        path = getattr(sys.modules.get(module_name), "__file__", None)
+        try:
+            with open(path, "rb") as f:
+                _sources[module_name] = hashlib.sha256(f.read()).hexdigest()
+        except (OSError, TypeError):
+            _sources[module_name] = None
+    return _sources[module_name]
+
+
+def disk_fingerprint(dispatch):
+    """
+    Impronta del dizionario valida anche tra processi diversi: nome e modulo delle classi
+    e hash dei file sorgente dei moduli che le definiscono.
+    """
+    operations = sorted((item, operation.__module__, operation.__qualname__) for item, operation in dispatch.items())
+    modules = sorted({module for _, module, _ in operations})
+    return (FORMAT_VERSION, tuple(operations), tuple((module, _module_hash(module)) for module in modules))
+
+
+class ParseCache:
+    """
+    Cache degli alberi costruiti dal parser, con eliminazione LRU e salvataggio opzionale su disco.
+
+    La chiave è formata dal testo del programma, dall'identità del dizionario delle operazioni e dalla versione della
+    sua impronta: se il dizionario viene modificato le voci precedenti non vengono più trovate (e finiscono per essere
+    eliminate).
+    In memoria vengono mantenuti al massimo maxsize alberi; se directory non è None gli alberi vengono anche
+    salvati con pickle in quella cartella e ricaricati al posto del parsing, anche da altri processi.
+
+    Gli alberi restituiti sono condivisi tra chi chiede lo stesso programma: evaluate non li modifica,
+    ma non vanno modificati da chi li usa.
+    """
+    def __init__(self, maxsize=128, directory=None, parser=Expression.from_program):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.parser = parser
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_writes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, text, dispatch=d):
+        # ritorna l'albero del programma, costruendolo solo se non è già presente nella cache
+        key = (text, id(dispatch), _entry(dispatch)[2])
+
+        with self.lock:
+            tree = self.entries.get(key)
+            if tree is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return tree
+            self.misses += 1
+
+        tree = self.load(text, dispatch) if self.directory is not None else None
+        if tree is None:
+            # le eccezioni del parser non vengono memorizzate: il programma verrà analizzato di nuovo
+            tree = self.parser(text, dispatch)
+            if self.directory is not None:
+                self.store(text, dispatch, tree)
+
+        with self.lock:
+            self.entries[key] = tree
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return tree
+
+    def path(self, text, dispatch):
+        # file su disco dell'albero: il nome dipende dal testo e dall'impronta del dizionario
+        name = hashlib.sha256(repr((disk_fingerprint(dispatch), text)).encode()).hexdigest()
+        return os.path.join(self.directory, name + ".pickle")
+
+    def load(self, text, dispatch):
+        # albero salvato su disco, None se manca, è di una versione diversa o non è leggibile
+        try:
+            with open(self.path(text, dispatch), "rb") as f:
+                saved_fingerprint, saved_text, tree = pickle.load(f)
+        except Exception:
+            return None
+        if saved_fingerprint != disk_fingerprint(dispatch) or saved_text != text:
+            return None
+        with self.lock:
+            self.disk_hits += 1
+        return tree
+
+    def store(self, text, dispatch, tree):
+        # salvataggio atomico: il file viene scritto in un file temporaneo e poi rinominato
+        try:
+            data = pickle.dumps((disk_fingerprint(dispatch), text, tree), protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RecursionError, TypeError, AttributeError):
+            return   # albero non serializzabile (ad esempio troppo profondo): rimane solo in memoria
+        try:
+            fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temporary, self.path(text, dispatch))
+        except OSError:
+            return
+        with self.lock:
+            self.disk_writes += 1
+
+    def clear(self):
+        # svuota la cache in memoria (i file su disco rimangono)
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        # contatori per dimensionare la cache
+        total = self.hits + self.misses
+        return {"size": len(self.entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "disk_hits": self.disk_hits, "disk_writes": self.disk_writes,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def __str__(self):
+        return " ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in self.stats().items())
+
+
+# cache usata da from_program di questo modulo
+default_cache = ParseCache()
+
+
+def from_program(text, dispatch=d):
+    # come Expression.from_program, ma con la cache predefinita
+    return default_cache.get(text, dispatch)
@@ -0,0 +1,204 @@
+# ELISA COCEANI SM3201340
+
+"""
+Ambiente a livelli con copia alla scrittura, per valutare molte varianti dello stesso ambiente di partenza.
+
+Environment si usa al posto del dizionario dell'ambiente in evaluate (e negli altri motori di valutazione).
+Le assegnazioni vengono scritte nel livello superiore, privato dell'ambiente; le letture cercano il nome dal livello
+superiore verso i livelli di base, che non vengono mai modificati:
+
+    base = Environment(env)        # env non viene copiato, ma non deve più essere modificato
+    variante = base.fork()         # O(1): nessuna copia di variabili o array
+    variante["x"] = 3
+    tree.evaluate(variante)
+
+fork congela il livello superiore in un nuovo livello di base condiviso (senza copiarlo) e ritorna un ambiente che
+parte dallo stesso stato; anche l'ambiente originale continua con un livello superiore vuoto, quindi le modifiche
+successive di uno non sono visibili nell'altro. I livelli di base non vengono mai modificati, quindi possono essere
+condivisi tra ambienti usati da thread diversi (ogni ambiente va usato da un thread alla volta).
+
+Gli array (liste, array tipizzati, sparsi e in memoria condivisa) di un livello di base vengono copiati alla prima
+scrittura con setv, vfill o vcopy (writable); la copia sostituisce l'array per tutti i nomi che lo vedevano, come se
+l'array fosse stato modificato. Gli array creati dall'ambiente stesso (ad esempio con valloc) non vengono copiati.
+Oltre MAX_LAYERS livelli, fork unisce i livelli di base in uno solo, così le letture non diventano più lente.
+Ogni lettura e scrittura passa da un metodo Python, quindi la valutazione è più lenta che con un dizionario: conviene
+quando le varianti sono molte o l'ambiente è grande, perché evita di copiarlo per ogni variante.
+"""
+
+import copy
+from collections.abc import MutableMapping
+
+from arrays import TypedArray
+from pfor import SharedArray
+from sparse import SparseArray
+
+
+# Numero massimo di livelli di base di un ambiente
+MAX_LAYERS = 32
+
+# Valori copiati alla prima scrittura
+ARRAYS = (list, TypedArray, SparseArray, SharedArray)
+
+# Valore di un nome rimosso dall'ambiente ma presente in un livello di base
+_DELETED = object()
+
+# Valore di un nome assente da un livello
+_MISSING = object()
+
+
+class Layer:
+    """
+    Livello di base: values non viene più modificato dopo la creazione. arrays (calcolato alla prima richiesta)
+    associa all'id di ogni array del livello i nomi che lo contengono.
+    """
+    __slots__ = ("values", "parent", "depth", "_arrays")
+
+    def __init__(self, values, parent=None):
+        if parent is not None and parent.depth >= MAX_LAYERS:
+            merged = parent.flatten()
+            merged.update(values)
+            values, parent = merged, None
+        self.values = values
+        self.parent = parent
+        self.depth = 1 if parent is None else parent.depth + 1
+        self._arrays = None
+
+    def flatten(self):
+        # tutti i valori visibili dal livello (compresi i nomi rimossi), in un nuovo dizionario
+        layers = []
+        layer = self
+        while layer is not None:
+            layers.append(layer.values)
+            layer = layer.parent
+        result = {}
+        for values in reversed(layers):
+            result.update(values)
+        return result
+
+    @property
+    def arrays(self):
+        # calcolato senza lock: thread diversi ottengono lo stesso risultato
+        if self._arrays is None:
+            arrays = {}
+            for name, value in self.values.items():
+                if isinstance(value, ARRAYS):
+                    arrays.setdefault(id(value), []).append(name)
+            self._arrays = arrays
+        return self._arrays
+
+
+class Environment(MutableMapping):
+    """
+    Ambiente con un livello superiore privato (top) e una catena di livelli di base condivisi (base).
+    values è il dizionario iniziale, che diventa il primo livello di base senza essere copiato.
+    owned contiene gli array già copiati (o creati) da questo ambiente, che possono essere modificati sul posto.
+    """
+    __slots__ = ("top", "base", "owned")
+
+    def __init__(self, values=None):
+        self.top = {}
+        self.base = Layer(values) if values else None
+        self.owned = {}
+
+    # --- interfaccia dei dizionari ---
+
+    def __getitem__(self, name):
+        value = self.top.get(name, _MISSING)
+        layer = self.base
+        while value is _MISSING and layer is not None:
+            value = layer.values.get(name, _MISSING)
+            layer = layer.parent
+        if value is _MISSING or value is _DELETED:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name):
+        value = self.top.get(name, _MISSING)
+        layer = self.base
+        while value is _MISSING and layer is not None:
+            value = layer.values.get(name, _MISSING)
+            layer = layer.parent
+        return value is not _MISSING and value is not _DELETED
+
+    def __setitem__(self, name, value):
+        self.top[name] = value
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.top[name] = _DELETED
+
+    def __iter__(self):
+        seen = set()
+        values = self.top
+        layer = self.base
+        while True:
+            for name, value in values.items():
+                if name not in seen:
+                    seen.add(name)
+                    if value is not _DELETED:
+                        yield name
+            if layer is None:
+                return
+            values = layer.values
+            layer = layer.parent
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Environment({dict(self)!r})"
+
+    # --- livelli ---
+
+    def fork(self):
+        # nuovo ambiente con lo stesso contenuto: il livello superiore diventa un livello di base condiviso
+        if self.top:
+            self.base = Layer(self.top, self.base)
+            self.top = {}
+            self.owned = {}   # gli array del livello congelato ora sono condivisi
+        result = Environment()
+        result.base = self.base
+        return result
+
+    @property
+    def layers(self):
+        return 0 if self.base is None else self.base.depth
+
+    # --- copia alla scrittura ---
+
+    def shared(self, value):
+        # True se value compare in un livello di base
+        key = id(value)
+        layer = self.base
+        while layer is not None:
+            if key in layer.arrays:
+                return True
+            layer = layer.parent
+        return False
+
+    def own(self, value):
+        """
+        Versione modificabile dell'array value: value stesso se appartiene solo a questo ambiente, altrimenti una
+        copia che sostituisce value per tutti i nomi dell'ambiente che lo contengono.
+        """
+        if id(value) in self.owned or not isinstance(value, ARRAYS):
+            return value
+        if not self.shared(value):
+            self.owned[id(value)] = value
+            return value
+        result = copy.copy(value)
+        names = {name for name, item in self.top.items() if item is value}
+        layer = self.base
+        while layer is not None:
+            names.update(layer.arrays.get(id(value), ()))
+            layer = layer.parent
+        for name in names:
+            if name in self and self[name] is value:
+                self.top[name] = result
+        self.owned[id(result)] = result
+        return result
+
+    def writable(self, name):
+        # array name da modificare sul posto (con setv, vfill, vcopy)
+        return self.own(self[name])
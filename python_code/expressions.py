@@ -1,5 +1,11 @@
 # ELISA COCEANI SM3201340
 
+import re
+import sys
+
+import output
+import sparse
+
 # Eccezione per quando si tenta di accedere a un elemento da uno stack vuoto
 class EmptyStackException(Exception):
     pass
@@ -28,6 +34,33 @@ class VariableAlreadyExistsException(Exception):
 class InvalidExpressionError(Exception):
     pass
 
+# Eccezione per quando il corpo di un pfor assegna variabili condivise tra le iterazioni
+class SharedWriteError(Exception):
+    pass
+
+# Eccezione per quando una valutazione supera il numero massimo di passi o il tempo massimo (vedi budget.py):
+# steps sono i passi eseguiti, elapsed i secondi trascorsi, node la forma testuale del ciclo o della chiamata in corso
+# e iterations le iterazioni di quel ciclo
+class BudgetExceeded(Exception):
+    def __init__(self, message, steps=0, elapsed=0.0, node=None, iterations=0):
+        super().__init__(message)
+        self.steps = steps
+        self.elapsed = elapsed
+        self.node = node
+        self.iterations = iterations
+
+    def __reduce__(self):
+        return type(self), (self.args[0], self.steps, self.elapsed, self.node, self.iterations)
+
+
+def writable_array(env, name):
+    # array name dell'ambiente da modificare sul posto (setv, vfill, vcopy): gli ambienti che non sono dizionari
+    # possono ritornarne una copia con il metodo writable (environment.Environment copia gli array condivisi)
+    if type(env) is dict:
+        return env[name]
+    writable = getattr(env, "writable", None)
+    return env[name] if writable is None else writable(name)
+
 
 class Stack:
 
@@ -40,9 +73,8 @@ class Stack:
     def pop(self):
         if self.data == []:
             raise EmptyStackException
-        res = self.data[-1]
-        self.data = self.data[0:-1]
-        return res
+        # pop della lista in tempo costante, senza copiare lo stack
+        return self.data.pop()
 
     def __str__(self):
         return " ".join([str(s) for s in self.data])
@@ -71,20 +103,27 @@ class Expression:
     Gli argomenti delle operazioni non matematiche o booleane, come valloc, setq, setv e altre, vengono invertiti poiché 
     le operazioni stesse richiedono che gli argomenti siano nell'ordine in cui appaiono nella stringa di input.
 
+    I nodi usano __slots__: ogni istanza contiene solo i suoi argomenti, senza un dizionario degli attributi
+    (__weakref__ serve alle cache delle subroutine compilate di bytecode.py e transpiler.py).
+    Con intern i sottoalberi uguali vengono condivisi (vedi Interner).
     """
+    __slots__ = ("__weakref__",)
+
     def __init__(self):
         raise NotImplementedError()
 
     @classmethod
-    def from_program(cls, text, dispatch):
-    
+    def from_program(cls, text, dispatch, intern=False):
+        # intern: True per condividere i sottoalberi uguali del programma, oppure un Interner condiviso tra più programmi
+        interner = Interner.select(intern)
+
         stack = Stack() 
 
         #per ogni elemento nell'espressione da valutare 
         for item in text.split():
 
             if item.isdigit(): #se è una costante viene creata una istanza della classe Constant e inserita nello stack
-                stack.push( Constant(int(item)) )
+                stack.push( Constant(int(item)) if interner is None else interner.constant(int(item)) )
 
             elif item in dispatch: #se è un operazione presente del dizionario
 
@@ -107,6 +146,8 @@ class Expression:
 
                     #viene creata un'istanza dell'operazione effettuata 
                     op_instance = dispatch[item](args)
+                    if interner is not None:
+                        op_instance = interner.node(op_instance)
                 else:
                     op_instance = dispatch[item]()
 
@@ -114,7 +155,7 @@ class Expression:
                 stack.push(op_instance)
 
             else: #altrimenti è una variabile, viene creato un oggetto Variable e inserito nello stack
-                stack.push(Variable(item))
+                stack.push(Variable(item if interner is None else interner.name(item)))
 
         # al terimine della valutazione nello stack deve rimanere un oggetto contenente il risultato dell'espressione, altrimenti è avvenuto un errore 
         if stack.len() != 1:
@@ -122,13 +163,197 @@ class Expression:
         
         return stack.pop() #viene estratto il risultato 
     
+    @classmethod
+    def from_stream(cls, source, dispatch, intern=False):
+        """
+        Versione in tempo lineare di from_program che costruisce l'albero man mano che arrivano gli elementi.
+        source può essere una stringa, un file aperto in modalità testo (letto a blocchi, senza caricarlo
+        tutto in memoria) oppure un qualsiasi iterabile di elementi già separati.
+
+        Gli errori sono gli stessi di from_program, con in più la posizione dell'elemento che li ha causati:
+        riga e colonna per testi e file, numero dell'elemento per gli iterabili.
+        intern ha lo stesso significato che in from_program.
+        """
+        interner = Interner.select(intern)
+        stack = []
+        starts = [] # posizione del primo elemento di ogni espressione nello stack
+
+        for item, position in tokenize(source):
+
+            if item.isdigit():
+                stack.append(Constant(int(item)) if interner is None else interner.constant(int(item)))
+                starts.append(position)
+
+            elif item in dispatch:
+                operation = dispatch[item]
+                arity = operation.arity
+
+                if arity > 0:
+                    if len(stack) < arity:
+                        raise ValueError(f"Non ci sono abbastanza operandi per l'operazione {item} ({position})")
+
+                    # gli argomenti vengono estratti dalla cima dello stack, nello stesso ordine di from_program
+                    args = stack[-arity:]
+                    del stack[-arity:]
+                    start = starts[-arity]
+                    del starts[-arity:]
+                    args = [arg.name if isinstance(arg, Variable) else arg for arg in args]
+
+                    if issubclass(operation, Operation):
+                        args.reverse()
+                    stack.append(operation(args) if interner is None else interner.node(operation(args)))
+                    starts.append(start)
+                else:
+                    stack.append(operation())
+                    starts.append(position)
+
+            else:
+                stack.append(Variable(item if interner is None else interner.name(item)))
+                starts.append(position)
+
+        if len(stack) != 1:
+            if not stack:
+                raise InvalidExpressionError("Espressione non valida: il programma è vuoto")
+            raise InvalidExpressionError(f"Espressione non valida: {len(stack)} espressioni rimaste nello stack, "
+                                         f"la seconda inizia alla posizione: {starts[1]}")
+
+        return stack.pop()
+
     # il metodo evaluate è stato implementato nelle sottoclassi
     def evaluate(self, env):
         raise NotImplementedError()
 
 
+class Interner:
+    """
+    Tabella dei sottoalberi condivisi da from_program e from_stream con intern.
+    Vengono condivise le costanti e le operazioni (Operation) i cui argomenti sono nomi di variabili o altri
+    sottoalberi condivisi: valutarle non modifica né l'ambiente né il nodo, quindi un solo oggetto può comparire
+    in più punti dell'albero. I nomi delle variabili diventano stringhe condivise (sys.intern).
+    Gli altri nodi (setq, cicli, pfor, ...) non vengono condivisi. L'albero risultante è un grafo aciclico:
+    le passate che visitano l'albero incontrano un nodo condiviso una volta per ogni punto in cui compare.
+    """
+    __slots__ = ("nodes", "shared")
+
+    def __init__(self):
+        self.nodes = {}      # chiave strutturale -> nodo condiviso
+        self.shared = set()  # id dei nodi condivisi
+
+    @staticmethod
+    def select(intern):
+        # tabella da usare per il valore del parametro intern: None, una tabella nuova o quella passata
+        if intern is True:
+            return Interner()
+        return intern if isinstance(intern, Interner) else None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def name(self, text):
+        return sys.intern(text)
+
+    def constant(self, value):
+        return self.share((Constant, type(value), value), lambda: Constant(value))
+
+    def node(self, node):
+        # ritorna il nodo condiviso con la stessa struttura di node, oppure node stesso se non può essere condiviso
+        if not isinstance(node, Operation) or type(node).evaluate is not Operation.evaluate:
+            return node
+        key = [type(node)]
+        for arg in node.args:
+            if isinstance(arg, str):
+                key.append(arg)
+            elif id(arg) in self.shared:
+                key.append(id(arg))
+            else:
+                return node
+        return self.share(tuple(key), lambda: node)
+
+    def share(self, key, make):
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = make()
+            self.shared.add(id(node))
+        return node
+
+
+class Position:
+    # Posizione di un elemento del programma, usata nei messaggi d'errore
+    __slots__ = ("line", "column", "index")
+
+    def __init__(self, line, column, index):
+        self.line = line
+        self.column = column
+        self.index = index
+
+    def __str__(self):
+        if self.line is None:
+            return f"elemento {self.index}"
+        return f"riga {self.line}, colonna {self.column}"
+
+
+TOKEN = re.compile(r"\S+")
+
+
+def tokenize(source, chunk_size=1 << 16):
+    """
+    Generatore degli elementi di un programma, ognuno con la sua posizione.
+    Le stringhe e i file vengono divisi negli spazi come fa text.split(); i file sono letti a blocchi
+    di chunk_size caratteri e un elemento spezzato tra due blocchi viene ricomposto.
+    """
+    if isinstance(source, str):
+        chunks = iter((source,))
+    elif hasattr(source, "read"):
+        chunks = iter(lambda: source.read(chunk_size), "")
+    else:
+        # iterabile di elementi già separati: la posizione è il numero dell'elemento
+        for index, item in enumerate(source, 1):
+            yield item, Position(None, None, index)
+        return
+
+    index = 0
+    line = 1
+    line_start = 0   # posizione nel buffer dell'inizio della riga corrente (può essere negativa)
+    buffer = ""
+    last = False
+
+    while not last:
+        chunk = next(chunks, None)
+        if chunk is None:
+            last = True
+            chunk = ""
+        buffer += chunk
+        scanned = 0   # fino a qui le righe sono già state contate
+
+        for match in TOKEN.finditer(buffer):
+            start = match.start()
+            if not last and match.end() == len(buffer):
+                # l'elemento potrebbe continuare nel blocco successivo
+                break
+
+            newlines = buffer.count("\n", scanned, start)
+            if newlines:
+                line += newlines
+                line_start = buffer.rfind("\n", scanned, start) + 1
+            scanned = start
+
+            index += 1
+            yield match.group(), Position(line, start - line_start + 1, index)
+        else:
+            start = len(buffer)
+
+        # nel buffer rimane solo l'eventuale elemento incompleto
+        newlines = buffer.count("\n", scanned, start)
+        if newlines:
+            line += newlines
+            line_start = buffer.rfind("\n", scanned, start) + 1
+        line_start -= start
+        buffer = buffer[start:]
+
+
 class Variable(Expression):
     # Classe le cui istanze rappresentano variabili
+    __slots__ = ("name",)
 
     def __init__(self, name):
         self.name = name
@@ -148,6 +373,7 @@ class Variable(Expression):
 
 class Constant(Expression):
     # Classe le cui istanze rappresentano costanti
+    __slots__ = ("value",)
 
     def __init__(self, value):
         self.value = value
@@ -162,9 +388,10 @@ class Constant(Expression):
 class Operation(Expression):
     # Sottoclasse di Expression che gestiste le operazioni matematiche implementate in seguito
     # Ogni operazione necessita di argomenti (args), a seconda del numero di argomenti richiesto verranno implementate due sottoclassi: BinaryOp e UnaryOP
+    __slots__ = ("args",)
 
     def __init__(self, args):
-        self.args = args
+        self.args = tuple(args)
 
     def evaluate(self, env):
         #lista degli argomenti valutati
@@ -190,25 +417,33 @@ class Operation(Expression):
 
 class BinaryOp(Operation):
     # Sottoclasse di Operation che comprende le operazioni che richiedono due argomenti
+    __slots__ = ()
     arity = 2
 
-    def __init__(self, args):
-        self.x=args[0]
-        self.y=args[1]
-        super().__init__([self.x, self.y])
+    # gli operandi sono memorizzati una volta sola, in args
+    @property
+    def x(self):
+        return self.args[0]
+
+    @property
+    def y(self):
+        return self.args[1]
 
 
 class UnaryOp(Operation):
     # Sottoclasse di Operation che comprende le operazioni che richiedono un solo argomento
+    __slots__ = ()
     arity = 1
-    def __init__(self,args):
-        self.x=args[0]
-        super().__init__([self.x])
+
+    @property
+    def x(self):
+        return self.args[0]
 
 
 
 class Addition(BinaryOp):
     # Vengono implementati un metodo op che ritorna il risultato dell'operazione e un metodo __str__  
+    __slots__ = ()
 
     def op(self, x, y):
         return x + y
@@ -219,6 +454,7 @@ class Addition(BinaryOp):
 
 class Subtraction(BinaryOp):
     # Vengono implementati un metodo op che ritorna il risultato dell'operazione e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x, y):
         return x - y 
@@ -229,6 +465,7 @@ class Subtraction(BinaryOp):
 
 class Division(BinaryOp):
     # Vengono implementati un metodo op che ritorna il risultato dell'operazione e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x, y):
         if y==0:
@@ -242,6 +479,7 @@ class Division(BinaryOp):
 
 class Multiplication(BinaryOp):
     # Vengono implementati un metodo op che ritorna il risultato dell'operazione e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x, y):
         return x * y
@@ -252,6 +490,7 @@ class Multiplication(BinaryOp):
 
 class Power(BinaryOp):
     # Vengono implementati un metodo op che ritorna il risultato dell'operazione e un metodo __str__ 
+    __slots__ = ()
 
     def op( self, x, y):
         return x ** y
@@ -262,6 +501,7 @@ class Power(BinaryOp):
 
 class Modulus(BinaryOp):
     # Vengono implementati un metodo op che ritorna il risultato dell'operazione e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x, y):
         return x % y
@@ -272,6 +512,7 @@ class Modulus(BinaryOp):
 
 class Reciprocal(UnaryOp):
     # Vengono implementati un metodo op che ritorna il risultato dell'operazione e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x):
         if x==0:
@@ -285,6 +526,7 @@ class Reciprocal(UnaryOp):
 
 class AbsoluteValue(UnaryOp):
     # Vengono implementati un metodo op che ritorna il risultato dell'operazione e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x):
         return abs(x)
@@ -295,6 +537,7 @@ class AbsoluteValue(UnaryOp):
 
 class Grater(BinaryOp):
     # Vengono implementati un metodo op che ritorna un valore booleano, e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x, y):
         return x > y
@@ -305,6 +548,7 @@ class Grater(BinaryOp):
 
 class GraterEq(BinaryOp):
     # Vengono implementati un metodo op che ritorna un valore booleano, e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x, y):
         return x >= y
@@ -315,6 +559,7 @@ class GraterEq(BinaryOp):
 
 class Equal(BinaryOp):
     # Vengono implementati un metodo op che ritorna un valore booleano, e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x, y):
         return x == y 
@@ -325,6 +570,7 @@ class Equal(BinaryOp):
 
 class NotEqual(BinaryOp):
     # Vengono implementati un metodo op che ritorna un valore booleano, e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x, y):
         return  x != y
@@ -335,6 +581,7 @@ class NotEqual(BinaryOp):
 
 class Less(BinaryOp):
     # Vengono implementati un metodo op che ritorna un valore booleano, e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x, y):
         return  x < y
@@ -345,6 +592,7 @@ class Less(BinaryOp):
 
 class LessEq(BinaryOp):
     # Vengono implementati un metodo op che ritorna un valore booleano, e un metodo __str__ 
+    __slots__ = ()
 
     def op(self, x, y):
         return x <= y
@@ -356,6 +604,7 @@ class LessEq(BinaryOp):
 class Alloc(Expression):
     # Alloca una variabile e le assegna il valore zero di default
     # L'attributo arity comune a tutte le istanze rappresenta il numero di argomenti, in questo caso si può quindi allocare una sola variabile 
+    __slots__ = ("var",)
 
     arity = 1
 
@@ -374,6 +623,7 @@ class Alloc(Expression):
 
 class Valloc(Expression): 
     # Viene allocato un array x di n elementi tutti con il valore di default zero
+    __slots__ = ("n", "x")
     arity = 2
 
     def __init__(self,args):
@@ -389,15 +639,134 @@ class Valloc(Expression):
         if not isinstance(n, int) or n < 0:
             raise InvalidIndexError(f" La dimensione dell'array {n} deve essere un numero intero positivo")
         
-        env[self.x] = [0] * n
+        # lista di zeri, oppure array sparso per le dimensioni molto grandi (sparse.py)
+        env[self.x] = sparse.allocate(n)
         
 
     def __str__(self):
         return f"valloc({self.n} {self.x})"
 
 
+class TypedValloc(Valloc):
+    # Come valloc, ma l'array ha elementi di un solo tipo in memoria contigua (TypedArray, implementato in arrays.py)
+    __slots__ = ()
+    kind = None
+    name = None
+
+    def evaluate(self, env):
+        n = self.n.evaluate(env)
+        if not isinstance(n, int) or n < 0:
+            raise InvalidIndexError(f" La dimensione dell'array {n} deve essere un numero intero positivo")
+        env[self.x] = arrays.allocate(n, self.kind)
+
+    def __str__(self):
+        return f"{self.name}({self.n} {self.x})"
+
+
+class SparseValloc(Valloc):
+    # Come valloc, ma l'array è sempre sparso: memorizza solo gli elementi scritti (sparse.py)
+    __slots__ = ()
+
+    def evaluate(self, env):
+        n = self.n.evaluate(env)
+        if not isinstance(n, int) or n < 0:
+            raise InvalidIndexError(f" La dimensione dell'array {n} deve essere un numero intero positivo")
+        env[self.x] = sparse.SparseArray(n)
+
+    def __str__(self):
+        return f"svalloc({self.n} {self.x})"
+
+
+class IntValloc(TypedValloc):
+    # array di interi a 64 bit
+    __slots__ = ()
+    kind = "int"
+    name = "ivalloc"
+
+
+class FloatValloc(TypedValloc):
+    # array di float a 64 bit
+    __slots__ = ()
+    kind = "float"
+    name = "fvalloc"
+
+
+class ArrayOperation(Expression):
+    # Operazioni su interi array, liste o array tipizzati (implementate in arrays.py)
+    # Gli argomenti sono nomi di array e valori (espressioni, variabili o costanti)
+    __slots__ = ("args",)
+    name = None
+
+    def __init__(self, args):
+        self.args = tuple(args)
+
+    def __str__(self):
+        return f"{self.name}({' '.join(str(arg) for arg in self.args)})"
+
+
+class Fill(ArrayOperation):
+    # assegna il valore a tutti gli elementi dell'array x: "valore x vfill"
+    __slots__ = ()
+    arity = 2
+    name = "vfill"
+
+    def evaluate(self, env):
+        arrays.fill(self.args[1], self.args[0], env)
+
+
+class Sum(ArrayOperation):
+    # somma degli elementi dell'array x: "x vsum"
+    __slots__ = ()
+    arity = 1
+    name = "vsum"
+
+    def evaluate(self, env):
+        return arrays.total(self.args[0], env)
+
+
+class Min(ArrayOperation):
+    # minimo degli elementi dell'array x: "x vmin"
+    __slots__ = ()
+    arity = 1
+    name = "vmin"
+
+    def evaluate(self, env):
+        return arrays.extreme(self.args[0], env, min)
+
+
+class Max(ArrayOperation):
+    # massimo degli elementi dell'array x: "x vmax"
+    __slots__ = ()
+    arity = 1
+    name = "vmax"
+
+    def evaluate(self, env):
+        return arrays.extreme(self.args[0], env, max)
+
+
+class CopySlice(ArrayOperation):
+    # copia gli elementi da start a end (escluso) dell'array x nell'array y a partire da at: "x start end y at vcopy"
+    __slots__ = ()
+    arity = 5
+    name = "vcopy"
+
+    def evaluate(self, env):
+        arrays.copy(*self.args, env)
+
+
+class Dot(ArrayOperation):
+    # prodotto scalare degli array x e y, che devono avere la stessa dimensione: "x y vdot"
+    __slots__ = ()
+    arity = 2
+    name = "vdot"
+
+    def evaluate(self, env):
+        return arrays.dot(self.args[0], self.args[1], env)
+
+
 class Setq(Expression):
     # Imposta il valore della variabile x al risultato dell'espressione expr
+    __slots__ = ("expr", "x")
     arity = 2
 
     def __init__(self,args):
@@ -425,6 +794,7 @@ class Setq(Expression):
 class Setv(Expression):
     # L'operazione Setv necessita di tre argomenti: espressione expr, posizione n, array x
     # Assegna alla posizione n-esima dell'array x la valutazione dell'apressione expr
+    __slots__ = ("expr", "n", "x")
     arity = 3
 
     def __init__(self, args):
@@ -466,7 +836,7 @@ class Setv(Expression):
         # valutazione dell'espressione
         value = self.expr.evaluate(env) 
         
-        env[var][n] = value 
+        writable_array(env, var)[n] = value 
 
         # viene ritornato il valore dall'array nella posizione n
         return value  
@@ -483,8 +853,10 @@ class Prog(Expression):
     
     Le sottoclassi sono indicate nel dizionario delle operazioni e saranno queste ad essere presenti nelle espressioni.
     """
+    __slots__ = ("args",)
+
     def __init__(self, args):
-        self.args = args
+        self.args = tuple(args)
 
     def evaluate(self, env):
 
@@ -499,6 +871,7 @@ class Prog(Expression):
 
 class Prog2(Prog):
     # Eredita i metodi da Prog
+    __slots__ = ()
     arity = 2
 
     def __init__(self,args):
@@ -507,6 +880,7 @@ class Prog2(Prog):
 
 class Prog3(Prog):
     # Eredita i metodi da Prog
+    __slots__ = ()
     arity = 3
 
     def __init__(self,args):
@@ -515,6 +889,7 @@ class Prog3(Prog):
 
 class Prog4(Prog):
     # Eredita i metodi da Prog
+    __slots__ = ()
     arity = 4
 
     def __init__(self,args):
@@ -523,6 +898,7 @@ class Prog4(Prog):
 
 class If(Expression):
     # Operazione di controllo if-else
+    __slots__ = ("false", "true", "cond")
     arity = 3
 
     def __init__(self, args):
@@ -557,6 +933,7 @@ class If(Expression):
 
 class While(Expression):
     # Implementazione del costrutto while 
+    __slots__ = ("expr", "cond")
     arity = 2
 
     def __init__(self, args):
@@ -575,6 +952,7 @@ class While(Expression):
 
 class For(Expression):
     # Implementazione del ciclo for che valuta l'espressione expr con il valore i, da start a end-1 con incrementi di uno
+    __slots__ = ("expr", "end", "start", "i")
     arity = 4 
 
     def __init__(self, args):
@@ -596,9 +974,27 @@ class For(Expression):
     def __str__(self):
         return f"for({self.expr}, from {self.start} to {self.end}, {self.i})"
 
+
+class ParallelFor(For):
+    # Ciclo for con iterazioni indipendenti, divise tra più processi (l'esecuzione è implementata in pfor.py)
+    # Il corpo può scrivere solo elementi di array con setv: le assegnazioni di variabili sono rifiutate
+    __slots__ = ("targets", "calls", "reads", "reads_targets")
+    arity = 4
+
+    def __init__(self, args):
+        super().__init__(args)
+        pfor.check(self)
+
+    def evaluate(self, env):
+        pfor.run(self, env)
+
+    def __str__(self):
+        return f"pfor({self.expr}, from {self.start} to {self.end}, {self.i})"
+
         
-class DefSub(Exception):
+class DefSub(Expression):
     # Con questa operazione si possono definire delle subroutine
+    __slots__ = ("expr", "var")
     arity = 2
 
     def __init__(self, args):
@@ -615,6 +1011,7 @@ class DefSub(Exception):
 
 class Call(Expression):
     # Valuta l'espressione associata a f definita tramite defsub
+    __slots__ = ("f",)
     arity = 1
 
     def __init__(self,args):
@@ -635,6 +1032,7 @@ class Call(Expression):
 
 class Print(Expression):
     # Valuta l'espressione expr e stampa il risultato, inoltre ritorna il valore dell'espressione
+    __slots__ = ("expr",)
     arity = 1
 
     def __init__(self,args):
@@ -653,8 +1051,8 @@ class Print(Expression):
         else:
             result = self.expr  # gestisci i valori costanti
 
-        # stampa e ritorna il risultato
-        print(result)
+        # stampa (sulla destinazione corrente dell'output) e ritorna il risultato
+        output.emit(result)
         return result
     
     def __str__(self):
@@ -663,6 +1061,7 @@ class Print(Expression):
 
 class Nop(Expression):
     # Non svolge nessuna operazione 
+    __slots__ = ()
     arity=0
 
     def __init__(self):
@@ -679,14 +1078,22 @@ d = {"+": Addition, "*": Multiplication, "**": Power, "-": Subtraction, "/": Div
      "%": Modulus, "1/": Reciprocal, "abs": AbsoluteValue,
      ">": Grater,">=": GraterEq, "=": Equal,"!=": NotEqual, "<": Less, "<=": LessEq,
      "alloc": Alloc, "valloc": Valloc, "setq": Setq, "setv": Setv,
+     "svalloc": SparseValloc, "ivalloc": IntValloc, "fvalloc": FloatValloc, "vfill": Fill, "vsum": Sum, "vmin": Min, "vmax": Max,
+     "vcopy": CopySlice, "vdot": Dot,
      "prog2": Prog2, "prog3": Prog3, "prog4":Prog4,
-     "if": If,"while": While, "for": For,
+     "if": If,"while": While, "for": For, "pfor": ParallelFor,
      "desub": DefSub, "call": Call, "print": Print, "nop":Nop}
 
+# Moduli che implementano le operazioni su interi array e pfor: importano a loro volta expressions, quindi vengono
+# importati qui, dopo che tutte le classi sono state definite
+import arrays
+import pfor
+
 
-example =  "0 2 -"
-e = Expression.from_program(example, d)
+if __name__ == "__main__":
+    example =  "0 2 -"
+    e = Expression.from_program(example, d)
 
-print(e)
-res = e.evaluate({})
-print(res)
+    print(e)
+    res = e.evaluate({})
+    print(res)
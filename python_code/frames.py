@@ -0,0 +1,428 @@
+# ELISA COCEANI SM3201340
+
+from expressions import (Expression, Variable, Constant, Operation,
+                         Alloc, Valloc, Setq, Setv, Prog, If, While, For, DefSub, Call, Print, Nop,
+                         MissingVariableException, MissingFunctionException, InvalidIndexError)
+from bytecode import OPERATORS
+import output
+import sparse
+
+
+class Unset:
+    # Valore delle posizioni del frame che corrispondono a variabili non presenti nell'ambiente
+    def __repr__(self):
+        return "UNSET"
+
+
+UNSET = Unset()
+
+
+"""
+Nodi valutati su un frame: una lista in cui ogni variabile del programma ha una posizione fissa (slot),
+assegnata una volta sola dalla passata di risoluzione. La posizione 0 contiene l'ambiente originale,
+usato solo quando un nodo non può essere valutato sul frame (ad esempio una subroutine definita da un altro programma).
+Ogni nodo fa gli stessi controlli e solleva le stesse eccezioni del metodo evaluate corrispondente.
+"""
+
+
+class FrameConstant:
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate(self, frame):
+        return self.value
+
+
+class FrameLoad:
+    # lettura di una variabile, message è il messaggio d'errore del nodo che la usa
+    def __init__(self, index, message):
+        self.index = index
+        self.message = message
+
+    def evaluate(self, frame):
+        value = frame[self.index]
+        if value is UNSET:
+            raise MissingVariableException(self.message)
+        return value
+
+
+class FrameBinary:
+    # operazione binaria su due sottoespressioni
+    def __init__(self, op, x, y):
+        self.op = op
+        self.x = x
+        self.y = y
+
+    def evaluate(self, frame):
+        return self.op(self.x.evaluate(frame), self.y.evaluate(frame))
+
+
+class FrameBinarySlots:
+    # operazione binaria tra due variabili, lette direttamente dal frame
+    def __init__(self, op, x, y):
+        self.op = op
+        self.i = x.index
+        self.message_x = x.message
+        self.j = y.index
+        self.message_y = y.message
+
+    def evaluate(self, frame):
+        x = frame[self.i]
+        if x is UNSET:
+            raise MissingVariableException(self.message_x)
+        y = frame[self.j]
+        if y is UNSET:
+            raise MissingVariableException(self.message_y)
+        return self.op(x, y)
+
+
+class FrameBinarySlotLeft:
+    # operazione binaria tra una variabile e una sottoespressione
+    def __init__(self, op, x, y):
+        self.op = op
+        self.i = x.index
+        self.message_x = x.message
+        self.y = y
+
+    def evaluate(self, frame):
+        x = frame[self.i]
+        if x is UNSET:
+            raise MissingVariableException(self.message_x)
+        return self.op(x, self.y.evaluate(frame))
+
+
+class FrameBinarySlotRight:
+    # operazione binaria tra una sottoespressione e una variabile
+    def __init__(self, op, x, y):
+        self.op = op
+        self.x = x
+        self.j = y.index
+        self.message_y = y.message
+
+    def evaluate(self, frame):
+        x = self.x.evaluate(frame)
+        y = frame[self.j]
+        if y is UNSET:
+            raise MissingVariableException(self.message_y)
+        return self.op(x, y)
+
+
+class FrameOperation:
+    # operazione con un numero qualsiasi di argomenti
+    def __init__(self, op, args):
+        self.op = op
+        self.args = args
+
+    def evaluate(self, frame):
+        return self.op(*[arg.evaluate(frame) for arg in self.args])
+
+
+class FrameAlloc:
+    def __init__(self, index):
+        self.index = index
+
+    def evaluate(self, frame):
+        frame[self.index] = 0
+
+
+class FrameValloc:
+    def __init__(self, n, index):
+        self.n = n
+        self.index = index
+
+    def evaluate(self, frame):
+        n = self.n.evaluate(frame)
+        if not isinstance(n, int) or n < 0:
+            raise InvalidIndexError(f" La dimensione dell'array {n} deve essere un numero intero positivo")
+        frame[self.index] = sparse.allocate(n)
+
+
+class FrameSetq:
+    def __init__(self, expr, index, name):
+        self.expr = expr
+        self.index = index
+        self.name = name
+
+    def evaluate(self, frame):
+        value = self.expr.evaluate(frame)
+        if frame[self.index] is UNSET:
+            raise MissingVariableException(f" La variabile {self.name} non è presente nell'ambiente")
+        frame[self.index] = value
+        return value
+
+
+class FrameSetv:
+    def __init__(self, expr, n, index, name):
+        self.expr = expr
+        self.n = n
+        self.index = index
+        self.name = name
+
+    def evaluate(self, frame):
+        n = self.n.evaluate(frame)
+        if not isinstance(n, int) or n < 0:
+            raise InvalidIndexError(f" La dimensione dell'array {n} deve essere un numero intero positivo")
+        array = frame[self.index]
+        if array is UNSET:
+            raise MissingVariableException(f"L'array {self.name} non è presente nell'ambiente")
+        if n >= len(array):
+            raise IndexError("Errore: si sta provando ad accedere ad un indice che non esiste")
+        value = self.expr.evaluate(frame)
+        # l'array viene letto di nuovo: l'espressione potrebbe averlo sostituito
+        array = frame[self.index]
+        own = getattr(frame[0], "own", None)
+        if own is not None:
+            # ambiente con copia alla scrittura: la copia sostituisce l'array anche negli altri slot del frame
+            new = own(array)
+            if new is not array:
+                for slot, item in enumerate(frame):
+                    if item is array:
+                        frame[slot] = new
+                array = new
+        array[n] = value
+        return value
+
+
+class FrameProg:
+    def __init__(self, args):
+        self.args = args   # già nell'ordine di valutazione
+
+    def evaluate(self, frame):
+        for expr in self.args:
+            result = expr.evaluate(frame)
+        return result
+
+
+class FrameIf:
+    def __init__(self, false, true, cond):
+        self.false = false
+        self.true = true
+        self.cond = cond
+
+    def evaluate(self, frame):
+        if self.cond.evaluate(frame) is True:
+            return self.true.evaluate(frame)
+        return self.false.evaluate(frame)
+
+
+class FrameWhile:
+    def __init__(self, expr, cond):
+        self.expr = expr
+        self.cond = cond
+
+    def evaluate(self, frame):
+        while self.cond.evaluate(frame):
+            self.expr.evaluate(frame)
+
+
+class FrameFor:
+    # la variabile del ciclo ha una posizione fissa: non serve str(self.i) ad ogni iterazione
+    def __init__(self, expr, end, start, index):
+        self.expr = expr
+        self.end = end
+        self.start = start
+        self.index = index
+
+    def evaluate(self, frame):
+        start = self.start.evaluate(frame)
+        end = self.end.evaluate(frame)
+        index = self.index
+        expr = self.expr
+        for i in range(start, end):
+            frame[index] = i
+            expr.evaluate(frame)
+
+
+class FrameDefSub:
+    # nel frame viene salvato l'albero originale, così l'ambiente rimane utilizzabile anche da evaluate
+    def __init__(self, index, body):
+        self.index = index
+        self.body = body
+
+    def evaluate(self, frame):
+        frame[self.index] = self.body
+
+
+class FrameCall:
+    def __init__(self, program, check, index, name):
+        self.program = program
+        self.check = check   # posizione di self.f, usata per il controllo come in Call.evaluate
+        self.index = index   # posizione di str(self.f)
+        self.name = name
+
+    def evaluate(self, frame):
+        if frame[self.check] is UNSET:
+            raise MissingFunctionException(f"La funzione {self.name} non è presente nell'ambiente")
+        body = frame[self.index]
+        compiled = self.program.subroutines.get(id(body))
+        if compiled is not None and compiled[0] is body:
+            return compiled[1].evaluate(frame)
+        # subroutine definita fuori dal programma: viene valutata sull'ambiente
+        return self.program.fallback(body, frame)
+
+
+class FramePrint:
+    def __init__(self, expr):
+        self.expr = expr
+
+    def evaluate(self, frame):
+        result = self.expr.evaluate(frame)
+        output.emit(result)
+        return result
+
+
+class FrameEval:
+    # nodo non supportato (o valore che non è un'espressione): viene valutato sull'ambiente con evaluate
+    def __init__(self, program, node):
+        self.program = program
+        self.node = node
+
+    def evaluate(self, frame):
+        return self.program.fallback(self.node, frame)
+
+
+class FrameProgram:
+    """
+    Programma con le variabili risolte in posizioni fisse di un frame.
+
+    La passata di risoluzione assegna una posizione ad ogni nome usato dal programma (variabili, array,
+    variabili dei cicli, subroutine) e costruisce un albero di nodi Frame* che leggono e scrivono il frame
+    per indice invece di cercare il nome nel dizionario.
+
+    evaluate(env) accetta lo stesso ambiente dei metodi evaluate: le variabili vengono copiate nel frame
+    all'inizio e riscritte nell'ambiente alla fine, anche se la valutazione solleva un'eccezione.
+    """
+    def __init__(self, tree):
+        self.tree = tree
+        self.names = [None]   # la posizione 0 è riservata all'ambiente
+        self.slots = {}
+        self.subroutines = {}   # id del corpo -> (corpo, corpo compilato), per i defsub del programma
+        self.root = self.expr(tree)
+
+    def slot(self, name):
+        # posizione della variabile nel frame, assegnata al primo utilizzo
+        if name not in self.slots:
+            self.slots[name] = len(self.names)
+            self.names.append(name)
+        return self.slots[name]
+
+    # --- valutazione ---
+
+    def load(self, env):
+        # nuovo frame con i valori presenti nell'ambiente
+        frame = [env]
+        for name in self.names[1:]:
+            frame.append(env[name] if name in env else UNSET)
+        return frame
+
+    def store(self, frame, env):
+        # riscrive nell'ambiente le variabili presenti nel frame
+        for name, value in zip(self.names[1:], frame[1:]):
+            if value is not UNSET:
+                env[name] = value
+
+    def fallback(self, node, frame):
+        # valutazione con evaluate sull'ambiente, sincronizzato con il frame prima e dopo
+        env = frame[0]
+        self.store(frame, env)
+        try:
+            return node.evaluate(env)
+        finally:
+            frame[1:] = self.load(env)[1:]
+
+    def evaluate(self, env):
+        frame = self.load(env)
+        try:
+            return self.root.evaluate(frame)
+        finally:
+            self.store(frame, env)
+
+    # --- risoluzione: gli stessi tre modi di trattare gli argomenti dei metodi evaluate ---
+
+    def expr(self, node):
+        # argomento valutato sempre con il suo metodo evaluate
+        kind = type(node)
+
+        if kind is Constant:
+            return FrameConstant(node.value)
+
+        if kind is Variable:
+            return FrameLoad(self.slot(node.name), f"La variabile {node.name} non è presente nell'ambiente")
+
+        if isinstance(node, Operation) and kind.evaluate is Operation.evaluate:
+            args = [self.lookup(arg, "Manca il valore della variabile '{}") for arg in node.args]
+            op = OPERATORS.get(kind, node.op)
+            if len(args) == 2:
+                x, y = args
+                if type(x) is FrameLoad and type(y) is FrameLoad:
+                    return FrameBinarySlots(op, x, y)
+                if type(x) is FrameLoad:
+                    return FrameBinarySlotLeft(op, x, y)
+                if type(y) is FrameLoad:
+                    return FrameBinarySlotRight(op, x, y)
+                return FrameBinary(op, x, y)
+            return FrameOperation(op, args)
+
+        if kind is Alloc:
+            return FrameAlloc(self.slot(node.var))
+
+        if kind is Valloc:
+            return FrameValloc(self.expr(node.n), self.slot(node.x))
+
+        if kind is Setq:
+            return FrameSetq(self.value(node.expr), self.slot(node.x), node.x)
+
+        if kind is Setv:
+            n = self.lookup(node.n, "La variabile {} non è presente nell'ambiente")
+            return FrameSetv(self.expr(node.expr), n, self.slot(str(node.x)), node.x)
+
+        if isinstance(node, Prog) and kind.evaluate is Prog.evaluate:
+            return FrameProg([self.expr(arg) for arg in node.args[::-1]])
+
+        if kind is If:
+            cond = self.lookup(node.cond, "La varibaile {} non è presente nell'ambiente")
+            return FrameIf(self.value(node.false), self.value(node.true), cond)
+
+        if kind is While:
+            return FrameWhile(self.expr(node.expr), self.expr(node.cond))
+
+        if kind is For:
+            return FrameFor(self.expr(node.expr), self.value(node.end), self.value(node.start),
+                            self.slot(str(node.i)))
+
+        if kind is DefSub:
+            # il corpo viene risolto subito, verrà usato dalle call di questo programma
+            if id(node.expr) not in self.subroutines:
+                self.subroutines[id(node.expr)] = (node.expr, None)
+                self.subroutines[id(node.expr)] = (node.expr, self.expr(node.expr))
+            return FrameDefSub(self.slot(str(node.var)), node.expr)
+
+        if kind is Call:
+            return FrameCall(self, self.slot(node.f), self.slot(str(node.f)), node.f)
+
+        if kind is Print:
+            return FramePrint(self.lookup(node.expr, "Valore mancante per la variabile '{}'"))
+
+        if kind is Nop:
+            return FrameConstant(None)
+
+        return FrameEval(self, node)
+
+    def value(self, node):
+        # argomento valutato solo se è un'espressione, altrimenti usato così com'è
+        if isinstance(node, Expression):
+            return self.expr(node)
+        return FrameConstant(node)
+
+    def lookup(self, node, message):
+        # argomento che può essere un'espressione, il nome di una variabile o una costante
+        if isinstance(node, Expression):
+            return self.expr(node)
+        if isinstance(node, str):
+            return FrameLoad(self.slot(node), message.format(node))
+        return FrameConstant(node)
+
+
+def resolve(tree):
+    # passata di risoluzione delle variabili: ritorna il programma da valutare con evaluate(env)
+    return FrameProgram(tree)
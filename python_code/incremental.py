@@ -0,0 +1,196 @@
+# ELISA COCEANI SM3201340
+
+"""
+Valutazione incrementale di un albero valutato più volte con ambienti che cambiano di poco.
+
+IncrementalEvaluator memorizza il valore di ogni sottoalbero e, per ogni variabile, i nodi che la leggono
+direttamente; da questi si risale ai padri per trovare i nodi che dipendono dalla variabile. A ogni valutazione
+i valori delle variabili lette vengono confrontati con quelli della valutazione precedente, i valori dei nodi che
+dipendono da variabili cambiate vengono scartati e solo quei nodi vengono ricalcolati: gli altri sottoalberi
+riusano il valore memorizzato.
+
+Il risultato e le eccezioni sono quelli di tree.evaluate(env), perché senza effetti collaterali un sottoalbero
+con gli stessi valori delle variabili ha lo stesso valore. Per questo gli alberi che contengono nodi con effetti
+collaterali (assegnazioni, array, cicli, print, subroutine) o nodi di tipi non previsti vengono sempre valutati
+per intero con evaluate; reason indica il motivo.
+I valori che non sono numeri, booleani, stringhe o None (ad esempio gli array, che possono essere modificati senza
+essere riassegnati) vengono considerati cambiati a ogni valutazione.
+"""
+
+from expressions import Expression, Constant, Variable, Operation, Prog, If, Nop, d
+from iterative import STEPS, _step
+from tree import arguments, children, walk
+
+
+_names = {operation: item for item, operation in d.items()}
+
+# Tipi dei valori confrontati tra una valutazione e l'altra
+SCALARS = (int, float, bool, str, type(None))
+
+
+def unsupported(tree):
+    # motivo per cui l'albero non può essere valutato in modo incrementale, None se può esserlo
+    for node in walk(tree):
+        kind = type(node)
+        if kind in (Constant, Variable, Nop, If):
+            continue
+        if issubclass(kind, Operation) and kind.evaluate is Operation.evaluate:
+            continue
+        if issubclass(kind, Prog) and kind.evaluate is Prog.evaluate:
+            continue
+        return f"contiene {_names.get(kind, kind.__name__)}, che può avere effetti collaterali"
+    return None
+
+
+def _key(value):
+    # valore confrontabile con la valutazione successiva; None se va considerato sempre cambiato
+    kind = type(value)
+    if kind not in SCALARS:
+        return None
+    if kind is float:
+        return kind, value.hex()   # 0.0 e -0.0 sono diversi
+    return kind, value
+
+
+class IncrementalEvaluator:
+    """
+    Valutazione ripetuta di tree: evaluate(env) ritorna il valore di tree.evaluate(env) ricalcolando solo
+    i nodi che dipendono da variabili cambiate dalla valutazione precedente.
+    reused conta i nodi non ricalcolati perché il valore di un loro antenato (o il loro) è stato riusato,
+    evaluated i nodi ricalcolati, full_runs le valutazioni complete (prima valutazione o albero non supportato).
+    L'albero non deve essere modificato dopo la creazione dell'evaluator.
+    """
+    def __init__(self, tree):
+        self.tree = tree
+        self.reason = unsupported(tree)
+        self.values = {}      # id del nodo -> valore memorizzato
+        self.seen = {}        # nome di variabile -> (valore, _key del valore) nella valutazione precedente
+        self.parents = {}     # id del nodo -> padri (più di uno se il sottoalbero è condiviso)
+        self.readers = {}     # nome di variabile -> nodi che la leggono direttamente
+        self.sizes = {}       # id del nodo -> numero di nodi del sottoalbero
+        self.nodes = []       # nodi dell'albero, una volta sola (tengono validi gli id)
+        self.reused = 0
+        self.evaluated = 0
+        self.full_runs = 0
+        if self.reason is None:
+            self.build()
+
+    def build(self):
+        # visita in ordine posticipato senza ricorsione; i sottoalberi condivisi vengono visitati una volta sola
+        stack = [(self.tree, False)]
+        while stack:
+            node, done = stack.pop()
+            if done:
+                self.sizes[id(node)] = 1 + sum(self.sizes[id(child)] for child in children(node))
+                continue
+            if id(node) in self.sizes:
+                continue
+            self.sizes[id(node)] = None
+            self.nodes.append(node)
+            stack.append((node, True))
+            for arg in arguments(node):
+                if isinstance(arg, Expression):
+                    self.parents.setdefault(id(arg), []).append(node)
+                    stack.append((arg, False))
+                elif isinstance(arg, str):
+                    self.readers.setdefault(arg, []).append(node)
+            if type(node) is Variable:
+                self.readers.setdefault(node.name, []).append(node)
+
+    def changed(self, env):
+        # nomi delle variabili lette con un valore diverso dalla valutazione precedente (o mancanti)
+        names = []
+        seen = self.seen
+        for name in self.readers:
+            if name not in env:
+                names.append(name)
+                seen.pop(name, None)
+                continue
+            value = env[name]
+            if name in seen and seen[name][0] is value:
+                continue   # stesso oggetto, immutabile
+            key = _key(value)
+            if key is None:
+                names.append(name)
+                seen.pop(name, None)
+                continue
+            if name not in seen or seen[name][1] != key:
+                names.append(name)
+            seen[name] = (value, key)
+        return names
+
+    def discard(self, names):
+        # scarta i valori dei nodi che leggono le variabili names e dei loro antenati
+        stack = [node for name in names for node in self.readers[name]]
+        visited = set()
+        while stack:
+            node = stack.pop()
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            self.values.pop(id(node), None)
+            stack.extend(self.parents.get(id(node), ()))
+
+    def evaluate(self, env):
+        if self.reason is not None:
+            self.full_runs += 1
+            return self.tree.evaluate(env)
+        if not self.values:
+            self.full_runs += 1
+        self.discard(self.changed(env))
+        return self.value(self.tree, env)
+
+    def value(self, tree, env):
+        # come tree.evaluate(env), riusando i valori memorizzati dei sottoalberi; i nodi con figli sono valutati
+        # con i generatori di iterative.py, quindi la profondità dell'albero non è limitata dalla ricorsione
+        values = self.values
+        frames = []   # (generatore, nodo)
+        node = tree
+        while True:
+            key = id(node)
+            if key in values:
+                value = values[key]
+                self.reused += self.sizes[key]
+            elif isinstance(node, Expression):
+                self.evaluated += 1
+                kind = type(node)
+                step = STEPS[kind] if kind in STEPS else _step(kind)
+                if step is None:
+                    value = values[key] = node.evaluate(env)   # Constant, Variable, Nop
+                else:
+                    frame = step(node, env)
+                    try:
+                        node = frame.send(None)
+                        frames.append((frame, key))
+                        continue
+                    except StopIteration as stop:
+                        value = values[key] = stop.value
+            else:
+                # valore che non è un nodo (ad esempio un argomento di prog): come nel metodo evaluate del padre
+                value = node.evaluate(env)
+
+            while frames:
+                try:
+                    node = frames[-1][0].send(value)
+                    break
+                except StopIteration as stop:
+                    _, key = frames.pop()
+                    value = values[key] = stop.value
+            else:
+                return value
+
+    def invalidate(self):
+        # scarta tutti i valori memorizzati: la prossima valutazione è completa
+        self.values.clear()
+        self.seen.clear()
+
+    def stats(self):
+        total = self.reused + self.evaluated
+        return {"nodes": len(self.nodes), "reused": self.reused, "evaluated": self.evaluated,
+                "full_runs": self.full_runs, "reuse_rate": self.reused / total if total else 0.0}
+
+    def __str__(self):
+        if self.reason is not None:
+            return f"valutazione completa: {self.reason}"
+        return " ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in self.stats().items())
@@ -0,0 +1,193 @@
+# ELISA COCEANI SM3201340
+
+"""
+Espansione delle chiamate a subroutine (inlining).
+
+Le subroutine sono definite con desub (la parola chiave del linguaggio, a volte chiamata defsub) e chiamate con call.
+call f viene sostituita dal corpo di f quando è sicuro che al momento della chiamata l'ambiente contiene proprio
+quel corpo:
+- f è definita da un solo desub nel programma e non viene assegnata in altri modi (setq, alloc, valloc, for);
+- il desub è sicuramente già stato valutato, nella stessa valutazione, quando viene valutata la chiamata.
+
+Per il secondo punto la passata segue l'ordine di valutazione: gli argomenti di prog dall'ultimo al primo, la
+condizione di if prima dei rami (dopo l'if sono definite solo le subroutine definite in entrambi i rami), inizio e
+fine di for prima del corpo; il corpo di un ciclo può non essere eseguito. Una chiamata che non viene espansa può
+eseguire qualsiasi subroutine, anche definita da un altro programma nello stesso ambiente, quindi dopo di essa
+nessuna subroutine è più considerata definita; nei cicli questo vale anche per le iterazioni successive.
+
+Le chiamate ricorsive (a una subroutine che si sta già espandendo) non vengono espanse e restano chiamate normali.
+I corpi più grandi di MAX_BODY nodi non vengono espansi e l'albero cresce al massimo di MAX_GROWTH nodi.
+I corpi dei desub non vengono modificati, perché possono essere chiamati da altri programmi con l'ambiente in uno
+stato diverso; le chiamate al loro interno vengono espanse solo nelle copie espanse, dove lo stato è noto.
+
+Dopo l'espansione il corpo fa parte dell'albero e le altre passate (ad esempio loops.optimize_loops, che non
+ottimizza i cicli che contengono chiamate) possono ottimizzarlo insieme al codice che lo chiama.
+"""
+
+from expressions import Expression, Prog, If, While, For, ParallelFor, DefSub, Call
+from tree import arguments, rebuild, size, target, walk
+
+
+# Numero massimo di nodi del corpo di una subroutine da espandere
+MAX_BODY = 200
+
+# Numero massimo di nodi aggiunti all'albero dalla passata
+MAX_GROWTH = 5000
+
+# Numero massimo di espansioni annidate (corpi espansi dentro corpi espansi)
+MAX_DEPTH = 16
+
+NOTHING = frozenset()
+
+
+def definitions(tree):
+    # corpi delle subroutine definite da un solo desub e non assegnate in altri modi: nome -> corpo
+    bodies = {}
+    others = set()
+    for node in walk(tree):
+        name = target(node)
+        if name is None:
+            continue
+        if isinstance(node, DefSub):
+            bodies.setdefault(name, []).append(node.expr)
+        else:
+            others.add(name)
+    return {name: found[0] for name, found in bodies.items()
+            if len(found) == 1 and name not in others and isinstance(found[0], Expression)}
+
+
+class Inliner:
+    """
+    Passata che espande le chiamate alle subroutine definite staticamente. L'albero originale non viene modificato.
+    inlined conta le chiamate espanse, recursive quelle ricorsive, large quelle oltre i limiti di dimensione,
+    unknown quelle a subroutine non definite staticamente o non sicuramente definite al momento della chiamata.
+    """
+    def __init__(self, max_body=MAX_BODY, max_growth=MAX_GROWTH):
+        self.max_body = max_body
+        self.max_growth = max_growth
+        self.bodies = {}
+        self.inlined = 0
+        self.recursive = 0
+        self.large = 0
+        self.unknown = 0
+        self.growth = 0   # nodi aggiunti
+
+    def run(self, tree):
+        self.bodies = definitions(tree)
+        node, _, _ = self.visit(tree, NOTHING, ())
+        return node
+
+    def visit(self, node, defined, stack):
+        """
+        Espande le chiamate in node. defined sono le subroutine sicuramente definite prima della valutazione di
+        node, stack quelle che si stanno espandendo. Ritorna (nuovo nodo, subroutine sicuramente definite dopo la
+        valutazione, True se la valutazione può assegnare subroutine con chiamate non espanse).
+        """
+        if not isinstance(node, Expression):
+            return node, defined, False
+        if isinstance(node, Call):
+            return self.call(node, defined, stack)
+        if isinstance(node, DefSub):
+            # il corpo non viene valutato (né modificato)
+            name = str(node.var)
+            return node, defined | {name} if name in self.bodies else defined, False
+        if isinstance(node, ParallelFor):
+            # le iterazioni possono essere eseguite in altri processi: il nodo non viene modificato
+            if any(isinstance(item, Call) for item in walk(node)):
+                return node, NOTHING, True
+            return node, defined, False
+        if isinstance(node, Prog) and type(node).evaluate is Prog.evaluate:
+            return self.sequence(node, defined, stack)
+        if isinstance(node, If):
+            return self.branch(node, defined, stack)
+        if isinstance(node, (While, For)):
+            return self.loop(node, defined, stack)
+        return self.generic(node, defined, stack)
+
+    def call(self, node, defined, stack):
+        name = str(node.f)
+        if type(node) is Call and name in defined:
+            body = self.bodies[name]
+            if name in stack:
+                self.recursive += 1
+            elif size(body) > self.max_body or self.growth + size(body) > self.max_growth or len(stack) >= MAX_DEPTH:
+                self.large += 1
+            else:
+                self.inlined += 1
+                self.growth += size(body) - 1
+                return self.visit(body, defined, stack + (name,))
+        else:
+            self.unknown += 1
+        return node, NOTHING, True
+
+    def sequence(self, node, defined, stack):
+        # prog valuta gli argomenti dall'ultimo al primo
+        args = list(node.args)
+        changes = False
+        for index in reversed(range(len(args))):
+            args[index], defined, changed = self.visit(args[index], defined, stack)
+            changes = changes or changed
+        return rebuild(node, args), defined, changes
+
+    def branch(self, node, defined, stack):
+        cond, defined, changes = self.visit(node.cond, defined, stack)
+        true, after_true, changed_true = self.visit(node.true, defined, stack)
+        false, after_false, changed_false = self.visit(node.false, defined, stack)
+        return (rebuild(node, [false, true, cond]), after_true & after_false,
+                changes or changed_true or changed_false)
+
+    def repeated(self, visit, defined):
+        # visita di una parte valutata a ogni iterazione: se può assegnare subroutine, le iterazioni successive
+        # partono senza subroutine definite e la visita viene ripetuta
+        state = self.counters()
+        result = visit(defined)
+        if result[-1] and defined:
+            self.restore(state)
+            result = visit(NOTHING)
+        return result
+
+    def loop(self, node, defined, stack):
+        if isinstance(node, While):
+            # la condizione viene valutata prima di ogni iterazione e dopo l'ultima
+            def iteration(defined):
+                cond, defined, changes = self.visit(node.cond, defined, stack)
+                expr, _, changed = self.visit(node.expr, defined, stack)
+                return cond, expr, defined, changes or changed
+            cond, expr, defined, changes = self.repeated(iteration, defined)
+            return rebuild(node, [expr, cond]), defined, changes
+        # inizio e fine vengono valutati una volta sola, prima del corpo
+        start, defined, changes = self.visit(node.start, defined, stack)
+        end, defined, changed = self.visit(node.end, defined, stack)
+        expr, after, body_changes = self.repeated(lambda defined: self.visit(node.expr, defined, stack), defined)
+        if body_changes:
+            defined = defined & after   # il ciclo termina dopo il corpo dell'ultima iterazione, se ce ne sono
+        return rebuild(node, [expr, end, start, node.i]), defined, changes or changed or body_changes
+
+    def generic(self, node, defined, stack):
+        # l'ordine di valutazione degli argomenti non è noto: ognuno parte dallo stato prima del nodo
+        state = self.counters()
+        old = arguments(node)
+        results = [self.visit(arg, defined, stack) for arg in old]
+        if any(changed for _, _, changed in results):
+            if defined:
+                self.restore(state)
+                results = [self.visit(arg, NOTHING, stack) for arg in old]
+            return rebuild(node, [new for new, _, _ in results]), NOTHING, True
+        return rebuild(node, [new for new, _, _ in results]), defined, False
+
+    def counters(self):
+        return self.inlined, self.recursive, self.large, self.unknown, self.growth
+
+    def restore(self, state):
+        # annulla i conteggi di una visita che viene ripetuta
+        self.inlined, self.recursive, self.large, self.unknown, self.growth = state
+
+    def __str__(self):
+        return (f"chiamate espanse: {self.inlined}, ricorsive: {self.recursive}, troppo grandi: {self.large}, "
+                f"non note: {self.unknown}, nodi aggiunti: {self.growth}")
+
+
+def inline_calls(tree, max_body=MAX_BODY, max_growth=MAX_GROWTH):
+    # ritorna l'albero con le chiamate espanse e la passata con le statistiche
+    inliner = Inliner(max_body, max_growth)
+    return inliner.run(tree), inliner
@@ -0,0 +1,197 @@
+# ELISA COCEANI SM3201340
+
+"""
+Valutazione degli alberi senza ricorsione.
+
+Ogni nodo in valutazione è un generatore che esegue lo stesso codice del suo metodo evaluate, ma invece di chiamare
+evaluate sui figli li cede (yield) e riceve il loro valore. I generatori attivi sono tenuti in una lista, quindi la
+memoria usata cresce linearmente con la profondità dell'albero (e delle chiamate a subroutine) e non dipende da
+sys.setrecursionlimit né dalla dimensione dello stack del C.
+
+Risultati ed eccezioni sono quelli dei metodi evaluate. I nodi di tipi non previsti (ad esempio sottoclassi che
+ridefiniscono evaluate) vengono valutati con il loro metodo evaluate, che può essere ricorsivo.
+"""
+
+from expressions import (Expression, Variable, Constant, Operation, Alloc, Valloc, Setq, Setv, Prog,
+                         If, While, For, DefSub, Call, Print, Nop,
+                         MissingVariableException, MissingFunctionException, InvalidIndexError, writable_array)
+import output
+import sparse
+
+
+# --- nodi senza figli: la funzione ritorna direttamente il valore ---
+
+def _variable(node, env):
+    if node.name not in env:
+        raise MissingVariableException(f"La variabile {node.name} non è presente nell'ambiente")
+    return env[node.name]
+
+
+def _alloc(node, env):
+    env[node.var] = 0
+
+
+def _defsub(node, env):
+    env[str(node.var)] = node.expr
+
+
+LEAVES = {Constant: lambda node, env: node.value, Variable: _variable, Alloc: _alloc, DefSub: _defsub,
+          Nop: lambda node, env: None}
+
+
+# --- nodi con figli: generatori che cedono i figli da valutare ---
+
+def _operation(node, env):
+    values = []
+    for arg in node.args:
+        if isinstance(arg, Expression):
+            values.append((yield arg))
+        elif isinstance(arg, str):
+            if arg in env:
+                values.append(env[arg])
+            else:
+                raise MissingVariableException(f"Manca il valore della variabile '{arg}")
+        else:
+            values.append(arg)
+    return node.op(*values)
+
+
+def _valloc(node, env):
+    n = yield node.n
+    if not isinstance(n, int) or n < 0:
+        raise InvalidIndexError(f" La dimensione dell'array {n} deve essere un numero intero positivo")
+    env[node.x] = sparse.allocate(n)
+
+
+def _setq(node, env):
+    value = (yield node.expr) if isinstance(node.expr, Expression) else node.expr
+    if node.x not in env:
+        raise MissingVariableException(f" La variabile {node.x} non è presente nell'ambiente")
+    env[node.x] = value
+    return env[node.x]
+
+
+def _setv(node, env):
+    if isinstance(node.n, Expression):
+        n = yield node.n
+    elif isinstance(node.n, str):
+        if node.n in env:
+            n = env[node.n]
+        else:
+            raise MissingVariableException(f"La variabile {node.n} non è presente nell'ambiente")
+    else:
+        n = node.n
+    if not isinstance(n, int) or n < 0:
+        raise InvalidIndexError(f" La dimensione dell'array {n} deve essere un numero intero positivo")
+    var = str(node.x)
+    if var not in env:
+        raise MissingVariableException(f"L'array {node.x} non è presente nell'ambiente")
+    if n >= len(env[var]):
+        raise IndexError("Errore: si sta provando ad accedere ad un indice che non esiste")
+    value = yield node.expr
+    writable_array(env, var)[n] = value
+    return value
+
+
+def _prog(node, env):
+    for expr in node.args[::-1]:
+        result = yield expr
+    return result
+
+
+def _if(node, env):
+    if isinstance(node.cond, Expression):
+        condition = yield node.cond
+    elif isinstance(node.cond, str):
+        if node.cond in env:
+            condition = env[node.cond]
+        else:
+            raise MissingVariableException(f"La varibaile {node.cond} non è presente nell'ambiente")
+    else:
+        condition = node.cond
+    if condition is True:
+        return (yield node.true) if isinstance(node.true, Expression) else node.true
+    return (yield node.false) if isinstance(node.false, Expression) else node.false
+
+
+def _while(node, env):
+    while (yield node.cond):
+        yield node.expr
+
+
+def _for(node, env):
+    start = (yield node.start) if isinstance(node.start, Expression) else node.start
+    end = (yield node.end) if isinstance(node.end, Expression) else node.end
+    for i in range(start, end):
+        env[str(node.i)] = i
+        yield node.expr
+
+
+def _call(node, env):
+    if node.f not in env:
+        raise MissingFunctionException(f"La funzione {node.f} non è presente nell'ambiente")
+    return (yield env[str(node.f)])
+
+
+def _print(node, env):
+    if isinstance(node.expr, Expression):
+        result = yield node.expr
+    elif isinstance(node.expr, str):
+        if node.expr in env:
+            result = env[node.expr]
+        else:
+            raise MissingVariableException(f"Valore mancante per la variabile '{node.expr}'")
+    else:
+        result = node.expr
+    output.emit(result)
+    return result
+
+
+STEPS = {Valloc: _valloc, Setq: _setq, Setv: _setv, If: _if, While: _while, For: _for, Call: _call, Print: _print}
+
+
+def _step(kind):
+    # generatore per i nodi di tipo kind, None se il tipo va valutato con il suo metodo evaluate
+    if kind not in STEPS:
+        if issubclass(kind, Operation) and kind.evaluate is Operation.evaluate:
+            STEPS[kind] = _operation
+        elif issubclass(kind, Prog) and kind.evaluate is Prog.evaluate:
+            STEPS[kind] = _prog
+        else:
+            STEPS[kind] = None
+    return STEPS[kind]
+
+
+def evaluate(tree, env):
+    # valuta l'albero come tree.evaluate(env), usando una lista di generatori al posto dello stack delle chiamate
+    frames = []
+    node = tree
+    while True:
+        kind = type(node)
+        leaf = LEAVES.get(kind)
+        if leaf is not None:
+            value = leaf(node, env)
+        else:
+            step = STEPS[kind] if kind in STEPS else _step(kind)
+            if step is None:
+                # nodo sconosciuto o valore che non è un nodo: come nel metodo evaluate del padre
+                value = node.evaluate(env)
+            else:
+                frame = step(node, env)
+                try:
+                    node = frame.send(None)
+                    frames.append(frame)
+                    continue
+                except StopIteration as stop:
+                    value = stop.value
+
+        # il valore torna ai nodi in attesa, fino a quando uno di loro chiede di valutare un altro figlio
+        while frames:
+            try:
+                node = frames[-1].send(value)
+                break
+            except StopIteration as stop:
+                frames.pop()
+                value = stop.value
+        else:
+            return value
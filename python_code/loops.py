@@ -0,0 +1,310 @@
+# ELISA COCEANI SM3201340
+
+"""
+Ottimizzazione dei cicli: spostamento delle sottoespressioni invarianti e riduzione di forza.
+
+Sottoespressioni invarianti: nel corpo di un for o di un while (e nella condizione del while) le operazioni pure
+che leggono solo variabili non assegnate nel ciclo hanno lo stesso valore a ogni iterazione. Vengono sostituite da
+nodi Invariant che le valutano la prima volta che vengono raggiunte e poi ritornano il valore memorizzato, fino
+alla prossima esecuzione del ciclo. La prima valutazione avviene nello stesso punto dell'originale, quindi anche le
+eccezioni (variabile mancante, divisione per zero) e l'ordine delle stampe restano gli stessi, anche se il ciclo
+non esegue iterazioni o l'espressione si trova in un ramo di un if non scelto.
+
+L'analisi degli effetti collaterali del ciclo raccoglie le variabili assegnate da setq, alloc, valloc, desub e
+dalle variabili dei for annidati. I cicli che contengono call (la subroutine può assegnare qualsiasi variabile) o
+nodi di tipi non previsti non vengono ottimizzati. Se il ciclo modifica array (setv, vfill, vcopy, ...), il valore
+di un'espressione viene memorizzato solo se le variabili che legge non contengono array: ad esempio a b = con a e
+b array può cambiare senza che a e b vengano assegnate.
+
+Riduzione di forza: nei for le moltiplicazioni della variabile del ciclo per una costante intera (i 4 *) e le
+potenze di due (i 2 **, cioè 2 ** i) diventano nodi che calcolano il valore dal valore precedente con una somma
+quando la variabile è aumentata di uno dalla valutazione precedente, e con l'operazione originale altrimenti.
+
+I valori memorizzati e lo stato della riduzione di forza non stanno nei nodi ma in un frame creato da ogni esecuzione
+del ciclo (per thread): l'albero ottimizzato può essere condiviso, ad esempio dalla cache degli alberi, e valutato
+contemporaneamente da più thread.
+
+I corpi di desub e di pfor non vengono modificati: vengono valutati fuori dal ciclo o in altri processi.
+"""
+
+import threading
+
+from expressions import (Expression, Constant, Variable, Multiplication, Power, Valloc,
+                         Setv, ArrayOperation, Prog, If, While, For, ParallelFor, DefSub, Print, Nop,
+                         MissingVariableException)
+from optimizer import PURE
+from tree import arguments, is_node, rebuild, target
+
+
+# Tipi dei valori che non possono essere modificati da setv o dalle operazioni sugli array
+SCALARS = (int, float, bool, str, type(None))
+
+
+class _State(threading.local):
+    # frame: valori temporanei del ciclo ottimizzato in esecuzione in questo thread (None fuori dai cicli)
+    frame = None
+
+
+_state = _State()
+
+_MISSING = object()
+
+
+class Invariant(Expression):
+    """
+    Sottoespressione pura che non cambia durante il ciclo: viene valutata alla prima esecuzione del nodo dopo
+    l'inizio del ciclo e poi viene ritornato il valore memorizzato. Il valore non sta nel nodo ma nel frame del
+    ciclo in esecuzione (HoistingWhile o HoistingFor), quindi lo stesso albero può essere valutato da più thread o
+    in modo annidato. names sono le variabili lette; se check è True il valore viene memorizzato solo se sono
+    tutte scalari.
+    """
+    __slots__ = ("expr", "names", "check")
+
+    def __init__(self, expr, names, check=False):
+        self.expr = expr
+        self.names = tuple(names)
+        self.check = check
+
+    def evaluate(self, env):
+        frame = _state.frame
+        if frame is None:
+            return self.expr.evaluate(env)
+        value = frame.get(self, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = self.expr.evaluate(env)
+        if not self.check or all(type(env[name]) in SCALARS for name in self.names):
+            frame[self] = value
+        return value
+
+    def __str__(self):
+        return str(self.expr)
+
+
+class HoistingWhile(While):
+    """
+    while con sottoespressioni invarianti o riduzioni di forza: ogni esecuzione crea un nuovo frame (nodo -> valore
+    temporaneo) per i nodi Invariant e Induction valutati durante il ciclo, che viene scartato alla fine.
+    """
+    __slots__ = ()
+
+    def evaluate(self, env):
+        previous = _state.frame
+        _state.frame = {}
+        try:
+            return super().evaluate(env)
+        finally:
+            _state.frame = previous
+
+
+class HoistingFor(For):
+    __slots__ = ()
+
+    def evaluate(self, env):
+        previous = _state.frame
+        _state.frame = {}
+        try:
+            return super().evaluate(env)
+        finally:
+            _state.frame = previous
+
+
+def _read(arg):
+    # (nome, messaggio dell'eccezione se manca) per un argomento che è una variabile, None altrimenti
+    if isinstance(arg, str):
+        return arg, f"Manca il valore della variabile '{arg}"
+    if type(arg) is Variable:
+        return arg.name, f"La variabile {arg.name} non è presente nell'ambiente"
+    return None
+
+
+def _integer(arg):
+    # valore di un argomento costante intero (non booleano), None altrimenti
+    value = arg.value if type(arg) is Constant else arg
+    return value if type(value) is int else None
+
+
+class InductionMultiplication(Multiplication):
+    """
+    i c * con c costante intera: se i è aumentata di uno dalla valutazione precedente il risultato è il
+    risultato precedente più c. L'ultimo valore di i e il risultato corrispondente stanno nel frame del ciclo in
+    esecuzione. name è None se gli argomenti non hanno questa forma (rebuild con altri argomenti): in quel caso il
+    nodo si comporta come Multiplication, come anche fuori da un ciclo ottimizzato.
+    """
+    __slots__ = ("name", "missing", "step")
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.name = None
+        for variable, constant in ((args[0], args[1]), (args[1], args[0])):
+            if _read(variable) is not None and _integer(constant) is not None:
+                self.name, self.missing = _read(variable)
+                self.step = _integer(constant)
+                break
+
+    def evaluate(self, env):
+        name = self.name
+        frame = _state.frame
+        if name is None or frame is None:
+            return super().evaluate(env)
+        if name not in env:
+            raise MissingVariableException(self.missing)
+        i = env[name]
+        if type(i) is not int:
+            return super().evaluate(env)
+        last, result = frame.get(self, (0, 0))
+        if i == last + 1:
+            result += self.step
+        elif i != last:
+            result = i * self.step
+        frame[self] = (i, result)
+        return result
+
+
+class InductionPower(Power):
+    """
+    i 2 ** (2 ** i): se i è aumentata di uno dalla valutazione precedente il risultato è il doppio del
+    risultato precedente. Gli esponenti negativi (risultato float) sono calcolati come in Power.
+    """
+    __slots__ = ("name", "missing")
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.name = None
+        if _integer(args[0]) == 2 and _read(args[1]) is not None:
+            self.name, self.missing = _read(args[1])
+
+    def evaluate(self, env):
+        name = self.name
+        frame = _state.frame
+        if name is None or frame is None:
+            return super().evaluate(env)
+        if name not in env:
+            raise MissingVariableException(self.missing)
+        i = env[name]
+        if type(i) is not int or i < 0:
+            return super().evaluate(env)
+        last, result = frame.get(self, (0, 1))
+        if i == last + 1:
+            result += result
+        elif i != last:
+            result = 2 ** i
+        frame[self] = (i, result)
+        return result
+
+
+def effects(node):
+    """
+    Effetti collaterali della valutazione del nodo: (variabili assegnate, True se può modificare array).
+    Ritorna None se non sono noti (call o nodi di tipi non previsti).
+    """
+    written = set()
+    mutates = False
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if not is_node(node):
+            continue
+        name = target(node)
+        if name is not None:
+            written.add(name)
+            mutates = mutates or isinstance(node, (Valloc, ParallelFor))
+        elif isinstance(node, (Setv, ArrayOperation)):
+            mutates = True
+        elif not isinstance(node, (Constant, Variable, Nop, Invariant, Prog, If, While, Print) + PURE):
+            return None
+        stack.extend(arguments(node))
+    return written, mutates
+
+
+def _names(node):
+    # variabili lette da un'espressione pura, None se non è un'espressione pura
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            names.add(node)
+        elif type(node) is Variable:
+            names.add(node.name)
+        elif isinstance(node, PURE):
+            stack.extend(node.args)
+        elif isinstance(node, Expression) and type(node) is not Constant:
+            return None
+    return names
+
+
+class LoopOptimizer:
+    """
+    Passata che sposta le sottoespressioni invarianti dei cicli in nodi Invariant e applica la riduzione di forza
+    alle variabili dei for. L'albero originale non viene modificato.
+    """
+    def __init__(self):
+        self.loops = 0      # cicli ottimizzati
+        self.hoisted = 0    # sottoespressioni invarianti
+        self.reduced = 0    # moltiplicazioni e potenze ridotte
+        self.skipped = 0    # cicli con effetti non noti
+
+    def run(self, tree):
+        return self.visit(tree)
+
+    def visit(self, node):
+        if not is_node(node) or type(node) in (DefSub, ParallelFor):
+            return node
+        node = rebuild(node, [self.visit(arg) for arg in arguments(node)])
+        kind = type(node)
+        if kind not in (While, For):
+            return node
+        found = effects(node)
+        if found is None:
+            self.skipped += 1
+            return node
+        written, mutates = found
+        loop = self.hoisted, self.reduced
+        if kind is For:
+            variable = str(node.i)
+            expr = self.hoist(node.expr, written, mutates, variable)
+            args = [expr, node.end, node.start, node.i]
+            replacement = HoistingFor
+        else:
+            args = [self.hoist(arg, written, mutates, None) for arg in (node.expr, node.cond)]
+            replacement = HoistingWhile
+        if (self.hoisted, self.reduced) == loop:
+            return node
+        self.loops += 1
+        return replacement(args)
+
+    def hoist(self, node, written, mutates, variable):
+        # sostituisce le sottoespressioni invarianti di node (esclusi i corpi dei cicli annidati)
+        if not isinstance(node, Expression):
+            return node
+        if isinstance(node, PURE):
+            names = _names(node)
+            if names is not None and not names & written:
+                self.hoisted += 1
+                return Invariant(node, sorted(names), mutates)
+        if isinstance(node, While) or type(node) is DefSub:
+            return node
+        args = arguments(node)
+        if isinstance(node, For):
+            # start e end vengono valutati una volta per esecuzione del ciclo annidato, il corpo a ogni iterazione
+            new = args[:1] + [self.hoist(arg, written, mutates, variable) for arg in args[1:3]] + args[3:]
+        else:
+            new = [self.hoist(arg, written, mutates, variable) for arg in args]
+        node = rebuild(node, new)
+        if variable is not None and type(node) in (Multiplication, Power):
+            reduced = (InductionMultiplication if type(node) is Multiplication else InductionPower)(node.args)
+            if reduced.name == variable:
+                self.reduced += 1
+                return reduced
+        return node
+
+    def __str__(self):
+        return (f"cicli ottimizzati: {self.loops}, espressioni invarianti: {self.hoisted}, "
+                f"riduzioni di forza: {self.reduced}, cicli non ottimizzati: {self.skipped}")
+
+
+def optimize_loops(tree):
+    # ritorna l'albero con i cicli ottimizzati e la passata con le statistiche
+    optimizer = LoopOptimizer()
+    return optimizer.run(tree), optimizer
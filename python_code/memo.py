@@ -0,0 +1,269 @@
+# ELISA COCEANI SM3201340
+
+"""
+Memoizzazione delle chiamate a subroutine pure.
+
+Il corpo di una subroutine è puro se non assegna variabili né array, non stampa e non definisce subroutine: il suo
+valore dipende solo dai valori delle variabili che legge. Per i corpi puri MemoCall memorizza il risultato in una
+MemoCache, con chiave il corpo e i valori esatti (tipo compreso) delle variabili lette, e alle chiamate successive con
+gli stessi valori ritorna il risultato senza valutare il corpo.
+
+Sono considerati impuri, oltre ai corpi con setq, setv, alloc, valloc, print e desub, anche quelli con cicli for
+(assegnano la variabile del ciclo), operazioni su interi array (gli array possono cambiare senza essere riassegnati),
+chiamate ad altre subroutine (la subroutine chiamata dipende dall'ambiente) e nodi di tipi non previsti.
+Le chiamate a corpi impuri, o con variabili lette mancanti o non hashabili, vengono valutate come Call.evaluate.
+
+La passata CallMemoizer sostituisce anche setq, alloc, valloc e for con versioni che, quando assegnano una variabile,
+eliminano dalla cache i risultati che ne dipendono. Le voci che non vengono eliminate (ad esempio perché la variabile
+è assegnata da un nodo non sostituito) restano comunque corrette, perché la chiave contiene i valori letti: occupano
+solo spazio fino a quando la politica LRU le scarta.
+Le eccezioni sollevate dal corpo non vengono memorizzate.
+"""
+
+import weakref
+from collections import OrderedDict
+
+from expressions import (Expression, Constant, Variable, Operation, Prog, If, While, Nop, Setq, Alloc, Valloc, For,
+                         DefSub, Call, MissingFunctionException, d)
+from tree import arguments, is_node, rebuild, walk
+
+
+# Numero massimo di risultati memorizzati da una MemoCache
+MAXSIZE = 1024
+
+_names = {operation: item for item, operation in d.items()}
+_missing = object()
+
+
+def classify(body):
+    """
+    Analisi del corpo di una subroutine: ritorna (motivo, letture), dove motivo è None se il corpo è puro e
+    letture è la tupla ordinata dei nomi delle variabili lette.
+    """
+    if not isinstance(body, Expression):
+        return "il corpo non è un'espressione", ()
+    names = set()
+    for node in walk(body):
+        kind = type(node)
+        if kind is Variable:
+            names.add(node.name)
+        elif kind in (Constant, Nop, If, While) \
+                or (issubclass(kind, Operation) and kind.evaluate is Operation.evaluate) \
+                or (issubclass(kind, Prog) and kind.evaluate is Prog.evaluate):
+            names.update(arg for arg in arguments(node) if isinstance(arg, str))
+        else:
+            return f"contiene {_names.get(kind, kind.__name__)}", ()
+    return None, tuple(sorted(names))
+
+
+def _key(value):
+    # parte della chiave per il valore di una variabile: 1, 1.0 e True sono diversi, e così 0.0 e -0.0
+    if type(value) is float:
+        return float, value.hex()
+    return type(value), value
+
+
+class MemoCache:
+    """
+    Cache LRU dei risultati delle chiamate a subroutine pure, con al massimo maxsize risultati.
+    hits e misses contano le chiamate a corpi puri trovate o non trovate nella cache, skipped quelle valutate
+    senza cache (corpo impuro o valori non utilizzabili come chiave), invalidations i risultati eliminati perché
+    una variabile letta è stata assegnata.
+    """
+    def __init__(self, maxsize=MAXSIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()                   # chiave -> (risultato, nomi letti)
+        self.dependents = {}                           # nome di variabile -> chiavi che ne dipendono
+        self.analyses = weakref.WeakKeyDictionary()    # corpo -> risultato di classify
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.skipped = 0
+
+    def analysis(self, body):
+        try:
+            return self.analyses[body]
+        except KeyError:
+            result = self.analyses[body] = classify(body)
+            return result
+        except TypeError:   # valore che non supporta riferimenti deboli (non è un nodo)
+            return classify(body)
+
+    def call(self, body, env):
+        # valore del corpo nell'ambiente env, preso dalla cache se il corpo è puro
+        reason, reads = self.analysis(body)
+        if reason is not None or any(name not in env for name in reads):
+            # le variabili mancanti sollevano la stessa eccezione di Call.evaluate
+            self.skipped += 1
+            return body.evaluate(env)
+        key = (body, tuple(_key(env[name]) for name in reads))
+        try:
+            entry = self.entries.get(key, _missing)
+        except TypeError:   # valore non hashabile, ad esempio un array
+            self.skipped += 1
+            return body.evaluate(env)
+        if entry is not _missing:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        value = body.evaluate(env)
+        self.entries[key] = (value, reads)
+        for name in reads:
+            self.dependents.setdefault(name, set()).add(key)
+        while len(self.entries) > self.maxsize:
+            old, (_, names) = self.entries.popitem(last=False)
+            self.forget(old, names)
+            self.evictions += 1
+        return value
+
+    def forget(self, key, names):
+        # toglie la chiave dagli insiemi delle variabili da cui dipende
+        for name in names:
+            keys = self.dependents.get(name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.dependents[name]
+
+    def invalidate(self, name):
+        # elimina i risultati che dipendono dalla variabile name, appena assegnata
+        keys = self.dependents.pop(name, None)
+        if keys:
+            for key in keys:
+                _, names = self.entries.pop(key)
+                self.forget(key, names)
+                self.invalidations += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self.entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                "skipped": self.skipped, "evictions": self.evictions, "invalidations": self.invalidations,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def __str__(self):
+        return " ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in self.stats().items())
+
+    def clear(self):
+        self.entries.clear()
+        self.dependents.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class MemoCall(Call):
+    # chiamata che usa la cache per i corpi puri
+    __slots__ = ("cache",)
+
+    def __init__(self, args, cache=None):
+        super().__init__(args)
+        self.cache = cache if cache is not None else MemoCache()
+
+    def evaluate(self, env):
+        if self.f not in env:
+            raise MissingFunctionException(f"La funzione {self.f} non è presente nell'ambiente")
+        return self.cache.call(env[str(self.f)], env)
+
+
+class MemoSetq(Setq):
+    __slots__ = ("cache",)
+
+    def __init__(self, args, cache=None):
+        super().__init__(args)
+        self.cache = cache if cache is not None else MemoCache()
+
+    def evaluate(self, env):
+        value = super().evaluate(env)
+        self.cache.invalidate(self.x)
+        return value
+
+
+class MemoAlloc(Alloc):
+    __slots__ = ("cache",)
+
+    def __init__(self, args, cache=None):
+        super().__init__(args)
+        self.cache = cache if cache is not None else MemoCache()
+
+    def evaluate(self, env):
+        super().evaluate(env)
+        self.cache.invalidate(self.var)
+
+
+class MemoValloc(Valloc):
+    __slots__ = ("cache",)
+
+    def __init__(self, args, cache=None):
+        super().__init__(args)
+        self.cache = cache if cache is not None else MemoCache()
+
+    def evaluate(self, env):
+        super().evaluate(env)
+        self.cache.invalidate(self.x)
+
+
+class MemoFor(For):
+    __slots__ = ("cache",)
+
+    def __init__(self, args, cache=None):
+        super().__init__(args)
+        self.cache = cache if cache is not None else MemoCache()
+
+    def evaluate(self, env):
+        start = self.start.evaluate(env) if isinstance(self.start, Expression) else self.start
+        end = self.end.evaluate(env) if isinstance(self.end, Expression) else self.end
+        # stesso ciclo di For.evaluate: ogni assegnazione della variabile elimina i risultati che ne dipendono
+        name = str(self.i)
+        for i in range(start, end):
+            env[name] = i
+            self.cache.invalidate(name)
+            self.expr.evaluate(env)
+
+
+# nodi sostituiti dalla passata (solo i tipi esatti: le sottoclassi ridefiniscono evaluate)
+REPLACEMENTS = {Call: MemoCall, Setq: MemoSetq, Alloc: MemoAlloc, Valloc: MemoValloc, For: MemoFor}
+
+
+class CallMemoizer:
+    """
+    Passata che sostituisce le chiamate con MemoCall e le assegnazioni con le versioni che invalidano la cache.
+    Tutti i nodi sostituiti usano la stessa cache. L'albero originale non viene modificato.
+    """
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else MemoCache()
+        self.calls = 0
+        self.assignments = 0
+
+    def run(self, tree):
+        return self.visit(tree)
+
+    def visit(self, node):
+        if not is_node(node):
+            return node
+        node = rebuild(node, [self.visit(arg) for arg in arguments(node)])
+        replacement = REPLACEMENTS.get(type(node))
+        if replacement is None:
+            return node
+        if replacement is MemoCall:
+            self.calls += 1
+        else:
+            self.assignments += 1
+        return replacement(arguments(node), self.cache)
+
+    def __str__(self):
+        return f"chiamate memoizzate: {self.calls}, assegnazioni che invalidano: {self.assignments}, cache: {self.cache}"
+
+
+def explain(tree):
+    # per ogni subroutine definita nell'albero: (nome, motivo per cui non è pura oppure None, variabili lette)
+    return [(str(node.var),) + classify(node.expr) for node in walk(tree) if type(node) is DefSub]
+
+
+def memoize_calls(tree, maxsize=MAXSIZE):
+    # ritorna l'albero con le chiamate memoizzate e la passata con le statistiche (la cache è memoizer.cache)
+    memoizer = CallMemoizer(MemoCache(maxsize))
+    return memoizer.run(tree), memoizer
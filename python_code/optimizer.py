@@ -0,0 +1,216 @@
+# ELISA COCEANI SM3201340
+
+import math
+
+from expressions import (Expression, Variable, Constant, Operation, BinaryOp, UnaryOp,
+                         Addition, Subtraction, Division, Multiplication, Power, Modulus,
+                         Reciprocal, AbsoluteValue, Grater, GraterEq, Equal, NotEqual, Less, LessEq,
+                         If, While, For, DefSub, Nop)
+from tree import arguments, rebuild, is_node, size
+
+
+# Operazioni senza effetti collaterali: se gli argomenti sono costanti possono essere calcolate una volta sola
+PURE = (Addition, Subtraction, Division, Multiplication, Power, Modulus, Reciprocal, AbsoluteValue,
+        Grater, GraterEq, Equal, NotEqual, Less, LessEq)
+
+# Operazioni il cui risultato, se la valutazione non solleva eccezioni, è sempre un numero (int o float, non bool)
+ALWAYS_NUMERIC = (Subtraction, Division, Power, Reciprocal, AbsoluteValue)
+
+# Oltre questo numero di bit il risultato di una potenza costante non viene calcolato durante l'ottimizzazione
+MAX_POWER_BITS = 4096
+
+
+def constant_value(arg):
+    """
+    Ritorna (True, valore) se l'argomento ha un valore noto senza valutare l'ambiente:
+    una costante o un valore che non è né un'espressione né il nome di una variabile.
+    """
+    if type(arg) is Constant:
+        return True, arg.value
+    if not is_node(arg) and not isinstance(arg, str):
+        return True, arg
+    return False, None
+
+
+def is_number(value):
+    return type(value) in (int, float)
+
+
+def numeric(arg, variables=False):
+    """
+    True se il valore dell'argomento, quando la valutazione non solleva eccezioni, è sempre un numero.
+    Ad esempio 1 + x riesce solo se x è un numero, mentre x * 2 può essere anche una lista o una stringa.
+    Se variables è True si assume che tutte le variabili contengano numeri.
+    """
+    known, value = constant_value(arg)
+    if known:
+        return is_number(value)
+    if isinstance(arg, str) or type(arg) is Variable:
+        return variables
+    kind = type(arg)
+    if kind in ALWAYS_NUMERIC:
+        return True
+    if kind is Addition:
+        return numeric(arg.x, variables) or numeric(arg.y, variables)
+    if kind is Modulus:
+        return numeric(arg.x, variables)
+    if kind is Multiplication:
+        return numeric(arg.x, variables) and numeric(arg.y, variables)
+    return False
+
+
+def is_zero(arg):
+    known, value = constant_value(arg)
+    return known and type(value) is int and value == 0
+
+
+def is_one(arg):
+    known, value = constant_value(arg)
+    return known and type(value) is int and value == 1
+
+
+class ConstantFolder:
+    """
+    Passata di ottimizzazione sull'albero ritornato da from_program:
+    - le operazioni pure con argomenti costanti vengono sostituite dal loro risultato (2 3 ** 4 * diventa 36)
+    - vengono applicate le identità algebriche sicure (x + 0, x - 0, x * 1, x ** 1, abs(abs(x)))
+    - gli If con condizione costante vengono sostituiti dal ramo scelto, i cicli che non vengono mai
+      eseguiti (while con condizione falsa, for su un intervallo vuoto) diventano nop
+
+    Un'operazione che solleverebbe un'eccezione (ad esempio una divisione per zero) non viene calcolata e
+    rimane nell'albero, così l'errore viene sollevato durante la valutazione come prima.
+    Le identità sono applicate solo quando l'altro argomento è sicuramente un numero: x + 0 con x booleano
+    darebbe un int, con x lista solleverebbe un'eccezione. Con numeric_variables=True chi usa la passata
+    garantisce che le variabili contengono solo numeri, e le identità valgono anche per x 0 + o x 1 *;
+    se il risultato è una variabile dove serve un'espressione viene usato un nodo Variable.
+
+    Il corpo di desub non viene ottimizzato: desub lo assegna così com'è alla variabile, quindi il valore nell'ambiente
+    (che si può stampare o confrontare) resta quello del programma originale.
+
+    L'albero originale non viene modificato: i nodi cambiati vengono ricostruiti, gli altri sono condivisi.
+    """
+    def __init__(self, numeric_variables=False):
+        self.numeric_variables = numeric_variables
+        self.folded = 0      # operazioni calcolate durante l'ottimizzazione
+        self.simplified = 0  # identità algebriche applicate
+        self.pruned = 0      # if e cicli eliminati
+        self.before = 0
+        self.after = 0
+
+    def run(self, tree):
+        self.before += size(tree)
+        tree = self.visit(tree)
+        if isinstance(tree, str):
+            tree = Variable(tree)
+        self.after += size(tree)
+        return tree
+
+    def numeric(self, arg):
+        return numeric(arg, self.numeric_variables)
+
+    @property
+    def removed(self):
+        # numero di nodi eliminati
+        return self.before - self.after
+
+    def visit(self, node):
+        if not is_node(node) or type(node) is DefSub:
+            return node
+        old = arguments(node)
+        args = [self.visit(arg) for arg in old]
+        if not isinstance(node, Operation):
+            # solo le operazioni accettano nomi di variabili al posto dei sottoalberi
+            args = [Variable(new) if is_node(arg) and isinstance(new, str) else new for arg, new in zip(old, args)]
+        node = rebuild(node, args)
+
+        if isinstance(node, Operation):
+            return self.operation(node)
+        kind = type(node)
+        if kind is If:
+            return self.branch(node)
+        if kind is While:
+            # la condizione di While viene sempre valutata con evaluate: solo Constant è sicura
+            if type(node.cond) is Constant and not node.cond.value:
+                self.pruned += 1
+                return Nop()
+        if kind is For:
+            start_known, start = constant_value(node.start)
+            end_known, end = constant_value(node.end)
+            if start_known and end_known and type(start) is int and type(end) is int and start >= end:
+                self.pruned += 1
+                return Nop()
+        return node
+
+    def operation(self, node):
+        kind = type(node)
+        if kind not in PURE:
+            return node
+
+        values = [constant_value(arg) for arg in node.args]
+        if all(known for known, _ in values):
+            return self.fold(node, [value for _, value in values])
+
+        if issubclass(kind, BinaryOp):
+            x, y = node.x, node.y
+            # x e y sono nell'ordine del metodo op: il risultato è op(x, y)
+            if kind is Addition:
+                if is_zero(x) and self.numeric(y):
+                    return self.simplify(y)
+                if is_zero(y) and self.numeric(x):
+                    return self.simplify(x)
+            elif kind is Subtraction:
+                if is_zero(y) and self.numeric(x):
+                    return self.simplify(x)
+            elif kind is Multiplication:
+                if is_one(x) and self.numeric(y):
+                    return self.simplify(y)
+                if is_one(y) and self.numeric(x):
+                    return self.simplify(x)
+            elif kind is Power:
+                if is_one(y) and self.numeric(x):
+                    return self.simplify(x)
+        elif issubclass(kind, UnaryOp):
+            if kind is AbsoluteValue and type(node.x) is AbsoluteValue:
+                return self.simplify(node.x)
+        return node
+
+    def fold(self, node, values):
+        if type(node) is Power and not self.small_power(*values):
+            return node
+        try:
+            result = node.op(*values)
+        except Exception:
+            # l'errore deve essere sollevato durante la valutazione, l'operazione rimane nell'albero
+            return node
+        self.folded += 1
+        return Constant(result)
+
+    def small_power(self, x, y):
+        # evita di calcolare potenze enormi durante l'ottimizzazione
+        if not (is_number(x) and is_number(y)) or abs(x) <= 1 or y <= 0:
+            return True
+        return y * math.log2(abs(x)) <= MAX_POWER_BITS
+
+    def simplify(self, node):
+        self.simplified += 1
+        return node
+
+    def branch(self, node):
+        # If con condizione costante: rimane solo il ramo scelto (con la stessa semantica "is True" di If.evaluate)
+        known, condition = constant_value(node.cond)
+        if not known:
+            return node
+        self.pruned += 1
+        chosen = node.true if condition is True else node.false
+        # un ramo che non è un'espressione viene ritornato da If così com'è
+        return chosen if isinstance(chosen, Expression) else Constant(chosen)
+
+    def __str__(self):
+        return (f"nodi: {self.before} -> {self.after} (eliminati {self.removed}), "
+                f"operazioni calcolate: {self.folded}, identità: {self.simplified}, rami eliminati: {self.pruned}")
+
+
+def fold_constants(tree):
+    # ritorna l'albero ottimizzato e la passata con le statistiche
+    folder = ConstantFolder()
+    return folder.run(tree), folder
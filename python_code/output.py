@@ -0,0 +1,178 @@
+# ELISA COCEANI SM3201340
+
+"""
+Destinazione dell'output di print.
+
+print non chiama più direttamente la funzione print di Python: passa il valore alla destinazione (sink) corrente del
+thread con emit. Senza una destinazione impostata il valore viene scritto subito su sys.stdout, come prima (anche
+contextlib.redirect_stdout continua a funzionare). Con using(sink) la destinazione cambia per le valutazioni
+eseguite nel blocco with, da tutti i motori (evaluate, bytecode, transpiler, iterative, frames):
+
+    with output.using(output.BufferedSink()):
+        tree.evaluate(env)          # le righe vengono scritte su sys.stdout a blocchi di BUFFER_SIZE caratteri
+
+Destinazioni disponibili:
+- StreamSink: scrive ogni riga subito su uno stream (sys.stdout se non indicato);
+- BufferedSink: accumula le righe in memoria e le scrive quando superano limit caratteri e alla fine di using;
+- TextSink: accumula le righe, che getvalue ritorna come stringa (output di un programma di parallel e del server);
+- CallbackSink: passa i valori, senza formattarli, a una funzione;
+- GeneratorSink: manda i valori, senza formattarli, a un generatore con send;
+- NullSink: scarta i valori (per i benchmark).
+
+Le righe sono formattate al momento di print (str(valore) seguito da un a capo, come la funzione print), quindi un
+array modificato dopo la stampa non cambia l'output; CallbackSink e GeneratorSink ricevono invece il valore stesso.
+La destinazione è per thread e parallel.run_program e i blocchi di pfor usano ciascuno la propria, quindi gli output
+di valutazioni diverse non si mescolano.
+"""
+
+import contextlib
+import sys
+import threading
+
+
+# Caratteri accumulati da BufferedSink prima di scriverli sullo stream
+BUFFER_SIZE = 1 << 20
+
+_current = threading.local()   # destinazione delle valutazioni in corso in questo thread
+
+
+class Sink:
+    # Destinazione dell'output: write riceve ogni valore stampato, flush scrive quello che è stato accumulato
+    def write(self, value):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class StreamSink(Sink):
+    """
+    Scrive ogni valore su stream appena viene stampato. Con stream None viene usato sys.stdout al momento della
+    scrittura, quindi anche lo stream sostituito da contextlib.redirect_stdout.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, value):
+        stream = sys.stdout if self.stream is None else self.stream
+        stream.write(f"{value}\n")
+
+    def flush(self):
+        stream = sys.stdout if self.stream is None else self.stream
+        stream.flush()
+
+
+class BufferedSink(Sink):
+    # Accumula le righe e le scrive su stream (sys.stdout se None) con una sola write quando superano limit caratteri
+    def __init__(self, stream=None, limit=BUFFER_SIZE):
+        self.stream = stream
+        self.limit = limit
+        self.lines = []
+        self.size = 0
+
+    def write(self, value):
+        line = f"{value}\n"
+        self.lines.append(line)
+        self.size += len(line)
+        if self.size >= self.limit:
+            self.flush()
+
+    def flush(self):
+        if not self.lines:
+            return
+        text = "".join(self.lines)
+        self.lines = []
+        self.size = 0
+        stream = sys.stdout if self.stream is None else self.stream
+        stream.write(text)
+
+
+class TextSink(Sink):
+    # Accumula le righe in memoria: getvalue ritorna il testo stampato
+    def __init__(self):
+        self.lines = []
+
+    def write(self, value):
+        self.lines.append(f"{value}\n")
+
+    def getvalue(self):
+        return "".join(self.lines)
+
+
+class CallbackSink(Sink):
+    # Chiama callback(valore) per ogni valore stampato
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, value):
+        self.callback(value)
+
+
+class GeneratorSink(Sink):
+    """
+    Manda ogni valore stampato al generatore con send (il generatore viene avviato alla creazione della
+    destinazione). close chiude il generatore.
+    """
+    def __init__(self, generator):
+        self.generator = generator
+        next(generator)
+
+    def write(self, value):
+        self.generator.send(value)
+
+    def close(self):
+        self.generator.close()
+
+
+class CollectSink(Sink):
+    # Memorizza i valori stampati nella lista values (usata dai blocchi di pfor per riportarli al processo principale)
+    def __init__(self):
+        self.values = []
+
+    def write(self, value):
+        self.values.append(value)
+
+
+class NullSink(Sink):
+    # Scarta i valori stampati
+    def write(self, value):
+        pass
+
+
+_default = StreamSink()
+
+
+def current():
+    # destinazione corrente di questo thread
+    return getattr(_current, "sink", _default)
+
+
+def emit(value):
+    # chiamata da print: passa il valore alla destinazione corrente
+    getattr(_current, "sink", _default).write(value)
+
+
+@contextlib.contextmanager
+def using(sink, close=False):
+    """
+    Imposta sink come destinazione di questo thread nel blocco with. All'uscita (anche per un'eccezione) viene
+    chiamato flush, oppure close se close è True, e viene ripristinata la destinazione precedente.
+    """
+    previous = getattr(_current, "sink", None)
+    _current.sink = sink
+    try:
+        yield sink
+    finally:
+        try:
+            if close:
+                sink.close()
+            else:
+                sink.flush()
+        finally:
+            if previous is None:
+                del _current.sink
+            else:
+                _current.sink = previous
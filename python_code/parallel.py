@@ -0,0 +1,124 @@
+# ELISA COCEANI SM3201340
+
+"""
+Valutazione di molti programmi indipendenti su più processi.
+
+Ogni programma è una coppia (testo, ambiente). I programmi vengono divisi in blocchi e mandati ai processi di un
+ProcessPoolExecutor: il parsing e la valutazione avvengono nei processi, al processo principale tornano solo i
+risultati. L'output di print viene raccolto separatamente per ogni programma.
+
+Gli ambienti passati non vengono modificati: l'ambiente alla fine della valutazione è in ProgramResult.env.
+"""
+
+import copy
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from expressions import d
+import budget
+import cache
+import output
+
+
+class ProgramResult:
+    # Risultato della valutazione di un programma: il valore oppure l'eccezione, l'output di print e l'ambiente finale
+    def __init__(self, value=None, error=None, output="", env=None):
+        self.value = value
+        self.error = error
+        self.output = output
+        self.env = env
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def result(self):
+        # come Future.result: ritorna il valore o solleva l'eccezione del programma
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"ProgramResult(error={self.error!r})"
+        return f"ProgramResult(value={self.value!r})"
+
+
+def run_program(text, env=None, dispatch=d, steps=None, seconds=None):
+    # parsing e valutazione di un programma, con l'output di print raccolto in una stringa (destinazione TextSink)
+    # steps e seconds limitano la valutazione come in budget.evaluate
+    env = {} if env is None else env
+    sink = output.TextSink()
+    try:
+        with output.using(sink):
+            value = budget.evaluate(cache.from_program(text, dispatch), env, steps, seconds)
+    except Exception as ex:
+        return ProgramResult(error=ex, output=sink.getvalue(), env=env)
+    return ProgramResult(value, None, sink.getvalue(), env)
+
+
+def _transferable(result):
+    # risultato che può essere mandato al processo principale (valori o ambienti non serializzabili vengono sostituiti)
+    try:
+        pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        return result
+    except Exception as ex:
+        return ProgramResult(error=ex, output=result.output)
+
+
+def _run_chunk(start, programs, dispatch):
+    # eseguita nei processi: ritorna l'indice del primo programma e i risultati serializzati
+    if dispatch is None:
+        dispatch = d   # il dizionario predefinito non viene copiato: la cache degli alberi resta valida tra i blocchi
+    results = [run_program(text, env, dispatch) for text, env in programs]
+    try:
+        data = pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        data = pickle.dumps([_transferable(result) for result in results], protocol=pickle.HIGHEST_PROTOCOL)
+    return start, data
+
+
+def chunk_size(count, workers):
+    # circa quattro blocchi per processo: abbastanza per bilanciare il carico, pochi per limitare i trasferimenti
+    return max(1, -(-count // (workers * 4)))
+
+
+def iter_results(programs, dispatch=d, workers=None, chunksize=None, executor=None):
+    """
+    Valuta le coppie (testo, ambiente) e ritorna le coppie (indice, ProgramResult) man mano che i blocchi
+    vengono completati, quindi non nell'ordine dei programmi.
+    Con workers=1 (e senza executor) i programmi vengono valutati in questo processo.
+    Con un executor, workers (i suoi processi) serve solo a dividere i programmi in blocchi: se non è indicato viene
+    usato il numero di core.
+    """
+    programs = [(text, env) for text, env in programs]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 and executor is None:
+        for index, (text, env) in enumerate(programs):
+            yield index, run_program(text, copy.deepcopy(env), dispatch)
+        return
+
+    size = chunksize or chunk_size(len(programs), workers)
+    shared = None if dispatch is d else dispatch
+    pool = executor if executor is not None else ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(_run_chunk, start, programs[start:start + size], shared)
+                   for start in range(0, len(programs), size)]
+        for future in as_completed(futures):
+            start, data = future.result()
+            for offset, result in enumerate(pickle.loads(data)):
+                yield start + offset, result
+    finally:
+        if executor is None:
+            pool.shutdown(cancel_futures=True)
+
+
+def evaluate_many(programs, dispatch=d, workers=None, chunksize=None, executor=None):
+    # come iter_results, ma ritorna la lista dei risultati nell'ordine dei programmi
+    programs = list(programs)
+    results = [None] * len(programs)
+    for index, result in iter_results(programs, dispatch, workers, chunksize, executor):
+        results[index] = result
+    return results
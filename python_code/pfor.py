@@ -0,0 +1,460 @@
+# ELISA COCEANI SM3201340
+
+"""
+Esecuzione dei cicli pfor su più processi.
+
+L'intervallo degli indici viene diviso in blocchi, eseguiti da un ProcessPoolExecutor. Gli array scritti dal corpo
+con setv stanno in memoria condivisa (multiprocessing.shared_memory): il primo pfor che scrive una lista in parallelo
+la copia in uno SharedArray, che la sostituisce nell'ambiente (per tutti i nomi che la contengono) e resta in
+memoria condivisa per i pfor successivi; la memoria viene liberata quando l'array non è più usato. I processi
+scrivono direttamente in quella memoria, quindi alla fine del ciclo non c'è nessuna copia. Ai processi vengono
+mandate solo le variabili lette dal corpo.
+Ogni elemento occupa 8 byte (int a 64 bit o float) più un byte che ne indica il tipo; i valori che non si possono
+rappresentare così (interi più grandi, liste, stringhe) vengono ritornati a parte dal processo che li ha scritti.
+
+Il risultato è lo stesso del ciclo for eseguito in sequenza: i valori stampati da ogni blocco vengono raccolti e
+passati alla destinazione dell'output (output.emit) nell'ordine dei blocchi, le variabili dei cicli interni assumono
+il valore dell'ultimo blocco che le scrive, e se un'iterazione solleva un'eccezione i risultati dei processi vengono
+scartati, le scritture dei processi negli array vengono annullate e il ciclo viene eseguito in sequenza, così
+l'eccezione e le scritture parziali sono quelle di For.evaluate (se un processo termina in modo anomalo le sue
+scritture non si possono annullare).
+Il ciclo viene eseguito in sequenza anche quando c'è un solo processo, quando l'intervallo è troppo piccolo o quando
+il corpo legge gli array che scrive o chiama subroutine.
+
+Dopo il primo pfor parallelo il valore della variabile nell'ambiente è quindi uno SharedArray e non più una lista:
+si comporta come la lista (stessi elementi, indici, errori, confronti e stampa) e le operazioni sugli array e i cicli
+vettorizzati lo accettano, ma type(env[x]) è SharedArray; copy.copy e pickle ritornano una lista.
+
+I nodi ParallelFor non vengono modificati durante la valutazione. Le esecuzioni parallele e quelle in sequenza (con il
+motivo) vengono contate solo nel blocco with di collect, per il thread che lo esegue.
+"""
+
+import contextlib
+import os
+import pickle
+import threading
+import weakref
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:   # piattaforme senza memoria condivisa: i cicli pfor vengono eseguiti in sequenza
+    shared_memory = None
+
+from expressions import (Expression, Variable, Setq, Setv, Alloc, Valloc, DefSub, Call, Fill, CopySlice,
+                         SharedWriteError, d, writable_array)
+from tree import arguments, walk
+import output
+
+
+# Nodi che assegnano variabili o interi array: nel corpo di un pfor darebbero risultati diversi a seconda dell'ordine
+# dei processi
+ASSIGNMENTS = (Setq, Alloc, Valloc, DefSub, Fill, CopySlice)
+
+# Tipo di ogni elemento degli array in memoria condivisa
+INT, FLOAT, BOOL, OTHER = range(4)
+
+# Numero minimo di iterazioni per processo sotto il quale il ciclo viene eseguito in sequenza
+MIN_ITERATIONS = 16
+
+# Numero di processi usati dai pfor (None: uno per core)
+workers = None
+
+_names = {operation: item for item, operation in d.items()}
+_executor = None
+_executor_workers = None
+_in_worker = False
+
+
+def check(loop):
+    # rifiuta i corpi che assegnano variabili e prepara i dati usati da run
+    for node in walk(loop.expr):
+        if isinstance(node, ASSIGNMENTS):
+            raise SharedWriteError(f"Il corpo di pfor non può assegnare variabili ({_names.get(type(node))}): "
+                                   f"le iterazioni vengono eseguite in processi diversi")
+    loop.targets = sorted({str(node.x) for node in walk(loop.expr) if type(node) is Setv})
+    loop.calls = any(isinstance(node, Call) for node in walk(loop.expr))
+    # nomi usati dal corpo in posizioni diverse dall'array di setv
+    names = set()
+    for node in walk(loop.expr):
+        args = arguments(node)
+        if type(node) is Setv:
+            args = args[:2]
+        names.update(str(arg) for arg in args if isinstance(arg, str))
+    names.update(node.name for node in walk(loop.expr) if type(node) is Variable)
+    loop.reads_targets = bool(names & set(loop.targets))
+    loop.reads = sorted(names - set(loop.targets) - {str(loop.i)})
+
+
+class Statistics:
+    """
+    Esecuzioni dei pfor nel blocco with di collect: parallel e serial contano le esecuzioni divise tra i processi e
+    quelle in sequenza, reasons associa a ogni ciclo eseguito in sequenza il motivo dell'ultima esecuzione.
+    """
+    def __init__(self):
+        self.parallel = 0
+        self.serial = 0
+        self.reasons = {}
+
+    def __str__(self):
+        lines = [f"esecuzioni parallele: {self.parallel}, in sequenza: {self.serial}"]
+        lines += [f"  {loop}: {reason}" for loop, reason in self.reasons.items()]
+        return "\n".join(lines)
+
+
+class _State(threading.local):
+    statistics = None   # Statistics del blocco collect in corso in questo thread
+
+
+_state = _State()
+
+
+@contextlib.contextmanager
+def collect():
+    # conta le esecuzioni dei pfor valutati da questo thread nel blocco with
+    previous = _state.statistics
+    _state.statistics = statistics = Statistics()
+    try:
+        yield statistics
+    finally:
+        _state.statistics = previous
+
+
+class SharedArray:
+    """
+    Array in memoria condivisa con l'interfaccia delle liste usata da setv e dalle operazioni sugli array (len,
+    lettura e scrittura per indice e per slice, iterazione, confronto, + e *); viene stampato come una lista.
+    Per n elementi il blocco contiene n valori da 8 byte seguiti da n byte con il tipo di ogni valore; i valori che
+    non si possono rappresentare così stanno in other, nel processo che li ha scritti.
+    Copie e pickle producono una lista con gli stessi elementi.
+    """
+    def __init__(self, memory, length):
+        self.memory = memory
+        self.length = length
+        self.values = memory.buf[:8 * length]
+        self.ints = self.values.cast("q")
+        self.floats = self.values.cast("d")
+        self.kinds = memory.buf[8 * length:9 * length]
+        self.other = {}
+
+    def __len__(self):
+        return self.length
+
+    def __setitem__(self, index, value):
+        kind = type(value)
+        if kind is int and -2 ** 63 <= value < 2 ** 63 and type(index) is int:
+            self.ints[index] = value
+            self.kinds[index] = INT
+            return
+        if isinstance(index, slice):
+            indexes = range(*index.indices(self.length))
+            value = list(value)
+            if len(value) != len(indexes):
+                raise ValueError("La dimensione di un array in memoria condivisa non può cambiare")
+            for i, item in zip(indexes, value):
+                self[i] = item
+            return
+        if kind is int and -2 ** 63 <= value < 2 ** 63:
+            self.ints[index] = value
+            self.kinds[index] = INT
+        elif kind is bool:
+            self.ints[index] = value
+            self.kinds[index] = BOOL
+        elif kind is float:
+            self.floats[index] = value
+            self.kinds[index] = FLOAT
+        else:
+            self.other[index] = value
+            self.kinds[index] = OTHER
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        kind = self.kinds[index]
+        if kind == INT:
+            return self.ints[index]
+        if kind == BOOL:
+            return bool(self.ints[index])
+        if kind == FLOAT:
+            return self.floats[index]
+        return self.other.get(index % self.length)
+
+    def tolist(self):
+        kinds = bytes(self.kinds)
+        ints = self.ints.tolist()
+        floats = self.floats.tolist()
+        result = ints
+        for index, kind in enumerate(kinds):
+            if kind == FLOAT:
+                result[index] = floats[index]
+            elif kind == BOOL:
+                result[index] = bool(ints[index])
+            elif kind == OTHER:
+                result[index] = self.other.get(index)
+        return result
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __eq__(self, other):
+        other = _items(other)
+        return NotImplemented if other is None else self.tolist() == other
+
+    __hash__ = None
+
+    def __lt__(self, other):
+        other = _items(other)
+        return NotImplemented if other is None else self.tolist() < other
+
+    def __le__(self, other):
+        other = _items(other)
+        return NotImplemented if other is None else self.tolist() <= other
+
+    def __gt__(self, other):
+        other = _items(other)
+        return NotImplemented if other is None else self.tolist() > other
+
+    def __ge__(self, other):
+        other = _items(other)
+        return NotImplemented if other is None else self.tolist() >= other
+
+    def __add__(self, other):
+        other = _items(other)
+        return NotImplemented if other is None else self.tolist() + other
+
+    def __radd__(self, other):
+        other = _items(other)
+        return NotImplemented if other is None else other + self.tolist()
+
+    def __mul__(self, other):
+        return self.tolist() * other
+
+    __rmul__ = __mul__
+
+    def __reduce__(self):
+        return list, (self.tolist(),)
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    def views(self):
+        return self.ints, self.floats, self.values, self.kinds
+
+    def release(self):
+        # le viste vanno rilasciate prima di chiudere la memoria condivisa
+        for view in self.views():
+            view.release()
+
+
+def _items(value):
+    # elementi di una lista o di uno SharedArray, None per gli altri valori (confronti e operatori delle liste)
+    if type(value) is SharedArray:
+        return value.tolist()
+    return value if isinstance(value, list) else None
+
+
+def _free(memory, views):
+    # chiamata quando lo SharedArray creato da share non è più usato (o all'uscita dall'interprete)
+    for view in views:
+        view.release()
+    memory.close()
+    memory.unlink()
+
+
+def share(values):
+    # SharedArray con gli elementi di values, in un nuovo blocco di memoria condivisa che appartiene a questo processo
+    memory = shared_memory.SharedMemory(create=True, size=max(1, 9 * len(values)))
+    result = SharedArray(memory, len(values))
+    weakref.finalize(result, _free, memory, result.views())
+    for index, value in enumerate(values):
+        result[index] = value
+    return result
+
+
+class ChunkArray(SharedArray):
+    """
+    SharedArray usato da un blocco di iterazioni in un processo: prima di ogni scrittura memorizza in log l'indice
+    con il tipo precedente (indice * 4 + tipo) e gli 8 byte precedenti, così se un'iterazione solleva un'eccezione
+    il processo principale può annullare le scritture di tutti i blocchi prima di eseguire il ciclo in sequenza.
+    """
+    def __init__(self, memory, length):
+        super().__init__(memory, length)
+        self.log = array("q")
+
+    def __setitem__(self, index, value):
+        if type(index) is not int:
+            # slice: scritta un elemento alla volta, quindi con il log
+            SharedArray.__setitem__(self, index, value)
+            return
+        if -self.length <= index < 0:
+            index += self.length
+        kinds = self.kinds
+        ints = self.ints
+        self.log.extend((index << 2 | kinds[index], ints[index]))
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            ints[index] = value
+            kinds[index] = INT
+        else:
+            SharedArray.__setitem__(self, index, value)
+
+
+def undo(values, log):
+    # ripristina gli elementi scritti da un blocco (log di ChunkArray), dall'ultima scrittura alla prima
+    entries = array("q")
+    entries.frombytes(log)
+    for position in range(len(entries) - 2, -1, -2):
+        key = entries[position]
+        values.kinds[key >> 2] = key & 3
+        values.ints[key >> 2] = entries[position + 1]
+
+
+def _executor_for(count):
+    # il pool di processi viene creato una volta sola e riutilizzato dai pfor successivi
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != count:
+        if _executor is not None:
+            _executor.shutdown()
+        _executor = ProcessPoolExecutor(max_workers=count, initializer=_worker_init)
+        _executor_workers = count
+    return _executor
+
+
+def _worker_init():
+    # nei processi i pfor annidati vengono eseguiti in sequenza
+    global _in_worker
+    _in_worker = True
+
+
+def _run_chunk(body, name, start, stop, env, arrays):
+    # eseguita nei processi: iterazioni da start a stop, con gli array di arrays in memoria condivisa
+    memories = []
+    shared = {}
+    for array_name, (memory_name, length) in arrays.items():
+        memory = shared_memory.SharedMemory(name=memory_name)
+        memories.append(memory)
+        shared[array_name] = env[array_name] = ChunkArray(memory, length)
+    before = dict(env)
+    printed = output.CollectSink()
+    error = None
+    try:
+        with output.using(printed):
+            for i in range(start, stop):
+                env[name] = i
+                body.evaluate(env)
+    except Exception as ex:
+        error = ex
+    # variabili scritte dal blocco (ad esempio le variabili dei cicli interni)
+    changed = {key: value for key, value in env.items()
+               if key not in arrays and (key not in before or before[key] is not value)}
+    logs = {array_name: values.log.tobytes() for array_name, values in shared.items()}
+    data = None
+    if error is None:
+        # serializzati qui: se un valore non si può mandare al processo principale le scritture vanno annullate
+        # come per un'eccezione, e i log devono arrivare comunque
+        try:
+            data = pickle.dumps((printed.values, changed, {key: values.other for key, values in shared.items()}),
+                                protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as ex:
+            error = ex
+    for values in shared.values():
+        values.release()
+    for memory in memories:
+        memory.close()
+    return error, logs, data
+
+
+def serial(loop, env, start, end):
+    # stesso ciclo di For.evaluate, con start e end già valutati
+    name = str(loop.i)
+    for i in range(start, end):
+        env[name] = i
+        loop.expr.evaluate(env)
+
+
+def plan(loop, env, start, end, count):
+    # motivo per cui il ciclo va eseguito in sequenza, None se può essere diviso tra i processi
+    if shared_memory is None:
+        return "memoria condivisa non disponibile"
+    if _in_worker:
+        return "pfor annidato in un altro pfor"
+    if count < 2:
+        return "un solo processo disponibile"
+    if type(start) is not int or type(end) is not int:
+        return "gli estremi del ciclo non sono interi"
+    if end - start < MIN_ITERATIONS * count:
+        return "troppo poche iterazioni"
+    if loop.calls:
+        return "il corpo chiama subroutine, che potrebbero assegnare variabili"
+    if loop.reads_targets:
+        return "il corpo legge gli array che scrive"
+    for array_name in loop.targets:
+        if type(env.get(array_name)) not in (list, SharedArray):
+            return f"{array_name} non è un array"
+    return None
+
+
+def run(loop, env):
+    start = loop.start.evaluate(env) if isinstance(loop.start, Expression) else loop.start
+    end = loop.end.evaluate(env) if isinstance(loop.end, Expression) else loop.end
+    count = workers or os.cpu_count() or 1
+
+    reason = plan(loop, env, start, end, count)
+    if reason is None:
+        reason = parallel(loop, env, start, end, count)
+    statistics = _state.statistics
+    if reason is None:
+        if statistics is not None:
+            statistics.parallel += 1
+        return
+    if statistics is not None:
+        statistics.serial += 1
+        statistics.reasons[loop] = reason
+    serial(loop, env, start, end)
+
+
+def _shared(env, name):
+    # array name in memoria condivisa: la prima volta la lista viene copiata in uno SharedArray, che la sostituisce
+    # per tutti i nomi dell'ambiente che la contengono
+    values = writable_array(env, name)
+    if type(values) is SharedArray:
+        return values
+    result = share(values)
+    for key in [key for key, value in env.items() if value is values]:
+        env[key] = result
+    return result
+
+
+def parallel(loop, env, start, end, count):
+    # esegue il ciclo sui processi; ritorna None se è riuscito, altrimenti il motivo (gli elementi degli array
+    # possono essere stati spostati in memoria condivisa, ma hanno gli stessi valori)
+    arrays = {array_name: _shared(env, array_name) for array_name in loop.targets}
+    handles = {array_name: (values.memory.name, values.length) for array_name, values in arrays.items()}
+    # ai processi vengono mandate solo le variabili lette dal corpo
+    reads = {key: env[key] for key in loop.reads if key in env}
+
+    # circa quattro blocchi per processo, per bilanciare iterazioni di durata diversa
+    chunks = min(end - start, count * 4)
+    bounds = [start + (end - start) * k // chunks for k in range(chunks + 1)]
+    executor = _executor_for(count)
+    try:
+        futures = [executor.submit(_run_chunk, loop.expr, str(loop.i), a, b, reads, handles)
+                   for a, b in zip(bounds, bounds[1:])]
+        results = [future.result() for future in futures]
+    except Exception as ex:
+        return f"esecuzione parallela non riuscita ({type(ex).__name__}: {ex})"
+
+    if any(error is not None for error, _, _ in results):
+        for _, logs, _ in reversed(results):
+            for array_name, log in logs.items():
+                undo(arrays[array_name], log)
+        return "un'iterazione ha sollevato un'eccezione"
+
+    for _, _, data in results:
+        printed, changed, other = pickle.loads(data)
+        for array_name, written in other.items():
+            arrays[array_name].other.update(written)
+        for value in printed:
+            output.emit(value)
+        env.update(changed)
+    return None
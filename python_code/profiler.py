@@ -0,0 +1,166 @@
+# ELISA COCEANI SM3201340
+
+"""
+Profilazione della valutazione nodo per nodo.
+
+Il profiler valuta l'albero con gli stessi generatori di iterative.py, misurando per ogni nodo quante volte è stato
+valutato, il tempo totale (compresi i figli) e il tempo proprio (esclusi i figli), e conta quante volte è stata
+chiamata ogni subroutine. La valutazione normale (evaluate e iterative.evaluate) non viene modificata: senza
+profiler non c'è nessun costo aggiuntivo.
+
+Per i nodi ricorsivi (ad esempio il corpo di una subroutine che chiama se stessa) il tempo totale conta solo
+la valutazione più esterna, come nei profiler di Python.
+"""
+
+import json
+import time
+
+from expressions import Call
+from iterative import LEAVES, STEPS, _step
+from tree import walk
+
+
+class NodeStats:
+    # statistiche di un nodo: numero di valutazioni, tempo totale e tempo proprio in secondi
+    __slots__ = ("node", "index", "count", "total", "own", "active")
+
+    def __init__(self, node, index):
+        self.node = node
+        self.index = index   # posizione del nodo nell'albero in ordine anticipato, None se non fa parte dell'albero
+        self.count = 0
+        self.total = 0.0
+        self.own = 0.0
+        self.active = 0      # valutazioni in corso dello stesso nodo (ricorsione)
+
+
+def describe(node, width=80):
+    # forma testuale del nodo, troncata
+    try:
+        text = str(node)
+    except RecursionError:
+        text = f"<{type(node).__name__} troppo profondo>"
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+class Profiler:
+    """
+    Profiler per la valutazione di un albero: run(tree, env) ritorna il valore di tree.evaluate(env)
+    e raccoglie le statistiche, che si accumulano su più esecuzioni.
+    """
+    def __init__(self):
+        self.stats = {}    # id del nodo -> NodeStats
+        self.calls = {}    # nome della subroutine -> numero di chiamate
+        self.elapsed = 0.0
+        self.indexes = {}
+
+    def entry(self, node):
+        stats = self.stats.get(id(node))
+        if stats is None:
+            stats = self.stats[id(node)] = NodeStats(node, self.indexes.get(id(node)))
+        return stats
+
+    def run(self, tree, env):
+        self.indexes = {id(node): index for index, node in enumerate(walk(tree))}
+        clock = time.perf_counter
+        begin = clock()
+        # ogni elemento: [generatore, statistiche del nodo, inizio, tempo dei figli]
+        frames = []
+        node = tree
+        try:
+            while True:
+                stats = self.entry(node)
+                stats.count += 1
+                kind = type(node)
+                leaf = LEAVES.get(kind)
+                step = None if leaf is not None else (STEPS[kind] if kind in STEPS else _step(kind))
+                start = clock()
+                if step is None:
+                    # foglia o nodo valutato con il suo metodo evaluate
+                    try:
+                        value = leaf(node, env) if leaf is not None else node.evaluate(env)
+                    finally:
+                        elapsed = clock() - start
+                        stats.own += elapsed
+                        if not stats.active:
+                            stats.total += elapsed
+                        if frames:
+                            frames[-1][3] += elapsed
+                else:
+                    frame = step(node, env)
+                    stats.active += 1
+                    frames.append([frame, stats, start, 0.0])
+                    value = None
+
+                # il valore torna ai nodi in attesa, fino a quando uno di loro chiede di valutare un altro figlio
+                while frames:
+                    current = frames[-1]
+                    try:
+                        node = current[0].send(value)
+                        if type(current[1].node) is Call:
+                            name = str(current[1].node.f)
+                            self.calls[name] = self.calls.get(name, 0) + 1
+                        break
+                    except StopIteration as stop:
+                        value = stop.value
+                        self.finish(frames)
+                else:
+                    return value
+        except BaseException:
+            # i nodi interrotti dall'eccezione vengono chiusi con il tempo trascorso fino a qui
+            while frames:
+                self.finish(frames)
+            raise
+        finally:
+            self.elapsed += clock() - begin
+
+    def finish(self, frames):
+        # chiude la valutazione del nodo in cima e aggiunge il suo tempo al padre
+        _, stats, start, children = frames.pop()
+        elapsed = time.perf_counter() - start
+        stats.active -= 1
+        stats.own += elapsed - children
+        if not stats.active:
+            stats.total += elapsed
+        if frames:
+            frames[-1][3] += elapsed
+
+    def ranking(self, key="total"):
+        # statistiche dei nodi ordinate per costo decrescente (key: "total", "own" o "count")
+        return sorted(self.stats.values(), key=lambda stats: getattr(stats, key), reverse=True)
+
+    def report(self, limit=20, key="total"):
+        lines = [f"tempo totale: {self.elapsed:.6f} s, nodi valutati: {sum(s.count for s in self.stats.values())}",
+                 f"{'#':>5} {'volte':>10} {'totale (s)':>12} {'proprio (s)':>12} {'%':>6}  nodo"]
+        for stats in self.ranking(key)[:limit]:
+            share = 100 * stats.total / self.elapsed if self.elapsed else 0.0
+            index = "-" if stats.index is None else stats.index
+            lines.append(f"{index:>5} {stats.count:>10} {stats.total:>12.6f} {stats.own:>12.6f} {share:>6.1f}  "
+                         f"{describe(stats.node)}")
+        if self.calls:
+            lines.append("chiamate: " + ", ".join(f"{name}={count}" for name, count in
+                                                  sorted(self.calls.items(), key=lambda item: -item[1])))
+        return "\n".join(lines)
+
+    def to_dict(self, key="total"):
+        return {"elapsed": self.elapsed,
+                "nodes": [{"index": stats.index, "type": type(stats.node).__name__, "node": describe(stats.node),
+                           "count": stats.count, "total": stats.total, "self": stats.own}
+                          for stats in self.ranking(key)],
+                "calls": dict(self.calls)}
+
+    def to_json(self, path=None, key="total"):
+        # esporta le statistiche in JSON: ritorna il testo, e se path non è None lo salva anche nel file
+        text = json.dumps(self.to_dict(key), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def __str__(self):
+        return self.report()
+
+
+def profile(tree, env):
+    # valuta l'albero con il profiler: ritorna il valore e il profiler con le statistiche
+    profiler = Profiler()
+    return profiler.run(tree, env), profiler
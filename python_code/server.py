@@ -0,0 +1,453 @@
+# ELISA COCEANI SM3201340
+
+"""
+Server locale asyncio per la valutazione di programmi, su TCP o su socket Unix.
+
+Il protocollo è a righe: ogni richiesta e ogni risposta è un oggetto JSON su una riga.
+    {"id": 1, "program": "x 1 + ", "session": "nome", "timeout": 2.0, "steps": 10000}   valuta un programma
+    {"id": 2, "op": "reset", "session": "nome"}                          svuota l'ambiente della sessione
+    {"id": 3, "op": "stats"}                                             metriche del server
+La risposta contiene id, ok e, in caso di successo, value (il valore, o la sua repr se non è un valore JSON)
+e output (il testo stampato da print); in caso di errore contiene error con type e message.
+
+Ogni connessione ha un proprio ambiente, che rimane tra una richiesta e l'altra (quindi alloc, desub e setq valgono
+per le richieste successive); con il campo session più connessioni possono condividere un ambiente con nome, che
+rimane anche dopo la chiusura delle connessioni (al massimo max_sessions, le meno usate vengono eliminate).
+Le richieste della stessa sessione vengono eseguite in ordine, quelle di sessioni diverse in parallelo.
+
+Le valutazioni avvengono in un insieme fisso di processi, così il ciclo degli eventi non si blocca mai: l'ambiente
+della sessione viene mandato al processo con il programma e torna aggiornato con il risultato. Il timeout e il numero
+massimo di passi (steps) vengono controllati durante la valutazione (vedi budget.py): la valutazione si interrompe
+con un errore BudgetExceeded e il processo resta disponibile. Se il processo non risponde entro GRACE secondi dopo
+il timeout (ad esempio perché è fermo in una singola operazione molto lunga) viene terminato e sostituito, e
+l'ambiente della sessione resta quello precedente alla richiesta. Quando le richieste in attesa (delle richieste
+precedenti della stessa sessione o di un processo libero) sono max_pending, le nuove richieste vengono rifiutate
+subito con un errore di tipo Busy.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from expressions import BudgetExceeded, d
+from parallel import ProgramResult, run_program, _transferable
+
+
+# Numero di richieste in attesa (della sessione o di un processo) oltre il quale le nuove richieste vengono rifiutate
+MAX_PENDING = 64
+
+# Timeout predefinito di una valutazione, in secondi
+TIMEOUT = 5.0
+
+# Secondi di attesa dopo il timeout prima di terminare il processo di valutazione
+GRACE = 1.0
+
+# Numero di sessioni con nome mantenute
+MAX_SESSIONS = 1024
+
+# Numero di latenze recenti usate per i percentili
+LATENCY_WINDOW = 1000
+
+# Lunghezza massima di una riga di richiesta, in byte
+LINE_LIMIT = 2 ** 24
+
+
+def _serve(connection):
+    # eseguita nei processi: valuta le richieste (testo, ambiente) fino alla chiusura della connessione
+    while True:
+        try:
+            text, env, steps, seconds = connection.recv()
+        except EOFError:
+            return
+        result = run_program(text, env, d, steps, seconds)
+        try:
+            data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            data = pickle.dumps(_transferable(result), protocol=pickle.HIGHEST_PROTOCOL)
+        connection.send_bytes(data)
+
+
+class Worker:
+    # processo di valutazione con la sua connessione; call è bloccante e viene eseguita in un thread
+    def __init__(self, context):
+        self.connection, remote = context.Pipe()
+        self.process = context.Process(target=_serve, args=(remote,), daemon=True)
+        self.process.start()
+        remote.close()
+
+    def call(self, text, env, steps, seconds):
+        self.connection.send((text, env, steps, seconds))
+        return pickle.loads(self.connection.recv_bytes())
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def close(self):
+        self.connection.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+
+
+class Busy(Exception):
+    pass
+
+
+class Session:
+    # ambiente di una sessione; il lock mantiene l'ordine delle richieste
+    def __init__(self):
+        self.env = {}
+        self.lock = asyncio.Lock()
+        self.requests = 0
+
+
+class Metrics:
+    # contatori delle richieste e latenze recenti delle valutazioni completate (in secondi, dalla lettura della richiesta
+    # alla fine della valutazione, compresa l'attesa di un processo libero)
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.completed = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.interrupted = 0
+        self.rejected = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, latency):
+        self.completed += 1
+        self.latencies.append(latency)
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return 0.0
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    def stats(self):
+        uptime = time.monotonic() - self.started
+        return {"uptime": uptime, "requests": self.requests, "completed": self.completed, "errors": self.errors,
+                "timeouts": self.timeouts, "interrupted": self.interrupted, "rejected": self.rejected,
+                "throughput": self.completed / uptime if uptime else 0.0,
+                "latency_mean": sum(self.latencies) / len(self.latencies) if self.latencies else 0.0,
+                "latency_p50": self.percentile(0.50), "latency_p95": self.percentile(0.95),
+                "latency_max": max(self.latencies, default=0.0)}
+
+    def __str__(self):
+        return " ".join(f"{key}={value:.4f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in self.stats().items())
+
+
+def _json_value(value):
+    # il valore se si può scrivere in JSON, altrimenti la sua repr
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError, RecursionError):
+        return repr(value)
+
+
+def _error(ex):
+    return {"type": type(ex).__name__, "message": str(ex)}
+
+
+class EvaluationServer:
+    """
+    Server di valutazione con workers processi (uno per core se None).
+    start_tcp(host, port) o start_unix(path) avviano il server, close() lo ferma e termina i processi.
+    """
+    def __init__(self, workers=None, timeout=TIMEOUT, max_pending=MAX_PENDING, max_sessions=MAX_SESSIONS,
+                 steps=None):
+        self.count = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.steps = steps
+        self.max_pending = max_pending
+        self.max_sessions = max_sessions
+        self.metrics = Metrics()
+        self.sessions = collections.OrderedDict()   # nome -> Session, dalla meno usata
+        self.context = multiprocessing.get_context()
+        self.workers = []
+        self.idle = None
+        self.pending = 0
+        self.threads = None
+        self.server = None
+        self.connections = set()
+        self.handlers = set()
+        self.closing = False
+
+    async def start(self):
+        # avvia i processi; chiamata da start_tcp e start_unix
+        self.threads = ThreadPoolExecutor(max_workers=self.count)
+        self.idle = asyncio.Queue()
+        for _ in range(self.count):
+            worker = Worker(self.context)
+            self.workers.append(worker)
+            self.idle.put_nowait(worker)
+
+    async def start_tcp(self, host="127.0.0.1", port=0):
+        await self.start()
+        self.server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+        return self.server
+
+    async def start_unix(self, path):
+        await self.start()
+        self.server = await asyncio.start_unix_server(self.handle, path, limit=LINE_LIMIT)
+        return self.server
+
+    @property
+    def address(self):
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        # chiude le connessioni aperte e termina i processi, anche quelli con una valutazione in corso
+        self.closing = True
+        if self.server is not None:
+            self.server.close()
+        for writer in list(self.connections):
+            writer.close()
+        for worker in self.workers:
+            worker.process.kill()
+        if self.threads is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.threads.shutdown)
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+        if self.handlers:
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+
+    def session(self, name):
+        # sessione con nome, creata se non esiste
+        if name in self.sessions:
+            self.sessions.move_to_end(name)
+            return self.sessions[name]
+        session = self.sessions[name] = Session()
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return session
+
+    async def handle(self, reader, writer):
+        # una connessione: le richieste vengono lette ed eseguite una alla volta, in ordine
+        local = Session()
+        self.connections.add(writer)
+        self.handlers.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    break   # riga troppo lunga
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await self.respond(line, local)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(writer)
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def respond(self, line, local):
+        # risposta a una riga di richiesta
+        start = time.monotonic()
+        self.metrics.requests += 1
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("la richiesta deve essere un oggetto JSON")
+        except ValueError as ex:
+            self.metrics.errors += 1
+            return {"id": None, "ok": False, "error": _error(ex)}
+
+        response = {"id": request.get("id")}
+        name = request.get("session")
+        session = local if name is None else self.session(str(name))
+        op = request.get("op", "eval")
+        try:
+            if op == "eval":
+                timeout = float(request.get("timeout", self.timeout))
+                steps = request.get("steps", self.steps)
+                steps = None if steps is None else int(steps)
+                result = await self.evaluate(str(request["program"]), session, timeout, steps)
+                self.metrics.record(time.monotonic() - start)
+                response.update(ok=result.ok, output=result.output)
+                if result.ok:
+                    response["value"] = _json_value(result.value)
+                elif isinstance(result.error, BudgetExceeded):
+                    self.metrics.interrupted += 1
+                    response["error"] = dict(_error(result.error), steps=result.error.steps)
+                else:
+                    self.metrics.errors += 1
+                    response["error"] = _error(result.error)
+            elif op == "reset":
+                async with session.lock:
+                    session.env = {}
+                response["ok"] = True
+            elif op == "stats":
+                response.update(ok=True, stats=self.metrics.stats())
+            else:
+                raise ValueError(f"operazione sconosciuta: {op}")
+        except Busy as ex:
+            self.metrics.rejected += 1
+            response.update(ok=False, error=_error(ex))
+        except asyncio.TimeoutError:
+            self.metrics.timeouts += 1
+            response.update(ok=False, error={"type": "Timeout",
+                                             "message": f"la valutazione ha superato il timeout di {timeout} s"})
+        except (KeyError, ValueError, TypeError) as ex:
+            # richiesta senza programma o con campi non validi
+            self.metrics.errors += 1
+            response.update(ok=False, error=_error(ex))
+        return response
+
+    async def evaluate(self, text, session, timeout, steps=None):
+        """
+        Valuta il programma in un processo libero, dopo le richieste precedenti della stessa sessione; l'ambiente
+        della sessione viene aggiornato solo al termine. pending conta le richieste in attesa del lock della sessione
+        o di un processo, quindi anche molte richieste sulla stessa sessione vengono rifiutate oltre max_pending.
+        """
+        if self.pending >= self.max_pending:
+            raise Busy(f"troppe richieste in attesa ({self.pending})")
+        self.pending += 1
+        waiting = True
+        try:
+            async with session.lock:
+                worker = await self.idle.get()
+                self.pending -= 1
+                waiting = False
+                return await self.dispatch(worker, text, session, timeout, steps)
+        finally:
+            if waiting:
+                self.pending -= 1
+
+    async def dispatch(self, worker, text, session, timeout, steps):
+        # esegue la valutazione nel processo worker, che torna libero al termine (o viene sostituito)
+        loop = asyncio.get_running_loop()
+        call = loop.run_in_executor(self.threads, worker.call, text, session.env, steps, timeout)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(call), timeout + GRACE)
+        except asyncio.TimeoutError:
+            # il processo viene sostituito: la valutazione non si può interrompere in altro modo
+            worker.kill()
+            try:
+                await call
+            except (EOFError, OSError):
+                pass
+            self.replace(worker)
+            raise
+        except (EOFError, OSError) as ex:
+            # processo terminato durante la valutazione (ad esempio per mancanza di memoria)
+            worker.kill()
+            self.replace(worker)
+            return ProgramResult(error=RuntimeError(f"il processo di valutazione è terminato ({ex})"))
+        self.idle.put_nowait(worker)
+        session.requests += 1
+        if result.env is not None:
+            session.env = result.env
+        return result
+
+    def replace(self, worker):
+        # nuovo processo al posto di uno terminato (non durante la chiusura del server)
+        if self.closing:
+            return
+        self.workers.remove(worker)
+        worker = Worker(self.context)
+        self.workers.append(worker)
+        self.idle.put_nowait(worker)
+
+
+class Client:
+    """
+    Client asyncio per il server: request(program, ...) ritorna la risposta come dizionario.
+    Le richieste di un client vengono mandate una alla volta.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    async def connect_tcp(cls, host="127.0.0.1", port=0):
+        return cls(*await asyncio.open_connection(host, port, limit=LINE_LIMIT))
+
+    @classmethod
+    async def connect_unix(cls, path):
+        return cls(*await asyncio.open_unix_connection(path, limit=LINE_LIMIT))
+
+    async def send(self, request):
+        async with self.lock:
+            self.next_id += 1
+            request = dict(request, id=self.next_id)
+            self.writer.write(json.dumps(request).encode() + b"\n")
+            await self.writer.drain()
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("connessione chiusa dal server")
+            return json.loads(line)
+
+    async def request(self, program, session=None, timeout=None, steps=None):
+        request = {"program": program}
+        if session is not None:
+            request["session"] = session
+        if timeout is not None:
+            request["timeout"] = timeout
+        if steps is not None:
+            request["steps"] = steps
+        return await self.send(request)
+
+    async def reset(self, session=None):
+        return await self.send({"op": "reset"} if session is None else {"op": "reset", "session": session})
+
+    async def stats(self):
+        return (await self.send({"op": "stats"}))["stats"]
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def serve(host="127.0.0.1", port=8765, path=None, workers=None, timeout=TIMEOUT, max_pending=MAX_PENDING,
+                steps=None):
+    # avvia il server e lo mantiene attivo fino all'interruzione
+    server = EvaluationServer(workers, timeout, max_pending, steps=steps)
+    if path is not None:
+        await server.start_unix(path)
+    else:
+        await server.start_tcp(host, port)
+    print(f"server in ascolto su {server.address} con {server.count} processi")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    # uso: python3 server.py [--host HOST] [--port PORT | --unix PATH] [--workers N] [--timeout S] [--queue N]
+    #                        [--steps N]
+    parser = argparse.ArgumentParser(description="Server di valutazione dei programmi")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="socket Unix al posto di TCP")
+    parser.add_argument("--workers", type=int, help="processi di valutazione (uno per core)")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="timeout di ogni valutazione in secondi")
+    parser.add_argument("--queue", type=int, default=MAX_PENDING, help="richieste in attesa prima di rifiutarne")
+    parser.add_argument("--steps", type=int, help="numero massimo di passi di ogni valutazione")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.timeout, args.queue, args.steps))
+    except KeyboardInterrupt:
+        pass
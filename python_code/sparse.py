@@ -0,0 +1,128 @@
+# ELISA COCEANI SM3201340
+
+"""
+Array sparsi per le allocazioni grandi e quasi vuote.
+
+SparseArray memorizza solo gli elementi scritti, in un dizionario indice -> valore; tutti gli altri valgono zero.
+La memoria usata cresce con il numero di elementi scritti e non con la dimensione dell'array.
+Lettura, scrittura, len e confronto con == si comportano come per la lista [0] * n, quindi setv solleva le stesse
+eccezioni (InvalidIndexError e IndexError) con entrambe le rappresentazioni. Non è però una lista: la stampa degli
+array con più di 20 elementi è un riassunto e gli operatori delle liste (+, *, <, ...) sollevano TypeError.
+
+svalloc crea sempre un array sparso. valloc crea una lista, a meno che threshold sia impostato: in quel caso crea un
+array sparso quando la dimensione è almeno threshold, con le differenze indicate sopra.
+"""
+
+# Dimensione oltre la quale valloc crea un array sparso invece di una lista (None: sempre liste)
+threshold = None
+
+
+def allocate(n):
+    # array di n zeri creato da valloc
+    if threshold is not None and n >= threshold:
+        return SparseArray(n)
+    return [0] * n
+
+
+class SparseArray:
+    """
+    Array di n elementi con valore iniziale default (zero), che memorizza solo gli elementi scritti.
+    Gli indici seguono le regole delle liste: interi, negativi contati dalla fine, slice per lettura e scrittura
+    (la scrittura di una slice non può cambiare la dimensione dell'array).
+    """
+    __slots__ = ("length", "values", "default")
+
+    def __init__(self, n, default=0):
+        self.length = n
+        self.values = {}
+        self.default = default
+
+    def __len__(self):
+        return self.length
+
+    def position(self, index, message):
+        index = index.__index__()
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(message)
+        return index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.values.get(i, self.default) for i in range(*index.indices(self.length))]
+        return self.values.get(self.position(index, "list index out of range"), self.default)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            indexes = range(*index.indices(self.length))
+            value = list(value)
+            if len(value) != len(indexes):
+                raise ValueError("La dimensione di un array sparso non può cambiare")
+            for i, item in zip(indexes, value):
+                self.store(i, item)
+            return
+        self.store(self.position(index, "list assignment index out of range"), value)
+
+    def __copy__(self):
+        # copia con gli elementi in un nuovo dizionario (copy.copy condividerebbe values)
+        result = SparseArray(self.length, self.default)
+        result.values = dict(self.values)
+        return result
+
+    def store(self, index, value):
+        # il valore di default non viene memorizzato, se è un intero dello stesso tipo (0.0 e False non sono 0)
+        if type(value) in (int, bool) and type(value) is type(self.default) and value == self.default:
+            self.values.pop(index, None)
+        else:
+            self.values[index] = value
+
+    def __iter__(self):
+        get = self.values.get
+        default = self.default
+        for i in range(self.length):
+            yield get(i, default)
+
+    def items(self):
+        # elementi scritti, in ordine di indice
+        return sorted(self.values.items())
+
+    def hidden(self):
+        # numero di elementi che valgono default
+        return self.length - len(self.values)
+
+    def first_hidden(self):
+        # indice del primo elemento che vale default, None se sono stati scritti tutti
+        if not self.hidden():
+            return None
+        i = 0
+        while i in self.values:
+            i += 1
+        return i
+
+    def fill(self, value):
+        self.values.clear()
+        self.default = value
+
+    def tolist(self):
+        return list(self)
+
+    def __eq__(self, other):
+        if isinstance(other, SparseArray):
+            if self.length != other.length:
+                return False
+            if self.default == other.default:
+                # gli elementi non scritti in nessuno dei due array sono uguali
+                keys = self.values.keys() | other.values.keys()
+                return all(self[i] == other[i] for i in keys)
+            return self.tolist() == other.tolist()
+        if isinstance(other, list):
+            return self.length == len(other) and self.tolist() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        if self.length <= 20:
+            return repr(self.tolist())
+        return f"sparsearray({self.length} elementi, {len(self.values)} scritti)"
@@ -0,0 +1,384 @@
+# ELISA COCEANI SM3201340
+
+"""
+Inferenza dei tipi e nodi specializzati.
+
+TypeInference assegna un tipo (INT, FLOAT, BOOL oppure ANY se non è noto) a ogni nodo dell'albero e a ogni variabile.
+Il tipo di una variabile è quello di tutte le assegnazioni del programma: alloc e la variabile dei cicli for
+assegnano interi, setq il tipo della sua espressione, valloc e desub valori che non sono numeri. Le variabili che il
+programma non assegna (ad esempio quelle dell'ambiente iniziale) hanno tipo ANY. Il tipo delle operazioni dipende da
+quello degli operandi: ad esempio la somma di due interi è un intero, la divisione un float, un confronto tra numeri
+un booleano.
+
+Specializer sostituisce poi:
+- le operazioni aritmetiche e i confronti tra due interi con nodi che leggono gli operandi senza controllarne il
+  tipo di argomento (nodo, variabile o costante, deciso una volta sola) e calcolano direttamente l'operatore di Python;
+- gli if con condizione booleana con nodi che non controllano il tipo di argomento di condizione e rami;
+- i setv con indice intero con nodi che non controllano il tipo di argomento dell'indice.
+
+I tipi inferiti possono non valere a runtime (ad esempio se l'ambiente iniziale contiene già una variabile assegnata
+dal programma con un valore di tipo diverso): ogni nodo specializzato controlla il tipo dei valori con type(...) is
+e, se non corrisponde, calcola il risultato come il nodo generico. Risultati ed eccezioni sono sempre quelli di
+evaluate. I nodi non vengono modificati durante la valutazione; le deviazioni vengono contate solo nel blocco with di
+collect, per il thread che lo esegue (fuori da collect il controllo costa una sola lettura, e solo nelle deviazioni):
+
+    with specialize.collect() as statistics:
+        special.evaluate(env)
+    print(statistics.fallbacks)
+"""
+
+import contextlib
+import threading
+
+from expressions import (Expression, Constant, Variable, Operation, Addition, Subtraction, Division, Multiplication,
+                         Power, Modulus, Reciprocal, AbsoluteValue, Grater, GraterEq, Equal, NotEqual, Less, LessEq,
+                         Alloc, Setq, Setv, Prog, If, For, Print,
+                         MissingVariableException, InvalidIndexError, writable_array)
+from transpiler import BINARY_OPERATORS
+from tree import arguments, is_node, rebuild, target, walk
+
+
+INT = "int"
+FLOAT = "float"
+BOOL = "bool"
+ANY = "any"
+
+TYPES = {int: INT, float: FLOAT, bool: BOOL}
+NUMBERS = (INT, FLOAT)
+
+ARITHMETIC = (Addition, Subtraction, Multiplication, Modulus)
+COMPARISONS = (Grater, GraterEq, Equal, NotEqual, Less, LessEq)
+
+# Argomenti di un nodo specializzato: nodo da valutare, nome di variabile o costante
+NODE, NAME, VALUE = "node", "name", "value"
+
+
+def join(a, b):
+    # tipo che comprende a e b; None indica un tipo non ancora noto durante l'inferenza
+    if a is None:
+        return b
+    if b is None or a == b:
+        return a
+    return ANY
+
+
+class TypeInference:
+    """
+    Inferenza dei tipi dell'albero: dopo run(tree), type_of(arg) ritorna il tipo di un argomento (nodo, nome di
+    variabile o costante) e variables contiene il tipo di ogni variabile assegnata dal programma.
+    """
+    def __init__(self):
+        self.variables = {}
+        self.types = {}     # id del nodo -> tipo
+        self.assigned = set()
+        self.rounds = 0
+
+    def run(self, tree):
+        # i tipi delle variabili crescono fino a quando non cambiano più (al massimo due volte per variabile)
+        nodes = list(walk(tree))
+        for node in nodes:
+            name = target(node)
+            if name is not None:
+                self.assigned.add(name)
+        while True:
+            self.rounds += 1
+            self.types = {}
+            for node in reversed(nodes):   # i figli prima dei padri
+                self.types[id(node)] = self.infer(node)
+            before = dict(self.variables)
+            for node in nodes:
+                self.assignments(node)
+            if self.variables == before:
+                break
+        return self
+
+    def assign(self, name, kind):
+        self.variables[name] = join(self.variables.get(name), kind)
+
+    def assignments(self, node):
+        name = target(node)
+        if name is None:
+            return
+        if type(node) is Alloc or isinstance(node, For):
+            self.assign(name, INT)   # alloc assegna 0, range produce solo interi
+        elif isinstance(node, Setq):
+            self.assign(name, self.result_of(node.expr))
+        else:
+            self.assign(name, ANY)
+
+    def type_of(self, arg, unknown=ANY):
+        # tipo di un argomento; unknown è il tipo delle variabili non (ancora) assegnate
+        if isinstance(arg, Expression):
+            kind = self.types.get(id(arg))
+            return unknown if kind is None else kind
+        if isinstance(arg, str):
+            if arg not in self.assigned:
+                return ANY   # valore dell'ambiente iniziale
+            kind = self.variables.get(arg)
+            return unknown if kind is None else kind
+        return TYPES.get(type(arg), ANY)
+
+    def result_of(self, arg):
+        # tipo del valore di un argomento che viene valutato solo se è un nodo (setq, rami di if): un nome di
+        # variabile non viene letto dall'ambiente ma è il valore stesso
+        if isinstance(arg, str):
+            return ANY
+        return self.type_of(arg, None)
+
+    def infer(self, node):
+        kind = type(node)
+        if kind is Constant:
+            return TYPES.get(type(node.value), ANY)
+        if kind is Variable:
+            return self.type_of(node.name, None)
+        if isinstance(node, Operation) and kind.evaluate is Operation.evaluate:
+            types = [self.type_of(arg, None) for arg in node.args]
+            if ANY in types:
+                return ANY
+            if None in types:
+                return None
+            return self.operation(node, types)
+        if isinstance(node, Setq):
+            return self.result_of(node.expr)
+        if kind is If:
+            return join(self.result_of(node.true), self.result_of(node.false))
+        if isinstance(node, Prog) and kind.evaluate is Prog.evaluate:
+            return self.type_of(node.args[0], None)
+        if kind is Print:
+            return self.type_of(node.expr, None)
+        return ANY
+
+    def operation(self, node, types):
+        # tipo del risultato di un'operazione con operandi di tipo noto
+        if isinstance(node, ARITHMETIC):
+            if types[0] == types[1] == INT:
+                return INT
+            if types[0] in NUMBERS and types[1] in NUMBERS:
+                return FLOAT
+        elif isinstance(node, (Division, Reciprocal)):
+            if all(kind in NUMBERS for kind in types):
+                return FLOAT
+        elif isinstance(node, Power):
+            if types[0] == types[1] == FLOAT:
+                return FLOAT
+        elif isinstance(node, AbsoluteValue):
+            return {INT: INT, FLOAT: FLOAT, BOOL: INT}.get(types[0], ANY)
+        elif isinstance(node, COMPARISONS):
+            if all(kind in (INT, FLOAT, BOOL) for kind in types):
+                return BOOL
+        return ANY
+
+
+class Statistics:
+    # Deviazioni dei nodi specializzati nel blocco with di collect: fallbacks in totale, nodes per ogni nodo
+    def __init__(self):
+        self.fallbacks = 0
+        self.nodes = {}
+
+    def add(self, node):
+        self.fallbacks += 1
+        self.nodes[node] = self.nodes.get(node, 0) + 1
+
+    def __str__(self):
+        return f"valutazioni con tipi diversi da quelli inferiti: {self.fallbacks} (nodi: {len(self.nodes)})"
+
+
+class _State(threading.local):
+    statistics = None   # Statistics del blocco collect in corso in questo thread
+
+
+_state = _State()
+
+
+@contextlib.contextmanager
+def collect():
+    # conta le deviazioni dei nodi specializzati valutati da questo thread nel blocco with
+    previous = _state.statistics
+    _state.statistics = statistics = Statistics()
+    try:
+        yield statistics
+    finally:
+        _state.statistics = previous
+
+
+def _shape(arg):
+    # (tipo di argomento, valore memorizzato nel nodo specializzato)
+    if isinstance(arg, Expression):
+        if type(arg) is Constant:
+            return VALUE, arg.value
+        return NODE, arg
+    if isinstance(arg, str):
+        return NAME, arg
+    return VALUE, arg
+
+
+def _fetch(variable, shape, slot):
+    # codice che legge l'argomento memorizzato in self.slot nella variabile variable
+    if shape == NODE:
+        return [f"    {variable} = self.{slot}.evaluate(env)"]
+    if shape == NAME:
+        return [f"    if self.{slot} not in env:",
+                f"        raise MissingVariableException(f\"Manca il valore della variabile '{{self.{slot}}}\")",
+                f"    {variable} = env[self.{slot}]"]
+    return [f"    {variable} = self.{slot}"]
+
+
+_classes = {}
+
+
+def integer_class(base, shapes):
+    # sottoclasse di base (un'operazione tra interi) per gli argomenti di tipo shapes, creata una volta sola
+    key = (base, shapes)
+    if key not in _classes:
+        checks = [f"type({name}) is int" for name, shape in zip("xy", shapes) if shape != VALUE]
+        lines = ["def evaluate(self, env):"]
+        lines += _fetch("x", shapes[0], "left") + _fetch("y", shapes[1], "right")
+        if checks:
+            lines += [f"    if {' and '.join(checks)}:",
+                      f"        return x {BINARY_OPERATORS[base]} y",
+                      "    if _state.statistics is not None:",
+                      "        _state.statistics.add(self)",
+                      "    return self.op(x, y)"]
+        else:
+            lines += [f"    return x {BINARY_OPERATORS[base]} y"]
+        namespace = {"MissingVariableException": MissingVariableException, "_state": _state}
+        exec("\n".join(lines), namespace)
+        _classes[key] = type("Int" + base.__name__, (IntegerOperation, base),
+                             {"__slots__": (), "evaluate": namespace["evaluate"]})
+    return _classes[key]
+
+
+class IntegerOperation(Operation):
+    """
+    Base delle operazioni specializzate per due interi: left e right sono gli operandi già classificati
+    (nodo, nome o costante).
+    La classe concreta dipende dal tipo di argomento degli operandi e viene scelta alla creazione, quindi anche
+    rebuild(node, args) con operandi di tipo diverso crea un nodo corretto.
+    """
+    __slots__ = ("left", "right")
+
+    def __new__(cls, args):
+        shapes = tuple(_shape(arg) for arg in args)
+        node = object.__new__(integer_class(cls.generic(), tuple(shape for shape, _ in shapes)))
+        node.args = tuple(args)
+        node.left, node.right = (value for _, value in shapes)
+        return node
+
+    def __reduce__(self):
+        # le classi sono create durante l'esecuzione: la copia viene ricostruita dal tipo generico
+        return specialized_operation, (self.generic(), self.args)
+
+    @classmethod
+    def generic(cls):
+        return next(base for base in cls.__mro__ if base in BINARY_OPERATORS)
+
+
+def specialized_operation(base, args):
+    # operazione tra interi equivalente a base(args)
+    return integer_class(base, (NODE, NODE))(args)
+
+
+class BoolIf(If):
+    # if con condizione booleana: il tipo di argomento di condizione e rami è deciso alla creazione
+    __slots__ = ("shape", "branches")
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.shape, _ = _shape(self.cond)
+        self.branches = (isinstance(self.false, Expression), isinstance(self.true, Expression))
+
+    def evaluate(self, env):
+        shape = self.shape
+        if shape == NODE:
+            condition = self.cond.evaluate(env)
+        elif shape == NAME:
+            if self.cond not in env:
+                raise MissingVariableException(f"La varibaile {self.cond} non è presente nell'ambiente")
+            condition = env[self.cond]
+        else:
+            condition = self.cond.evaluate(env) if isinstance(self.cond, Constant) else self.cond
+        if type(condition) is not bool and _state.statistics is not None:
+            _state.statistics.add(self)   # il confronto con True vale per qualsiasi valore
+        if condition is True:
+            return self.true.evaluate(env) if self.branches[1] else self.true
+        return self.false.evaluate(env) if self.branches[0] else self.false
+
+
+class IntSetv(Setv):
+    # setv con indice intero: il controllo isinstance dell'indice viene saltato se il valore è un int
+    __slots__ = ("shape",)
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.shape = _shape(self.n)[0] if not isinstance(self.n, Constant) else NODE
+
+    def evaluate(self, env):
+        shape = self.shape
+        if shape == NODE:
+            n = self.n.evaluate(env)
+        elif shape == NAME:
+            if self.n not in env:
+                raise MissingVariableException(f"La variabile {self.n} non è presente nell'ambiente")
+            n = env[self.n]
+        else:
+            n = self.n
+        if type(n) is not int:
+            if _state.statistics is not None:
+                _state.statistics.add(self)
+            if not isinstance(n, int):
+                raise InvalidIndexError(f" La dimensione dell'array {n} deve essere un numero intero positivo")
+        if n < 0:
+            raise InvalidIndexError(f" La dimensione dell'array {n} deve essere un numero intero positivo")
+        var = str(self.x)
+        if var not in env:
+            raise MissingVariableException(f"L'array {self.x} non è presente nell'ambiente")
+        if n >= len(env[var]):
+            raise IndexError("Errore: si sta provando ad accedere ad un indice che non esiste")
+        value = self.expr.evaluate(env)
+        writable_array(env, var)[n] = value
+        return value
+
+
+class Specializer:
+    """
+    Passata che sostituisce i nodi con le versioni specializzate per i tipi inferiti.
+    L'albero originale non viene modificato; inference contiene i tipi inferiti.
+    """
+    def __init__(self):
+        self.inference = TypeInference()
+        self.operations = 0
+        self.conditions = 0
+        self.indexes = 0
+
+    def run(self, tree):
+        self.inference.run(tree)
+        return self.visit(tree)
+
+    def visit(self, node):
+        if not is_node(node):
+            return node
+        original = node
+        node = rebuild(node, [self.visit(arg) for arg in arguments(node)])
+        kind = type(node)
+        type_of = self.inference.type_of
+        if kind in BINARY_OPERATORS and issubclass(kind, ARITHMETIC + COMPARISONS) \
+                and all(type_of(arg) == INT for arg in original.args):
+            self.operations += 1
+            return specialized_operation(kind, node.args)
+        if kind is If and type_of(original.cond) == BOOL:
+            self.conditions += 1
+            return BoolIf(arguments(node))
+        if kind is Setv and type_of(original.n) == INT:
+            self.indexes += 1
+            return IntSetv(arguments(node))
+        return node
+
+    def __str__(self):
+        return (f"operazioni tra interi: {self.operations}, if con condizione booleana: {self.conditions}, "
+                f"setv con indice intero: {self.indexes}")
+
+
+def specialize(tree):
+    # ritorna l'albero con i nodi specializzati e la passata con le statistiche
+    specializer = Specializer()
+    return specializer.run(tree), specializer
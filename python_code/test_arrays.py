@@ -0,0 +1,128 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test degli array tipizzati (arrays.py): setv, vfill, vsum, vmin, vmax, vcopy e vdot devono dare su un TypedArray gli
+stessi risultati che danno su una lista con gli stessi elementi, a parte i controlli sul tipo degli elementi.
+
+    python3 -m pytest test_arrays.py
+"""
+
+import copy
+import pickle
+
+import pytest
+
+import arrays
+from arrays import TypedArray, INT, FLOAT
+from batch import INT_LIMIT
+from expressions import Expression, d
+
+
+def typed(items, kind=INT):
+    result = TypedArray(len(items), kind)
+    for index, item in enumerate(items):
+        result[index] = item
+    return result
+
+
+def run(program, env):
+    return Expression.from_program(program, d).evaluate(env)
+
+
+def test_elements():
+    values = TypedArray(3)
+    assert values.tolist() == [0, 0, 0] and len(values) == 3
+    values[1] = 7
+    values[2] = True
+    assert values == [0, 7, 1]
+    assert type(values[1]) is int
+    floats = TypedArray(2, FLOAT)
+    floats[0] = 3
+    assert floats == [3.0, 0.0] and type(floats[0]) is float
+
+
+def test_conversion_errors():
+    values = TypedArray(2)
+    with pytest.raises(TypeError):
+        values[0] = 1.5
+    with pytest.raises(OverflowError):
+        values[0] = INT_LIMIT
+    values[0] = -INT_LIMIT
+    assert values[0] == -INT_LIMIT
+    with pytest.raises(TypeError):
+        TypedArray(2, FLOAT)[0] = "x"
+    with pytest.raises(ValueError):
+        TypedArray(2, "complex")
+
+
+def test_allocation():
+    env = {}
+    run("4 a fvalloc 3 b ivalloc prog2", env)
+    assert env["a"] == [0.0] * 4 and env["a"].kind == FLOAT
+    assert env["b"] == [0] * 3 and env["b"].kind == INT
+
+
+# programma -> array a e b di partenza (liste di interi)
+PROGRAMS = {
+    "a vsum": ([3, -1, 4, 1, -5], [0]),
+    "a vmin": ([3, -1, 4, 1, -5], [0]),
+    "a vmax": ([3, -1, 4, 1, -5], [0]),
+    "a b vdot": ([1, 2, 3], [4, -5, 6]),
+    "7 a vfill": ([1, 2, 3], [0]),
+    "b 1 3 a 0 vcopy": ([0, 0, 0, 0], [9, 8, 7, 6]),
+    "a 0 2 a 1 vcopy": ([1, 2, 3, 4], [0]),
+    "9 2 a setv a vsum prog2": ([1, 2, 3], [0]),
+}
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_same_as_lists(program):
+    first, second = PROGRAMS[program]
+    lists = {"a": list(first), "b": list(second)}
+    typed_arrays = {"a": typed(first), "b": typed(second)}
+    expected = run(program, lists)
+    result = run(program, typed_arrays)
+    assert result == expected and type(result) is type(expected)
+    assert typed_arrays == lists
+
+
+def test_exact_sums():
+    # interi oltre i 64 bit e float sommati con arrotondamento corretto
+    big = INT_LIMIT - 1
+    assert arrays.total("a", {"a": typed([big, big, big])}) == 3 * big
+    assert arrays.dot("a", "a", {"a": typed([big, big])}) == 2 * big * big
+    values = [0.1] * 10
+    assert arrays.total("a", {"a": typed(values, FLOAT)}) == 1.0 == arrays.total("a", {"a": values})
+
+
+def test_errors():
+    env = {"a": typed([1, 2, 3]), "b": typed([1, 2]), "e": TypedArray(0)}
+    with pytest.raises(IndexError):
+        run("a 0 3 b 0 vcopy", env)
+    with pytest.raises(IndexError):
+        run("a b vdot", env)
+    with pytest.raises(IndexError):
+        run("e vmin", env)
+    with pytest.raises(TypeError):
+        run("4 3 / a vfill", {"a": typed([1, 2, 3])})
+    assert run("e vsum", env) == 0
+
+
+def test_mapped_file(tmp_path, monkeypatch):
+    # con arrays.directory gli elementi stanno in un file mappato in memoria
+    monkeypatch.setattr(arrays, "directory", str(tmp_path))
+    env = {}
+    run("i 0 + i a setv 5 0 i for 5 a ivalloc prog2", env)
+    values = env["a"]
+    assert values.file is not None and values == [0, 1, 2, 3, 4]
+    assert arrays.total("a", env) == 10
+    values.close()
+    assert len(values) == 0
+
+
+def test_copy_and_pickle():
+    values = typed([1.5, -2.0], FLOAT)
+    for other in (copy.deepcopy(values), pickle.loads(pickle.dumps(values))):
+        assert other == values and other.kind == FLOAT
+        other[0] = 0
+        assert values[0] == 1.5
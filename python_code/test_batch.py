@@ -0,0 +1,98 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test della valutazione per colonne (batch.py): ogni riga deve avere lo stesso valore (o la stessa eccezione) di
+evaluate sull'ambiente della riga, sia con NumPy sia riga per riga.
+
+    python3 -m pytest test_batch.py
+"""
+
+import pytest
+
+import batch
+from expressions import Expression, d
+
+
+COLUMNS = {"x": [3, -1, 0, 2 ** 40, 7], "y": [2, 0, 5, 3, -3]}
+
+# programma -> True se deve essere valutato con NumPy
+PROGRAMS = {
+    "x y +": True, "x y * 1 +": True, "y x /": True, "y x %": True, "x abs": True, "x 1/": True,
+    "y x **": True, "x x * x * x *": True, "1 2 x y < if": True, "x 1 * 0 0 y > if": True,
+    "x y - y x - 0 x > if": True, "x z +": True,
+    "x print": False, "x 1 + x setq": False, "2 x / x setq 1 x > while": False,
+}
+
+
+def expected(tree, columns, rows):
+    # (valore o tipo dell'eccezione) di evaluate per ogni riga
+    result = []
+    for row in range(rows):
+        try:
+            result.append(("valore", tree.evaluate({name: column[row] for name, column in columns.items()})))
+        except Exception as ex:
+            result.append(("eccezione", type(ex)))
+    return result
+
+
+def found(result):
+    values = result.values.tolist() if hasattr(result.values, "tolist") else list(result.values)
+    return [("eccezione", type(result.errors[row])) if row in result.errors else ("valore", value)
+            for row, value in enumerate(values)]
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_rows(program, capsys):
+    tree = Expression.from_program(program, d)
+    result = batch.evaluate_batch(tree, COLUMNS)
+    assert result.vectorized == (PROGRAMS[program] and batch.np is not None)
+    assert (result.reason is None) == result.vectorized
+    rows = expected(tree, dict(COLUMNS), 5)
+    assert found(result) == rows
+    for (kind, value), (_, other) in zip(found(result), rows):
+        if kind == "valore":
+            assert type(value) is type(other)
+
+
+def test_without_numpy(monkeypatch):
+    monkeypatch.setattr(batch, "np", None)
+    tree = Expression.from_program("y x /", d)
+    result = batch.evaluate_batch(tree, COLUMNS)
+    assert not result.vectorized and result.reason == "numpy non è installato"
+    assert found(result) == expected(tree, COLUMNS, 5)
+
+
+def test_reasons():
+    reasons = {"x print": batch.REASONS[batch.Print], "x 1 + x setq": batch.REASONS[batch.Setq],
+               "a vsum": "il nodo vsum non ha una versione vettoriale"}
+    for program, reason in reasons.items():
+        assert batch.unsupported(Expression.from_program(program, d)) == reason
+    assert batch.unsupported(Expression.from_program("x 1 + 2 *", d)) is None
+
+
+def test_columns():
+    with pytest.raises(ValueError):
+        batch.evaluate_batch(Expression.from_program("x y +", d), {"x": [1, 2], "y": [1]})
+    with pytest.raises(ValueError):
+        batch.evaluate_batch(Expression.from_program("1 2 +", d), {})
+    result = batch.evaluate_batch(Expression.from_program("1 2 +", d), {}, rows=3)
+    assert list(result.values) == [3, 3, 3]
+
+
+def test_recheck():
+    # righe in cui NumPy darebbe un risultato diverso (interi oltre 64 bit, divisione per zero): valutate con evaluate
+    np = pytest.importorskip("numpy")
+    columns = {"x": np.array([1, 2 ** 62, 3]), "y": np.array([1, 4, 0])}
+    tree = Expression.from_program("y x * y x / +", d)
+    result = batch.evaluate_batch(tree, columns)
+    assert result.vectorized and result.rechecked == 2
+    assert found(result) == expected(tree, {name: column.tolist() for name, column in columns.items()}, 3)
+    assert result.values[1] == 2 ** 64 + 2 ** 60
+
+
+def test_non_numeric_column():
+    pytest.importorskip("numpy")
+    tree = Expression.from_program("x y +", d)
+    result = batch.evaluate_batch(tree, {"x": ["a", "b"], "y": ["c", "d"]})
+    assert not result.vectorized and "non contiene numeri" in result.reason
+    assert list(result.values) == ["ca", "db"]
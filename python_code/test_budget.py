@@ -0,0 +1,98 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test dei limiti di esecuzione (budget.py): BudgetExceeded per i cicli e le ricorsioni che non terminano, sia con il
+limite di passi sia con il tempo massimo; senza limiti la valutazione è quella di tree.evaluate.
+
+    python3 -m pytest test_budget.py
+"""
+
+import pickle
+import time
+
+import pytest
+
+import budget
+from expressions import Expression, BudgetExceeded, d
+
+
+RUNAWAY = "x 1 + x setq 0 0 = while"
+
+
+def parse(program):
+    return Expression.from_program(program, d)
+
+
+def test_steps():
+    env = {"x": 0}
+    with pytest.raises(BudgetExceeded) as info:
+        budget.evaluate(parse(RUNAWAY), env, steps=100)
+    error = info.value
+    # ogni iterazione costa i 6 nodi del corpo e della condizione: il limite viene superato alla diciassettesima
+    assert (error.steps, error.iterations) == (102, 17)
+    assert error.node.startswith("while")
+    assert "superato il limite di 100 passi" in str(error)
+    # le modifiche fatte prima dell'eccezione restano
+    assert env["x"] == 16
+
+
+def test_seconds():
+    start = time.monotonic()
+    with pytest.raises(BudgetExceeded) as info:
+        budget.evaluate(parse(RUNAWAY), {"x": 0}, seconds=0.05)
+    assert 0.05 <= info.value.elapsed < 5
+    assert time.monotonic() - start < 5
+    assert "tempo massimo" in str(info.value)
+
+
+def test_recursion():
+    # la ricorsione senza fine viene interrotta dal limite di passi prima di RecursionError
+    with pytest.raises(BudgetExceeded) as info:
+        budget.evaluate(parse("f call f call f desub prog2"), {}, steps=50)
+    assert info.value.iterations == 0 and info.value.node.startswith("call")
+
+
+def test_previous_subroutine():
+    # i corpi definiti in una valutazione precedente vengono convertiti alla prima chiamata
+    env = {"x": 0}
+    parse("x 1 + x setq 0 0 = while f desub").evaluate(env)
+    with pytest.raises(BudgetExceeded):
+        budget.evaluate(parse("f call"), env, steps=1000)
+
+
+@pytest.mark.parametrize("program", ["s i + s setq 10 0 i for s 0 + prog2",
+                                      "x 1 + x setq 10 x < while x 0 + prog2",
+                                      "f call f call n 2 * n setq f desub prog3"])
+def test_within_limits(program):
+    tree = parse(program)
+    expected_env = {"s": 0, "x": 0, "n": 1}
+    expected = tree.evaluate(expected_env)
+    env = {"s": 0, "x": 0, "n": 1}
+    limits = budget.Budget(steps=10000)
+    assert limits.run(tree, env) == expected and env == expected_env
+    assert 0 < limits.used <= 10000
+
+
+def test_no_limits(monkeypatch):
+    # senza limiti l'albero non viene convertito
+    monkeypatch.setattr(budget, "limited", None)
+    assert budget.evaluate(parse("1 2 +"), {}) == 3
+
+
+def test_limited_tree():
+    tree = parse(RUNAWAY)
+    converted = budget.limited(tree)
+    assert budget.limited(tree) is converted and budget.limited(converted) is converted
+    assert type(converted) is budget.LimitedWhile and type(tree) is not budget.LimitedWhile
+    # fuori da Budget.run la copia convertita si valuta come l'originale
+    env = {"x": 0}
+    budget.limited(parse("x 1 + x setq 3 x < while")).evaluate(env)
+    assert env["x"] == 3
+
+
+def test_pickle():
+    with pytest.raises(BudgetExceeded) as info:
+        budget.evaluate(parse(RUNAWAY), {"x": 0}, steps=10)
+    copy = pickle.loads(pickle.dumps(info.value))
+    assert str(copy) == str(info.value)
+    assert (copy.steps, copy.iterations, copy.node) == (info.value.steps, info.value.iterations, info.value.node)
@@ -0,0 +1,117 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test della cache degli alberi (cache.py): eliminazione LRU, impronta del dizionario delle operazioni, file su disco
+non più validi o danneggiati.
+
+    python3 -m pytest test_cache.py
+"""
+
+import os
+
+import pytest
+
+import cache
+from expressions import Expression, Addition, d
+
+
+def test_hits_and_lru():
+    parse_cache = cache.ParseCache(maxsize=2)
+    first = parse_cache.get("1 2 +")
+    assert parse_cache.get("1 2 +") is first
+    parse_cache.get("3 4 +")
+    parse_cache.get("1 2 +")          # "1 2 +" diventa il più recente
+    parse_cache.get("5 6 +")          # viene eliminato "3 4 +", il meno usato
+    assert len(parse_cache) == 2
+    assert parse_cache.get("1 2 +") is first
+    stats = parse_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (3, 3, 1)
+    parse_cache.get("3 4 +")
+    assert parse_cache.stats()["misses"] == 4
+
+
+def test_fingerprint():
+    dispatch = dict(d)
+    value = cache.fingerprint(dispatch)
+    assert cache.fingerprint(dispatch) is value     # calcolata una volta sola
+    assert cache.fingerprint(dict(d)) == value      # stesso contenuto, stessa impronta
+
+    class Sum(Addition):
+        __slots__ = ()
+
+    dispatch["+"] = Sum
+    assert cache.fingerprint(dispatch) != value
+    del dispatch["+"]
+    assert cache.fingerprint(dispatch) != value
+    dispatch["+"] = Addition
+    assert cache.fingerprint(dispatch) == value
+
+
+def test_dispatch_change():
+    # un'operazione sostituita nel dizionario: l'albero viene costruito di nuovo con la nuova classe
+    class Sum(Addition):
+        __slots__ = ()
+
+    dispatch = dict(d)
+    parse_cache = cache.ParseCache()
+    assert type(parse_cache.get("1 2 +", dispatch)) is Addition
+    dispatch["+"] = Sum
+    assert type(parse_cache.get("1 2 +", dispatch)) is Sum
+    dispatch["+"] = Addition
+    assert type(parse_cache.get("1 2 +", dispatch)) is Addition
+    assert parse_cache.stats()["misses"] == 3
+
+
+def test_disk(tmp_path):
+    writer = cache.ParseCache(directory=tmp_path)
+    tree = writer.get("x 1 + x setq")
+    assert writer.stats()["disk_writes"] == 1
+    reader = cache.ParseCache(directory=tmp_path)
+    loaded = reader.get("x 1 + x setq")
+    assert reader.stats()["disk_hits"] == 1 and loaded is not tree and str(loaded) == str(tree)
+    env = {"x": 1}
+    loaded.evaluate(env)
+    assert env == {"x": 2}
+
+
+def test_disk_invalidation(tmp_path, monkeypatch):
+    # file scritti con un'impronta diversa (versione del formato o sorgente dei moduli cambiati) non vengono usati
+    cache.ParseCache(directory=tmp_path).get("1 2 +")
+    monkeypatch.setattr(cache, "FORMAT_VERSION", cache.FORMAT_VERSION + 1)
+    reader = cache.ParseCache(directory=tmp_path)
+    reader.get("1 2 +")
+    assert reader.stats()["disk_hits"] == 0 and reader.stats()["disk_writes"] == 1
+    monkeypatch.setitem(cache._sources, "expressions", "sorgente modificato")
+    reader = cache.ParseCache(directory=tmp_path)
+    reader.get("1 2 +")
+    assert reader.stats()["disk_hits"] == 0
+    # un file con il nome giusto ma salvato per un altro programma non viene usato
+    other = cache.ParseCache(directory=tmp_path)
+    path = other.path("3 4 +", d)
+    os.replace(other.path("1 2 +", d), path)
+    assert other.get("3 4 +").evaluate({}) == 7
+    assert other.stats()["disk_hits"] == 0
+
+
+def test_corrupt_file(tmp_path):
+    parse_cache = cache.ParseCache(directory=tmp_path)
+    parse_cache.get("2 3 *")
+    for content in (b"", b"non un pickle", b"\x80\x05K\x01."):
+        with open(parse_cache.path("2 3 *", d), "wb") as f:
+            f.write(content)
+        reader = cache.ParseCache(directory=tmp_path)
+        assert reader.get("2 3 *").evaluate({}) == 6
+        assert reader.stats()["disk_hits"] == 0 and reader.stats()["disk_writes"] == 1
+
+
+def test_parse_error_not_cached():
+    parse_cache = cache.ParseCache()
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            parse_cache.get("1 +")
+    assert len(parse_cache) == 0 and parse_cache.stats()["misses"] == 2
+
+
+def test_from_program():
+    assert cache.from_program("1 2 +") is cache.from_program("1 2 +")
+    assert str(cache.from_program("1 2 +")) == str(Expression.from_program("1 2 +", d))
@@ -0,0 +1,179 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test differenziali dei motori di valutazione e delle passate di ottimizzazione.
+
+Ogni programma del corpus viene valutato con Expression.evaluate e con ogni motore (o albero ottimizzato), partendo
+da copie dello stesso ambiente: valore ritornato, ambiente finale, output di print e tipo dell'eccezione devono
+essere gli stessi. test_threads valuta lo stesso programma compilato (o ottimizzato) da più thread insieme, con
+ambienti diversi.
+
+    python3 -m pytest test_engines.py
+"""
+
+import copy
+import sys
+import threading
+import warnings
+
+import pytest
+
+import bytecode
+import frames
+import inline
+import iterative
+import loops
+import optimizer
+import output
+import specialize
+import transpiler
+from expressions import Expression, d
+
+
+PROGRAMS = [
+    # operazioni e costanti
+    "0 2 -", "3 4 +", "2 3 ** 4 *", "7 3 %", "x 1 +", "x", "x abs abs", "x 2 3 1 + + +", "x y - 2 x setq prog2",
+    "5 0 /", "0 1/", "x 0 /", "x 1 ** 2 ** 1 *", "1 x 0 - *", "2 3 ** 4 * 0 /", "b 0 +",
+    # variabili
+    "y x setq", "3 x setq", "x 1 + x setq", "x 1 + y setq y alloc prog2", "x y - 2 x setq 3 y setq prog3",
+    # condizioni e cicli
+    "1 2 3 2 > if", "1 2 x if", "1 2 3 if", "x 2 1 2 prog2 if", "1 y 1 x setq 3 prog2 if", "x 0 + 1 2 3 > if", "y 0 x + 2 3 > if",
+    "x 1 + x setq  x 10 <  while", "x 1 + x setq  x 5 <  while  x 0 + prog2",
+    "s 0 +  s i + s setq 10 0 i for  s alloc  prog3", "x i + x setq 10 0 i for", "nop 3 3 i for", "nop 3 5 i for",
+    # array
+    "n 5 x setv", "10 a valloc", "a 0 +  i i * i a setv 10 0 i for  10 a valloc  prog3",
+    "a 0 + 1 5 a setv 3 a valloc prog3", "a 0 + 1 x a setv 3 a valloc prog3", "a 0 + 1 2 1 - a setv 3 a valloc prog3",
+    "a vsum  i i 2 % a setv 10 0 i for  10 a valloc  prog3",
+    # subroutine e print
+    "s 0 + x 1 + x setq f desub f call f call prog4", "f call", "x print", "5 print", "nop",
+    "i print 4 0 i for", "x 1 + f desub x 1 + g desub 1 2 > if f call prog2",
+    "f call x 1 + f desub prog2", "f call 2 f desub prog2",
+    "f call  1 1/ f desub  prog2", "f call  x 0 + 2 3 * + f desub  prog2", "1 2 3 if f desub",
+    # tipi che cambiano durante la valutazione (guardie dei nodi specializzati)
+    "s i + s setq s 1 + s setq 20 s < if 10 0 i for 0 s setq s alloc prog3",
+    "s 10 i % + s setq 50 0 i for 0 s setq s alloc prog3", "0 s setq s 1 + s setq 3 0 i for prog2",
+    "i 1 + i setq 10 i < while 0 i setq i alloc prog3", "x 1 + x setq 0.5 x setq prog2",
+    # sottoespressioni invarianti e riduzione di forza nei cicli
+    "s n 2 ** n 1 - * i 4 * + + s setq 100 0 i for 0 s setq s alloc prog3 10 n setq n alloc prog3",
+    "i 1 + i setq n 1 - i < while 0 i setq i alloc prog3 50 n setq n alloc prog3",
+    "s i 2 ** + s setq 40 0 i for 0 s setq s alloc prog3", "s 0 x / + s setq 3 0 i for 0 s setq s alloc prog3",
+    "s 0 x / + s setq 0 0 i for 0 s setq s alloc prog3",
+    "a b = print 1 0 a setv prog2 3 0 i for 3 b valloc 3 a valloc prog3",
+    "s n + s setq 1 n + n setq prog2 5 0 i for 0 s setq s alloc prog3 1 n setq n alloc prog3",
+    "s k 3 * n * + s setq 10 0 k for 10 0 i for 0 s setq s alloc prog3 2 n setq n alloc prog3",
+    "s i 3 * + s setq 2 i + i setq prog2 20 0 i for 0 s setq s alloc prog3",
+    "s x y * + s setq x 3 * 0 i for 0 s setq s alloc prog3",
+    # subroutine sostituite dal corpo
+    "s f call + s setq 10 0 i for  i 2 * 1 + f desub  0 s setq  s alloc  prog4",
+    "f call  x 1 + x setq f call 5 x > if  f desub  0 x setq  x alloc prog4",
+    "f call  x 1 + f desub  x 2 + f desub  1 2 > if  prog2", "g call  f call 2 * g desub  x 1 + f desub  prog3",
+    "s f call + s setq g call 2 > while x 1 + f desub 0 s setq s alloc prog4",
+    "f call x 1 + f desub prog2 3 0 i for", "f call x y - f desub prog2",
+]
+
+ENVIRONMENTS = [{}, {"x": 3, "y": 4}, {"x": -1, "y": 0}, {"x": 2.5, "y": True}, {"x": "a", "y": "b", "s": 1.5}]
+
+
+def outcome(function, env):
+    # (valore o tipo dell'eccezione, ambiente finale, testo stampato) della valutazione di function(env)
+    printed = output.TextSink()
+    try:
+        with output.using(printed):
+            result = ("valore", function(env))
+    except Exception as ex:
+        result = ("eccezione", type(ex).__name__)
+    # i corpi delle subroutine vengono confrontati come testo: i motori possono sostituirli con copie
+    state = {key: str(value) if isinstance(value, Expression) else value for key, value in env.items()}
+    if isinstance(result[1], Expression):
+        result = (result[0], str(result[1]))
+    return result, state, printed.getvalue()
+
+
+def _bytecode(tree):
+    code = bytecode.compile_tree(tree)
+    return lambda env: bytecode.run(code, env)
+
+
+# motore -> funzione che prepara l'albero e ritorna la funzione da chiamare con l'ambiente
+ENGINES = {
+    "bytecode": _bytecode,
+    "transpiler": transpiler.transpile,
+    "frames": lambda tree: frames.resolve(tree).evaluate,
+    "iterative": lambda tree: lambda env: iterative.evaluate(tree, env),
+    "specialize": lambda tree: specialize.specialize(tree)[0].evaluate,
+    "loops": lambda tree: loops.optimize_loops(tree)[0].evaluate,
+    "inline": lambda tree: inline.inline_calls(tree)[0].evaluate,
+    "inline+loops": lambda tree: loops.optimize_loops(inline.inline_calls(tree)[0])[0].evaluate,
+    "fold": lambda tree: optimizer.fold_constants(tree)[0].evaluate,
+}
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engine(engine, program):
+    tree = Expression.from_program(program, d)
+    function = ENGINES[engine](tree)
+    for env in ENVIRONMENTS:
+        assert outcome(function, copy.deepcopy(env)) == outcome(tree.evaluate, copy.deepcopy(env))
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_transpiler_warnings(program):
+    # il codice generato non deve produrre avvisi di compile (ad esempio "is" con un letterale)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        transpiler.transpile(Expression.from_program(program, d))
+
+
+# subroutine che si chiamano senza fine: tutti i motori devono sollevare RecursionError (il valutatore iterativo non
+# usa lo stack di Python e non ha un limite di profondità, quindi non viene provato)
+RECURSIVE_PROGRAMS = ["f call f call f desub prog2", "f call  f call 1 + f desub  prog2",
+                      "f call  f call g desub  g call f desub  prog3",
+                      "s f call + s setq 10 0 i for  f call 1 + f desub  0 s setq  s alloc  prog4"]
+
+
+@pytest.mark.parametrize("program", RECURSIVE_PROGRAMS)
+@pytest.mark.parametrize("engine", [engine for engine in ENGINES if engine != "iterative"])
+def test_recursion(engine, program):
+    tree = Expression.from_program(program, d)
+    assert outcome(tree.evaluate, {})[0] == ("eccezione", "RecursionError")
+    assert outcome(ENGINES[engine](tree), {})[0] == ("eccezione", "RecursionError")
+
+
+def test_iterative_deep():
+    # albero troppo profondo per evaluate: il valutatore iterativo non usa lo stack di Python
+    tree = Expression.from_program("x" + " 1 +" * 100000, d)
+    assert outcome(lambda env: iterative.evaluate(tree, env), {"x": 2}) == (("valore", 100002), {"x": 2}, "")
+
+
+# programmi valutati da più thread insieme: k è diverso per ogni thread
+THREAD_PROGRAMS = [
+    "s 0 +  i print s k 10 * + s setq prog2 300 0 i for  0 s setq  s alloc  prog4",
+    "s 0 +  s i k * + s setq 300 0 i for  0 s setq  s alloc  prog4",
+    "s 0 +  s i 4 * k + + s setq 300 k i for  0 s setq  s alloc  prog4",
+]
+
+
+@pytest.mark.parametrize("program", THREAD_PROGRAMS)
+@pytest.mark.parametrize("engine", ENGINES)
+def test_threads(engine, program):
+    tree = Expression.from_program(program, d)
+    function = ENGINES[engine](tree)
+    expected = {k: outcome(tree.evaluate, {"k": k}) for k in range(1, 5)}
+    results = {}
+
+    def work(k):
+        results[k] = [outcome(function, {"k": k}) for _ in range(10)]
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)   # cambi di thread frequenti, anche in mezzo a un ciclo
+    try:
+        threads = [threading.Thread(target=work, args=(k,)) for k in expected]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    for k, found in results.items():
+        assert found == [expected[k]] * 10
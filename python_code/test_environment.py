@@ -0,0 +1,128 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test dell'isolamento degli ambienti a livelli (environment.py): le valutazioni su un ambiente ottenuto con fork non
+devono modificare l'ambiente di partenza né gli altri ambienti ottenuti dallo stesso.
+
+    python3 -m pytest test_environment.py
+"""
+
+import pytest
+
+import arrays
+import bytecode
+import frames
+import iterative
+import pfor
+import sparse
+import transpiler
+import vectorize
+from environment import Environment
+from expressions import Expression, d
+
+
+def forks(values, count=2):
+    # ambiente di partenza e count ambienti ottenuti con fork
+    base = Environment(values)
+    return base, [base.fork() for _ in range(count)]
+
+
+def test_vectorized_for():
+    pytest.importorskip("numpy")
+    tree, vectorizer = vectorize.vectorize_loops(Expression.from_program("i 2 * i a setv 10 0 i for", d))
+    assert vectorizer.vectorized == 1
+    base, (first, second) = forks({"a": [0] * 10})
+    tree.evaluate(first)
+    assert first["a"] == [2 * i for i in range(10)]
+    assert base["a"] == [0] * 10
+    assert second["a"] == [0] * 10
+
+
+def _bytecode(tree):
+    code = bytecode.compile_tree(tree)
+    return lambda env: bytecode.run(code, env)
+
+
+# motore -> funzione che prepara l'albero e ritorna la funzione da chiamare con l'ambiente
+ENGINES = {
+    "evaluate": lambda tree: tree.evaluate,
+    "bytecode": _bytecode,
+    "transpiler": transpiler.transpile,
+    "frames": lambda tree: frames.resolve(tree).evaluate,
+    "iterative": lambda tree: lambda env: iterative.evaluate(tree, env),
+}
+
+# array di partenza: lista, array tipizzato e array sparso con gli stessi elementi
+ARRAYS = {"list": list, "typed": lambda items: _typed(arrays.TypedArray, items),
+          "sparse": lambda items: _typed(sparse.SparseArray, items)}
+
+# programma -> valori attesi, nell'ambiente modificato, delle variabili che cambia
+PROGRAMS = {
+    "5 x setq": {"x": 5},
+    "x 1 + x setq 7 x setq prog2": {"x": 8},
+    "9 1 a setv": {"a": [0, 9, 0, 0]},
+    "i 1 + i a setv 4 0 i for": {"a": [1, 2, 3, 4], "i": 3},
+    "3 a vfill": {"a": [3, 3, 3, 3]},
+    "b 0 2 a 1 vcopy": {"a": [0, 5, 6, 0]},
+    "2 1 a setv 3 a vfill prog2": {"a": [3, 2, 3, 3]},
+}
+
+
+def _typed(kind, items):
+    result = kind(len(items))
+    for index, item in enumerate(items):
+        result[index] = item
+    return result
+
+
+def snapshot(env):
+    # contenuto dell'ambiente, con gli array come liste
+    return {name: list(value) if name in ("a", "b") else value for name, value in env.items()}
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+@pytest.mark.parametrize("kind", ARRAYS)
+@pytest.mark.parametrize("engine", ENGINES)
+def test_fork_isolation(engine, kind, program):
+    make = ARRAYS[kind]
+    base, (first, second) = forks({"x": 1, "a": make([0, 0, 0, 0]), "b": make([5, 6, 7, 8])})
+    before = snapshot(base)
+    ENGINES[engine](Expression.from_program(program, d))(first)
+    assert snapshot(first) == {**before, **PROGRAMS[program]}
+    assert snapshot(base) == before
+    assert snapshot(second) == before
+
+
+def test_fork_of_fork():
+    # una variante di una variante non modifica né la variante da cui è stata ottenuta né l'ambiente di partenza
+    base, (first,) = forks({"a": [0, 0]}, 1)
+    Expression.from_program("1 0 a setv", d).evaluate(first)
+    child = first.fork()
+    Expression.from_program("2 1 a setv", d).evaluate(child)
+    assert child["a"] == [1, 2]
+    assert first["a"] == [1, 0]
+    assert base["a"] == [0, 0]
+
+
+def test_aliases():
+    # la copia di un array condiviso sostituisce l'array per tutti i nomi che lo contengono, solo nella variante
+    values = [0, 0, 0]
+    base, (first, second) = forks({"a": values, "b": values})
+    Expression.from_program("4 2 a setv", d).evaluate(first)
+    assert first["a"] is first["b"]
+    assert first["b"] == [0, 0, 4]
+    assert base["a"] is base["b"] is values == [0, 0, 0]
+    assert second["b"] == [0, 0, 0]
+
+
+def test_pfor(monkeypatch):
+    # pfor sposta la lista in memoria condivisa solo nella variante che la scrive
+    if pfor.shared_memory is None:
+        pytest.skip("memoria condivisa non disponibile")
+    monkeypatch.setattr(pfor, "workers", 2)
+    tree = Expression.from_program("i 3 * i a setv 64 0 i pfor", d)
+    base, (first, second) = forks({"a": [0] * 64})
+    tree.evaluate(first)
+    assert first["a"] == [3 * i for i in range(64)]
+    assert type(base["a"]) is list and base["a"] == [0] * 64
+    assert second["a"] == [0] * 64
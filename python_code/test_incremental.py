@@ -0,0 +1,102 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test della valutazione incrementale (incremental.py): dopo ogni modifica dell'ambiente il risultato deve essere
+quello di tree.evaluate(env), ricalcolando solo i nodi che dipendono dalle variabili cambiate.
+
+    python3 -m pytest test_incremental.py
+"""
+
+import pytest
+
+from expressions import Expression, MissingVariableException, ZeroDivisionError, d
+from incremental import IncrementalEvaluator
+
+
+def outcome(function, env):
+    # valore o tipo dell'eccezione sollevata
+    try:
+        return function(env)
+    except Exception as error:
+        return type(error)
+
+
+# programma -> ambienti da valutare uno dopo l'altro
+PROGRAMS = {
+    "x 1 + y 2 * +": [{"x": 1, "y": 2}, {"x": 1, "y": 3}, {"x": 4, "y": 3}, {"x": 4, "y": 3}],
+    "x 1 /": [{"x": 2}, {"x": 0}, {"x": 4}, {"x": 0.0}, {"x": -0.0}],
+    "x 3 * x 2 + y if": [{"x": 5, "y": True}, {"x": 5, "y": False}, {"x": 2, "y": False}, {"x": 2, "y": 1}],
+    "x y + z 1 - 2 prog2 *": [{"x": 1, "y": 2, "z": 3}, {"x": 1, "y": 2}, {"x": 1, "y": 2, "z": 5}],
+    "x y +": [{"x": "a", "y": "b"}, {"x": "a", "y": "c"}, {"x": 1.5, "y": 1}, {"x": 1.5, "y": True}],
+}
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_same_as_evaluate(program):
+    tree = Expression.from_program(program, d)
+    evaluator = IncrementalEvaluator(tree)
+    assert evaluator.reason is None
+    for env in PROGRAMS[program]:
+        expected = outcome(tree.evaluate, dict(env))
+        result = outcome(evaluator.evaluate, dict(env))
+        assert result == expected and type(result) is type(expected)
+    assert evaluator.full_runs == 1
+
+
+def test_reuse():
+    tree = Expression.from_program("x 1 + y 2 * +", d)
+    evaluator = IncrementalEvaluator(tree)
+    assert evaluator.evaluate({"x": 1, "y": 2}) == 6
+    assert (evaluator.evaluated, evaluator.reused) == (5, 0)
+    # cambia solo y: vengono ricalcolati y 2 * e la radice, il sottoalbero x 1 + e la costante 2 vengono riusati
+    assert evaluator.evaluate({"x": 1, "y": 5}) == 12
+    assert (evaluator.evaluated, evaluator.reused) == (7, 3)
+    # nulla è cambiato: viene riusata la radice
+    assert evaluator.evaluate({"x": 1, "y": 5}) == 12
+    assert (evaluator.evaluated, evaluator.reused) == (7, 8)
+
+
+def test_errors():
+    evaluator = IncrementalEvaluator(Expression.from_program("x 1 /", d))
+    with pytest.raises(ZeroDivisionError):
+        evaluator.evaluate({"x": 0})
+    with pytest.raises(MissingVariableException):
+        evaluator.evaluate({})
+    assert evaluator.evaluate({"x": 4}) == 0.25
+
+
+def test_unsupported():
+    # con effetti collaterali l'albero viene valutato per intero ogni volta
+    tree = Expression.from_program("x 1 + x setq", d)
+    evaluator = IncrementalEvaluator(tree)
+    assert evaluator.reason == "contiene setq, che può avere effetti collaterali"
+    env = {"x": 1}
+    evaluator.evaluate(env)
+    evaluator.evaluate(env)
+    assert env["x"] == 3 and evaluator.full_runs == 2
+    assert str(evaluator).startswith("valutazione completa")
+
+
+def test_arrays_always_changed():
+    # gli array possono cambiare senza essere riassegnati: i nodi che li leggono vengono sempre ricalcolati
+    evaluator = IncrementalEvaluator(Expression.from_program("b a +", d))
+    values = [1]
+    env = {"a": values, "b": [2]}
+    assert evaluator.evaluate(env) == [1, 2]
+    values.append(3)
+    assert evaluator.evaluate(env) == [1, 3, 2]
+
+
+def test_invalidate():
+    evaluator = IncrementalEvaluator(Expression.from_program("x 1 +", d))
+    evaluator.evaluate({"x": 1})
+    evaluator.invalidate()
+    assert evaluator.evaluate({"x": 1}) == 2 and evaluator.full_runs == 2
+
+
+def test_deep_tree():
+    # la valutazione non usa la ricorsione di Python
+    tree = Expression.from_program("x" + " 1 +" * 20000, d)
+    evaluator = IncrementalEvaluator(tree)
+    assert evaluator.evaluate({"x": 0}) == 20000
+    assert evaluator.evaluate({"x": 5}) == 20005
@@ -0,0 +1,92 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test della memoizzazione delle chiamate (memo.py): risultati riusati solo per i corpi puri e solo con gli stessi
+valori delle variabili lette, eliminati quando una di quelle variabili viene assegnata.
+
+    python3 -m pytest test_memo.py
+"""
+
+import pytest
+
+import memo
+from expressions import Expression, ZeroDivisionError, d
+
+
+def run(program, env, maxsize=memo.MAXSIZE):
+    tree = Expression.from_program(program, d)
+    memoized, memoizer = memo.memoize_calls(tree, maxsize)
+    expected = dict(env)
+    value = memoized.evaluate(env)
+    assert value == tree.evaluate(expected) and values(env) == values(expected)
+    return value, memoizer.cache
+
+
+def values(env):
+    # variabili dell'ambiente, senza i corpi delle subroutine (le passate li sostituiscono con copie)
+    return {name: value for name, value in env.items() if not isinstance(value, Expression)}
+
+
+def test_hits():
+    value, cache = run("f call f call f call x 2 * f desub prog4", {"x": 5})
+    assert value == 10
+    assert (cache.hits, cache.misses, cache.skipped) == (2, 1, 0)
+
+
+def test_setq_invalidates():
+    value, cache = run("f call 6 x setq f call x 2 * f desub prog4", {"x": 5})
+    assert value == 12
+    assert (cache.hits, cache.misses, cache.invalidations) == (0, 2, 1)
+
+
+def test_for_invalidates():
+    # il corpo che legge la variabile del ciclo viene rivalutato a ogni iterazione
+    value, cache = run("s 0 + f call s + s setq 4 0 i for i i * f desub prog3", {"s": 0})
+    assert value == 14
+    assert (cache.hits, cache.misses, cache.invalidations) == (0, 4, 3)
+    # quello che non la legge no
+    value, cache = run("s 0 + f call s + s setq 4 0 i for x x * f desub prog3", {"s": 0, "x": 3})
+    assert value == 36
+    assert (cache.hits, cache.misses, cache.invalidations) == (3, 1, 0)
+
+
+def test_value_types():
+    # 1 e True sono valori diversi per la chiave, anche se uguali
+    value, cache = run("f call 1 x setq f call x 0 + f desub prog4", {"x": True})
+    assert value == 1 and type(value) is int
+    assert cache.misses == 2
+
+
+def test_impure():
+    value, cache = run("f call f call x 1 + x setq f desub prog3", {"x": 0})
+    assert value == 2
+    assert (cache.hits, cache.misses, cache.skipped) == (0, 0, 2)
+    tree = Expression.from_program("g call  x 1 + g desub  y 3 + y setq f desub  prog3", d)
+    assert memo.explain(tree) == [("g", None, ("x",)), ("f", "contiene setq", ())]
+
+
+def test_exceptions_not_stored():
+    tree, memoizer = memo.memoize_calls(Expression.from_program("f call 0 x / f desub prog2", d))
+    for _ in range(2):
+        with pytest.raises(ZeroDivisionError):
+            tree.evaluate({"x": 1})
+    assert len(memoizer.cache) == 0 and memoizer.cache.misses == 2
+
+
+def test_lru():
+    cache = memo.MemoCache(maxsize=2)
+    body = Expression.from_program("x 1 +", d)
+    for x in (1, 2, 3, 1):
+        assert cache.call(body, {"x": x}) == x + 1
+    assert (cache.misses, cache.evictions, len(cache)) == (4, 2, 2)
+    cache.call(body, {"x": 1})
+    cache.call(body, {"x": 2})
+    assert cache.hits == 1 and cache.misses == 5
+
+
+def test_tree_unchanged():
+    tree = Expression.from_program("f call x 1 + f desub prog2", d)
+    text = str(tree)
+    memoized, memoizer = memo.memoize_calls(tree)
+    assert str(tree) == text and memoized is not tree
+    assert memoizer.calls == 1
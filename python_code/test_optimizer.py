@@ -0,0 +1,83 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test della passata di constant folding e semplificazione algebrica (optimizer.py). L'equivalenza con evaluate sul
+corpus di programmi è provata in test_engines.py.
+
+    python3 -m pytest test_optimizer.py
+"""
+
+import pytest
+
+import optimizer
+from expressions import Expression, Constant, ZeroDivisionError, d
+
+
+def fold(program, numeric_variables=False):
+    folder = optimizer.ConstantFolder(numeric_variables)
+    return folder.run(Expression.from_program(program, d)), folder
+
+
+@pytest.mark.parametrize("program, value", [("2 3 ** 4 *", 36), ("7 3 %", 3), ("1 2 3 2 > if", 1),
+                                            ("4 1/", 0.25), ("3 0 1 - abs -", -2), ("3 2 <", True)])
+def test_folding(program, value):
+    tree, folder = fold(program)
+    assert type(tree) is Constant and tree.value == value and type(tree.value) is type(value)
+    assert folder.after == 1 and folder.removed == folder.before - 1
+
+
+@pytest.mark.parametrize("program, result", [("0 x +", "(+ x 0)"), ("0 1 x - +", "(- x 1)"), ("x 0 -", "(- 0 x)"), ("x 0 1 - *", "(* 1 x)"),
+                                             ("x abs abs", "(abs x)"), ("2 x - 0 +", "(- x 2)"),
+                                             ("1 x 2 - *", "(- 2 x)"), ("1 x 2 - **", "(- 2 x)")])
+def test_identities(program, result):
+    # le identità valgono solo se l'altro argomento è sicuramente un numero
+    tree, _ = fold(program)
+    assert str(tree) == result
+
+
+def test_identities_numeric_variables():
+    # x + 0 con x lista o booleano non è x: senza numeric_variables l'operazione resta
+    assert str(fold("x 0 +")[0]) == "(+ 0 x)"
+    tree, folder = fold("x 0 +", numeric_variables=True)
+    assert str(tree) == "x" and folder.simplified == 1
+    env = {"x": True}
+    assert Expression.from_program("x 0 +", d).evaluate(env) == 1 and type(fold("x 0 +")[0].evaluate(env)) is int
+
+
+@pytest.mark.parametrize("program", ["0 5 /", "0 1/", "0 5 / 2 3 + +", "0 x / 1 *", "0 2 3 - abs abs /",
+                                     "1 0 5 / 2 3 > if"])
+def test_division_by_zero(program):
+    # l'operazione che solleverebbe l'eccezione non viene calcolata: l'errore resta alla valutazione
+    tree, _ = fold(program)
+    for evaluate in (Expression.from_program(program, d).evaluate, tree.evaluate):
+        with pytest.raises(ZeroDivisionError):
+            evaluate({"x": 3})
+
+
+def test_dead_loops():
+    tree, folder = fold("x 1 + x setq 0 while  nop 3 5 i for  prog2")
+    assert str(tree) == "Prog2(nop, nop)" and folder.pruned == 2
+
+
+def test_large_power():
+    # potenze troppo grandi non vengono calcolate durante l'ottimizzazione
+    tree, folder = fold("100000 10 **")
+    assert type(tree) is not Constant and folder.folded == 0
+
+
+def test_subroutine_body_unchanged():
+    # il corpo di desub è un valore dell'ambiente: non viene ottimizzato
+    program = "f call  1 1/ 0 x + + f desub  prog2"
+    tree, folder = fold(program)
+    expected, found = {"x": 2}, {"x": 2}
+    Expression.from_program(program, d).evaluate(expected)
+    tree.evaluate(found)
+    assert str(found["f"]) == str(expected["f"]) == "(+ (+ x 0) (1/ 1))"
+    assert folder.folded == 0 and folder.simplified == 0
+
+
+def test_original_unchanged():
+    original = Expression.from_program("x 2 3 * + 0 +", d)
+    text = str(original)
+    optimizer.fold_constants(original)
+    assert str(original) == text
@@ -0,0 +1,136 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test delle destinazioni dell'output di print (output.py): scrittura su sys.stdout senza destinazione, accumulo e
+scrittura a blocchi di BufferedSink, destinazioni che ricevono i valori e isolamento tra i thread.
+
+    python3 -m pytest test_output.py
+"""
+
+import io
+import threading
+
+import pytest
+
+import bytecode
+import frames
+import iterative
+import output
+import transpiler
+from expressions import Expression, ZeroDivisionError, d
+
+
+def parse(program):
+    return Expression.from_program(program, d)
+
+
+def _bytecode(tree):
+    code = bytecode.compile_tree(tree)
+    return lambda env: bytecode.run(code, env)
+
+
+# motore -> funzione che prepara l'albero e ritorna la funzione da chiamare con l'ambiente
+ENGINES = {
+    "evaluate": lambda tree: tree.evaluate,
+    "bytecode": _bytecode,
+    "transpiler": transpiler.transpile,
+    "frames": lambda tree: frames.resolve(tree).evaluate,
+    "iterative": lambda tree: lambda env: iterative.evaluate(tree, env),
+}
+
+
+def test_stdout(capsys):
+    assert parse("x print").evaluate({"x": 3}) == 3
+    assert capsys.readouterr().out == "3\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engines(engine, capsys):
+    function = ENGINES[engine](parse("i print 3 0 i for"))
+    with output.using(output.TextSink()) as sink:
+        function({})
+    assert sink.getvalue() == "0\n1\n2\n"
+    assert capsys.readouterr().out == ""
+
+
+def test_buffered():
+    stream = io.StringIO()
+    sink = output.BufferedSink(stream, limit=6)
+    with output.using(sink):
+        parse("1 print 22 print prog2").evaluate({})
+        assert stream.getvalue() == ""
+        # la terza riga porta il totale a 7 caratteri: le righe vengono scritte insieme
+        parse("333 print").evaluate({})
+        assert stream.getvalue() == "22\n1\n333\n"
+        parse("4 print").evaluate({})
+        assert stream.getvalue() == "22\n1\n333\n"
+    assert stream.getvalue() == "22\n1\n333\n4\n"
+    assert sink.lines == [] and sink.size == 0
+
+
+def test_flush_on_error():
+    stream = io.StringIO()
+    with pytest.raises(ZeroDivisionError):
+        with output.using(output.BufferedSink(stream)):
+            parse("0 x / x print prog2").evaluate({"x": 1})
+    assert stream.getvalue() == "1\n"
+
+
+def test_formatted_when_printed():
+    # l'array modificato dopo print non cambia il testo, ma i valori passati a callback sono gli oggetti stampati
+    values = []
+    env = {"a": [1]}
+    program = parse("5 0 a setv a print prog2")
+    with output.using(output.TextSink()) as sink:
+        program.evaluate(env)
+    with output.using(output.CallbackSink(values.append)):
+        program.evaluate(env)
+    assert sink.getvalue() == "[1]\n"
+    assert values == [[5]] and values[0] is env["a"]
+
+
+def test_generator():
+    received = []
+
+    def consumer():
+        try:
+            while True:
+                received.append((yield))
+        finally:
+            received.append("chiuso")
+
+    with output.using(output.GeneratorSink(consumer()), close=True):
+        parse("2 print 1 print prog2").evaluate({})
+    assert received == [1, 2, "chiuso"]
+
+
+def test_null_and_nesting(capsys):
+    outer = output.TextSink()
+    with output.using(outer):
+        with output.using(output.NullSink()):
+            parse("1 print").evaluate({})
+        assert output.current() is outer
+        parse("2 print").evaluate({})
+    assert outer.getvalue() == "2\n"
+    assert output.current() is output._default
+    assert capsys.readouterr().out == ""
+
+
+def test_threads():
+    # ogni thread scrive nella propria destinazione
+    results = {}
+    barrier = threading.Barrier(4)
+
+    def work(n):
+        with output.using(output.TextSink()) as sink:
+            barrier.wait()
+            parse("i print 200 0 i for").evaluate({})
+        results[n] = sink.getvalue()
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    expected = "".join(f"{i}\n" for i in range(200))
+    assert results == {n: expected for n in range(4)}
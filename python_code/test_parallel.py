@@ -0,0 +1,91 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test della valutazione di molti programmi su un pool di processi (parallel.py): stessi risultati, errori e output
+della valutazione in questo processo, nell'ordine dei programmi.
+
+    python3 -m pytest test_parallel.py
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import parallel
+from expressions import Addition, MissingVariableException, ZeroDivisionError, d
+
+
+PROGRAMS = [
+    ("x 1 +", {"x": 1}),
+    ("0 1 /", {}),                                  # ZeroDivisionError
+    ("y", {}),                                      # MissingVariableException
+    ("1 +", {}),                                    # errore del parser
+    ("i print 3 0 i for", {}),
+    ("s i + s setq 100 0 i for  0 s setq  s alloc  prog3", {}),
+    ("a 0 +  i 0 + i a setv 4 0 i for  4 a valloc  prog3", {"k": [1, 2]}),
+] * 3
+
+
+def summary(result):
+    # valore o tipo dell'eccezione, output e ambiente finale
+    outcome = ("valore", result.value) if result.ok else ("eccezione", type(result.error))
+    return outcome, result.output, result.env
+
+
+def test_same_as_serial():
+    serial = parallel.evaluate_many(PROGRAMS, workers=1)
+    pooled = parallel.evaluate_many(PROGRAMS, workers=2, chunksize=2)
+    assert [summary(result) for result in pooled] == [summary(result) for result in serial]
+    assert summary(serial[0]) == (("valore", 2), "", {"x": 1})
+    assert summary(serial[4])[1] == "0\n1\n2\n"
+
+
+def test_errors():
+    results = parallel.evaluate_many(PROGRAMS[:4], workers=2, chunksize=1)
+    assert results[0].ok and results[0].result() == 2
+    assert type(results[1].error) is ZeroDivisionError
+    assert type(results[2].error) is MissingVariableException
+    assert not results[3].ok
+    with pytest.raises(ZeroDivisionError):
+        results[1].result()
+
+
+def test_envs_not_modified():
+    env = {"x": 1}
+    results = parallel.evaluate_many([("x 1 + x setq", env)] * 2, workers=2)
+    assert env == {"x": 1}
+    assert [result.env for result in results] == [{"x": 2}, {"x": 2}]
+    results = parallel.evaluate_many([("x 1 + x setq", env)], workers=1)
+    assert env == {"x": 1} and results[0].env == {"x": 2}
+
+
+def test_iter_results():
+    indexes = sorted(index for index, _ in parallel.iter_results(PROGRAMS, workers=2, chunksize=3))
+    assert indexes == list(range(len(PROGRAMS)))
+
+
+def test_executor():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        results = parallel.evaluate_many(PROGRAMS, workers=2, executor=executor)
+        again = parallel.evaluate_many(PROGRAMS, workers=2, executor=executor)   # il pool resta utilizzabile
+    assert [summary(result) for result in results] == [summary(result) for result in again]
+
+
+class Concatenation(Addition):
+    # operazione del dizionario personalizzato: definita a livello di modulo, quindi i processi la trovano
+    __slots__ = ()
+
+    def op(self, x, y):
+        return f"{x}{y}"
+
+
+def test_dispatch():
+    dispatch = dict(d, **{"+": Concatenation})
+    results = parallel.evaluate_many([("1 2 +", {})] * 4, dispatch, workers=2)
+    assert [result.value for result in results] == ["21"] * 4   # gli argomenti sono in ordine inverso: "a b +" è b + a
+
+
+def test_transferable():
+    # un risultato che non si può mandare al processo principale diventa un errore con lo stesso output
+    result = parallel._transferable(parallel.ProgramResult(lambda: None, output="testo"))
+    assert not result.ok and result.output == "testo"
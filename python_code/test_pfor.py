@@ -0,0 +1,102 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test dei cicli pfor (pfor.py): stesso risultato del ciclo for, lista sostituita da uno SharedArray che si comporta
+come la lista, e statistiche delle esecuzioni raccolte solo nel blocco with di collect.
+
+    python3 -m pytest test_pfor.py
+"""
+
+import copy
+import pickle
+
+import pytest
+
+import pfor
+import vectorize
+from expressions import Expression, ZeroDivisionError, d
+
+
+pytestmark = pytest.mark.skipif(pfor.shared_memory is None, reason="memoria condivisa non disponibile")
+
+PROGRAM = "nop  7 i i * % i a setv 64 0 i LOOP  64 a valloc  prog3"
+
+
+@pytest.fixture(autouse=True)
+def workers(monkeypatch):
+    # due processi anche su una macchina con un solo core
+    monkeypatch.setattr(pfor, "workers", 2)
+
+
+def evaluate(program, env):
+    return Expression.from_program(program, d).evaluate(env)
+
+
+def test_same_result():
+    expected, found = {}, {}
+    evaluate(PROGRAM.replace("LOOP", "for"), expected)
+    with pfor.collect() as statistics:
+        evaluate(PROGRAM.replace("LOOP", "pfor"), found)
+    assert statistics.parallel == 1
+    assert found == expected
+
+
+def test_shared_array():
+    # dopo il pfor parallelo l'array è uno SharedArray con gli stessi elementi, per tutti i nomi che lo contengono
+    values = [0] * 64
+    env = {"a": values, "b": values}
+    evaluate("i 2 * i a setv 64 0 i pfor", env)
+    expected = [2 * i for i in range(64)]
+    assert type(env["a"]) is pfor.SharedArray and env["b"] is env["a"]
+    assert env["a"] == expected and list(env["a"]) == expected and len(env["a"]) == 64
+    assert env["a"][3] == 6 and env["a"][-1] == 126 and env["a"][1:3] == [2, 4]
+    assert str(env["a"]) == str(expected)
+    assert type(copy.copy(env["a"])) is list and pickle.loads(pickle.dumps(env["a"])) == expected
+    with pytest.raises(IndexError):
+        env["a"][64]
+    # tipi diversi dagli interi a 64 bit
+    evaluate("4 3 / 0 a setv 70 2 ** 1 a setv prog2", env)
+    assert env["a"][:3] == [0.75, 2 ** 70, 4]
+
+
+def test_shared_array_operations():
+    # operazioni sugli array, setv e cicli vettorizzati continuano a funzionare sull'array spostato da pfor
+    env = {}
+    evaluate(PROGRAM.replace("LOOP", "pfor"), env)
+    assert type(env["a"]) is pfor.SharedArray
+    assert evaluate("a vsum", env) == sum(i * i % 7 for i in range(64))
+    evaluate("5 a vfill", env)
+    assert env["a"] == [5] * 64
+    tree, vectorizer = vectorize.vectorize_loops(Expression.from_program("i 1 + i a setv 64 0 i for", d))
+    if vectorizer.vectorized:
+        with vectorize.collect() as statistics:
+            tree.evaluate(env)
+        assert statistics.runs == 1
+    else:
+        tree.evaluate(env)
+    assert env["a"] == list(range(1, 65))
+
+
+def test_error_undone():
+    # un'iterazione che solleva un'eccezione: le scritture dei processi vengono annullate e il ciclo eseguito in
+    # sequenza, con la stessa eccezione e le stesse scritture parziali del for
+    program = "i 40 - i / i a setv 64 0 i LOOP"
+    expected, found = {"a": [0] * 64}, {"a": [0] * 64}
+    with pytest.raises(ZeroDivisionError):
+        evaluate(program.replace("LOOP", "for"), expected)
+    with pfor.collect() as statistics, pytest.raises(ZeroDivisionError):
+        evaluate(program.replace("LOOP", "pfor"), found)
+    assert found == expected
+    assert statistics.serial == 1 and list(statistics.reasons.values()) == ["un'iterazione ha sollevato un'eccezione"]
+
+
+def test_statistics():
+    tree = Expression.from_program("i 0 + i a setv n 0 + 0 i pfor", d)
+    with pfor.collect() as statistics:
+        tree.evaluate({"a": [0] * 64, "n": 64})
+        tree.evaluate({"a": [0] * 64, "n": 4})
+    assert (statistics.parallel, statistics.serial) == (1, 1)
+    assert statistics.reasons == {tree: "troppo poche iterazioni"}
+    tree.evaluate({"a": [0] * 64, "n": 4})
+    assert statistics.serial == 1
+    assert not hasattr(tree, "__dict__")
@@ -0,0 +1,91 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test del profiler nodo per nodo (profiler.py): stesso valore ed effetti di evaluate, conteggi esatti delle
+valutazioni e delle chiamate, tempi coerenti ed esportazione JSON.
+
+    python3 -m pytest test_profiler.py
+"""
+
+import json
+
+import pytest
+
+import profiler
+from expressions import Expression, ZeroDivisionError, d
+from tree import walk
+
+
+def counts(profile):
+    # numero di valutazioni per posizione del nodo nell'albero
+    return {stats.index: stats.count for stats in profile.stats.values() if stats.index is not None}
+
+
+def test_value_and_env():
+    program = "s 0 +  s i + s setq 10 0 i for  0 s setq  s alloc  prog4"
+    tree = Expression.from_program(program, d)
+    expected, env = {}, {}
+    value, profile = profiler.profile(tree, env)
+    assert value == tree.evaluate(expected) == 45 and env == expected
+
+
+def test_counts():
+    tree = Expression.from_program("s i + s setq 10 0 i for  0 s setq  s alloc  prog3", d)
+    _, profile = profiler.profile(tree, {})
+    nodes = list(walk(tree))
+    found = counts(profile)
+    for index, node in enumerate(nodes):
+        text = str(node)
+        if text.startswith("setq((+ s i)"):
+            assert found[index] == 10          # corpo del ciclo
+        elif text.startswith("for("):
+            assert found[index] == 1
+    assert found[0] == 1
+    assert profile.ranking("count")[0].count == 10
+
+
+def test_calls():
+    tree = Expression.from_program("f call f call + 3 0 i for  x 1 + f desub  0 x setq  x alloc  prog4", d)
+    _, profile = profiler.profile(tree, {})
+    assert profile.calls == {"f": 6}
+    assert "chiamate: f=6" in profile.report()
+
+
+def test_accumulates():
+    tree = Expression.from_program("1 2 +", d)
+    profile = profiler.Profiler()
+    for _ in range(3):
+        assert profile.run(tree, {}) == 3
+    assert counts(profile)[0] == 3
+
+
+def test_times():
+    tree = Expression.from_program("s i i * + s setq 2000 0 i for  0 s setq  s alloc  prog3", d)
+    _, profile = profiler.profile(tree, {})
+    root = profile.stats[id(tree)]
+    assert 0 <= root.own <= root.total <= profile.elapsed
+    for stats in profile.stats.values():
+        assert stats.own >= 0 and stats.total >= 0 and stats.active == 0
+    assert sum(stats.own for stats in profile.stats.values()) == pytest.approx(root.total, rel=0.05)
+
+
+def test_exception():
+    # l'eccezione arriva al chiamante e i nodi interrotti vengono chiusi
+    tree = Expression.from_program("0 x / 5 0 i for", d)
+    profile = profiler.Profiler()
+    with pytest.raises(ZeroDivisionError):
+        profile.run(tree, {"x": 1})
+    assert all(stats.active == 0 for stats in profile.stats.values())
+    assert counts(profile)[0] == 1
+
+
+def test_json(tmp_path):
+    tree = Expression.from_program("f call x 1 + f desub prog2", d)
+    _, profile = profiler.profile(tree, {"x": 1})
+    path = tmp_path / "profilo.json"
+    text = profile.to_json(path, key="count")
+    data = json.loads(path.read_text())
+    assert data == json.loads(text)
+    assert data["calls"] == {"f": 1}
+    assert {"index", "type", "node", "count", "total", "self"} <= set(data["nodes"][0])
+    assert [node["count"] for node in data["nodes"]] == sorted((node["count"] for node in data["nodes"]), reverse=True)
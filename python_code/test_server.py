@@ -0,0 +1,78 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test del server di valutazione (server.py): sessioni, errori e rifiuto delle richieste oltre max_pending, anche
+quando sono tutte sulla stessa sessione.
+
+    python3 -m pytest test_server.py
+"""
+
+import asyncio
+
+import server
+
+
+# ciclo abbastanza lungo da tenere occupato il processo mentre arrivano le altre richieste
+SLOW = "s i + s setq 300000 0 i for  s alloc  prog2"
+
+
+def run(test, workers=1, max_pending=server.MAX_PENDING):
+    # avvia un server, esegue test(server, host, port) e chiude il server
+    async def main():
+        evaluation = server.EvaluationServer(workers, max_pending=max_pending)
+        await evaluation.start_tcp()
+        try:
+            return await test(evaluation, *evaluation.address[:2])
+        finally:
+            await evaluation.close()
+    return asyncio.run(main())
+
+
+def test_sessions():
+    async def test(evaluation, host, port):
+        first = await server.Client.connect_tcp(host, port)
+        second = await server.Client.connect_tcp(host, port)
+        # ambiente della connessione
+        assert (await first.request("x alloc"))["ok"]
+        assert (await first.request("5 x setq"))["value"] == 5
+        missing = await second.request("x 1 +")
+        assert not missing["ok"] and missing["error"]["type"] == "MissingVariableException"
+        # sessione con nome, condivisa tra connessioni
+        await first.request("n alloc", session="shared")
+        await first.request("7 n setq", session="shared")
+        assert (await second.request("n 1 +", session="shared"))["value"] == 8
+        printed = await second.request("n print", session="shared")
+        assert printed["output"] == "7\n"
+        assert (await second.reset("shared"))["ok"]
+        assert not (await second.request("n", session="shared"))["ok"]
+        for client in (first, second):
+            await client.close()
+    run(test)
+
+
+def test_busy_same_session():
+    # una sola sessione: le richieste in attesa del lock della sessione contano per max_pending
+    async def test(evaluation, host, port):
+        clients = [await server.Client.connect_tcp(host, port) for _ in range(6)]
+        responses = await asyncio.gather(*(client.request(SLOW, session="one") for client in clients))
+        busy = [response for response in responses if not response["ok"]]
+        assert busy and all(response["error"]["type"] == "Busy" for response in busy)
+        assert len(responses) - len(busy) <= 1 + evaluation.max_pending
+        stats = await clients[0].stats()
+        assert stats["rejected"] == len(busy)
+        assert evaluation.pending == 0
+        # dopo il rifiuto la sessione continua a funzionare
+        assert (await clients[0].request("s 0 +", session="one"))["ok"]
+        for client in clients:
+            await client.close()
+    run(test, max_pending=2)
+
+
+def test_steps():
+    async def test(evaluation, host, port):
+        client = await server.Client.connect_tcp(host, port)
+        response = await client.request("x 1 + x setq 1 while  0 x setq  x alloc prog3", steps=1000)
+        assert not response["ok"] and response["error"]["type"] == "BudgetExceeded"
+        assert (await client.stats())["interrupted"] == 1
+        await client.close()
+    run(test)
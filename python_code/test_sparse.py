@@ -0,0 +1,125 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test degli array sparsi (sparse.py): letture, scritture, eccezioni e operazioni su interi array devono dare gli
+stessi risultati della lista [0] * n; gli operatori delle liste sollevano TypeError.
+
+    python3 -m pytest test_sparse.py
+"""
+
+import copy
+
+import pytest
+
+import sparse
+from sparse import SparseArray
+from expressions import Expression, InvalidIndexError, d
+
+
+def run(program, env):
+    return Expression.from_program(program, d).evaluate(env)
+
+
+def both(n):
+    # lista e array sparso con gli stessi elementi
+    return [0] * n, SparseArray(n)
+
+
+def test_indexes():
+    values, array = both(6)
+    for target in (values, array):
+        target[1] = 5
+        target[-1] = 2.5
+        target[2:4] = [7, 8]
+        target[::5] = [1, 3]
+    assert array == values and array.tolist() == values
+    assert array[1:5] == values[1:5] and array[-2] == values[-2]
+    assert array.items() == [(0, 1), (1, 5), (2, 7), (3, 8), (5, 3)]
+    for index in (6, -7):
+        with pytest.raises(IndexError):
+            array[index]
+        with pytest.raises(IndexError):
+            array[index] = 1
+    with pytest.raises(ValueError):
+        array[0:2] = [1]
+
+
+def test_default_not_stored():
+    array = SparseArray(4)
+    array[0] = 3
+    array[0] = 0
+    array[1] = 0.0
+    array[2] = False
+    assert array.items() == [(1, 0.0), (2, False)]
+    assert array.hidden() == 2 and array.first_hidden() == 0
+
+
+def test_list_operators():
+    array = SparseArray(3)
+    for operation in (lambda: array + [1], lambda: array * 2, lambda: array < [1]):
+        with pytest.raises(TypeError):
+            operation()
+    assert repr(array) == "[0, 0, 0]"
+    assert repr(SparseArray(100)) == "sparsearray(100 elementi, 0 scritti)"
+
+
+def test_copy():
+    array = SparseArray(3)
+    array[0] = 1
+    other = copy.copy(array)
+    other[0] = 2
+    assert array[0] == 1 and other[0] == 2
+
+
+def test_threshold(monkeypatch):
+    env = {}
+    run("10 a valloc", env)
+    assert type(env["a"]) is list
+    monkeypatch.setattr(sparse, "threshold", 10)
+    run("9 b valloc 10 a valloc prog2", env)
+    assert type(env["a"]) is SparseArray and type(env["b"]) is list
+    run("4 c svalloc", env)
+    assert type(env["c"]) is SparseArray
+
+
+# programma -> risultato da confrontare tra lista e array sparso
+PROGRAMS = [
+    "a vsum",
+    "a vmin",
+    "a vmax",
+    "a b vdot",
+    "4 3 / a vfill a vsum prog2",
+    "b 2 6 a 1 vcopy a vsum prog2",
+    "i 1 + i a setv 8 0 i for a vsum prog2",
+    "3 8 a setv",
+    "3 1 0 - a setv",
+]
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_same_as_lists(program):
+    results = []
+    for make in (list, sparse_copy):
+        env = {"a": make([0, 0, -4, 0, 0, 6, 0, 0]), "b": make([0, 0, 0, 2, 0, 0, 0, 0])}
+        try:
+            result = run(program, env)
+        except (IndexError, InvalidIndexError) as error:
+            result = type(error)
+        results.append((result, list(env["a"])))
+    assert results[0] == results[1]
+
+
+def sparse_copy(items):
+    result = SparseArray(len(items))
+    result[:] = items
+    return result
+
+
+def test_large():
+    # la memoria cresce con gli elementi scritti: un array di 10**12 elementi resta utilizzabile
+    env = {}
+    run("1 999999999999 a setv 2 0 a setv 1000000000000 a svalloc prog3", env)
+    assert len(env["a"]) == 10 ** 12 and len(env["a"].values) == 2
+    assert run("a vsum", env) == 3
+    assert run("a vmin", env) == 0
+    assert run("a vmax", env) == 2
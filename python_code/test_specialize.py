@@ -0,0 +1,87 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test delle deviazioni dei nodi specializzati (specialize.py): contate solo nel blocco with di collect, per il thread
+che lo esegue, senza modificare i nodi. I risultati sono confrontati con evaluate in test_engines.py.
+
+    python3 -m pytest test_specialize.py
+"""
+
+import threading
+
+import pytest
+
+import specialize
+from expressions import Expression, InvalidIndexError, d
+
+
+# programmi che leggono una variabile prima di assegnarla: il tipo inferito (int o bool) vale solo se anche il valore
+# dell'ambiente iniziale ha quel tipo
+PROGRAMS = {
+    "operation": "0 x setq x 1 + prog2",
+    "if": "0 3 > c setq 1 2 c if prog2",
+    "setv": "0 n setq 5 n a setv prog2",
+}
+
+
+def specialized(name):
+    special, specializer = specialize.specialize(Expression.from_program(PROGRAMS[name], d))
+    assert specializer.operations + specializer.conditions + specializer.indexes >= 1
+    return special
+
+
+def same(name, env):
+    # valuta il programma specializzato e quello originale su copie di env e confronta gli ambienti finali
+    expected, found = dict(env), dict(env)
+    Expression.from_program(PROGRAMS[name], d).evaluate(expected)
+    specialized(name).evaluate(found)
+    assert found == expected
+    return found
+
+
+def test_no_fallbacks():
+    with specialize.collect() as statistics:
+        assert same("operation", {"x": 2}) == {"x": 0}
+        same("if", {"c": True})
+        assert same("setv", {"n": 1, "a": [0, 0]})["a"] == [0, 5]
+    assert statistics.fallbacks == 0 and statistics.nodes == {}
+
+
+def test_fallbacks():
+    with specialize.collect() as statistics:
+        same("operation", {"x": 2.5})
+        same("if", {"c": 1})
+        with pytest.raises(InvalidIndexError):
+            specialized("setv").evaluate({"n": 1.0, "a": [0, 0]})
+    assert statistics.fallbacks == 3 and sorted(statistics.nodes.values()) == [1, 1, 1]
+
+
+def test_outside_collect():
+    # fuori da collect le deviazioni non vengono contate e i nodi specializzati non hanno attributi da modificare
+    special = specialized("operation")
+    special.evaluate({"x": 2.5})
+    with specialize.collect() as statistics:
+        pass
+    assert statistics.fallbacks == 0
+    for name in PROGRAMS:
+        for node in specialized(name).args:
+            assert not hasattr(node, "__dict__")
+
+
+def test_statistics_per_thread():
+    # lo stesso albero valutato da due thread: ognuno conta solo le proprie deviazioni
+    special = specialized("operation")
+    results = {}
+
+    def work(x):
+        with specialize.collect() as statistics:
+            for _ in range(200):
+                special.evaluate({"x": x})
+        results[x] = statistics.fallbacks
+
+    threads = [threading.Thread(target=work, args=(x,)) for x in (2, 2.5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {2: 0, 2.5: 200}
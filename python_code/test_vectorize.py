@@ -0,0 +1,69 @@
+# ELISA COCEANI SM3201340
+
+"""
+Test della vettorizzazione dei cicli for (vectorize.py): stesso risultato del ciclo originale, e statistiche delle
+esecuzioni raccolte solo nel blocco with di collect, per il thread che lo esegue.
+
+    python3 -m pytest test_vectorize.py
+"""
+
+import threading
+
+import pytest
+
+import vectorize
+from expressions import Expression, d
+
+
+pytest.importorskip("numpy")
+
+PROGRAM = "nop  i 3 * i a setv n 0 + 0 i for  10 a valloc  prog3"
+
+
+def test_same_result():
+    tree = Expression.from_program(PROGRAM, d)
+    vectorized, vectorizer = vectorize.vectorize_loops(tree)
+    assert vectorizer.vectorized == 1
+    for n in (0, 5, 10, 11, 2.5):
+        expected, found = {"n": n}, {"n": n}
+        try:
+            result = ("valore", tree.evaluate(expected))
+        except Exception as ex:
+            result = ("eccezione", type(ex))
+        try:
+            assert ("valore", vectorized.evaluate(found)) == result
+        except Exception as ex:
+            assert ("eccezione", type(ex)) == result
+        assert found == expected
+
+
+def test_statistics():
+    vectorized, _ = vectorize.vectorize_loops(Expression.from_program(PROGRAM, d))
+    loop = vectorized.args[1]
+    with vectorize.collect() as statistics:
+        vectorized.evaluate({"n": 10})
+        vectorized.evaluate({"n": 0})
+    assert (statistics.runs, statistics.fallbacks) == (1, 1)
+    assert statistics.reasons == {loop: "il ciclo non esegue iterazioni"}
+    # fuori da collect le esecuzioni non vengono contate e il nodo non ha attributi da modificare
+    vectorized.evaluate({"n": 10})
+    assert statistics.runs == 1
+    assert not hasattr(loop, "__dict__")
+
+
+def test_statistics_per_thread():
+    vectorized, _ = vectorize.vectorize_loops(Expression.from_program(PROGRAM, d))
+    results = {}
+
+    def work(n):
+        with vectorize.collect() as statistics:
+            for _ in range(50):
+                vectorized.evaluate({"n": n})
+        results[n] = (statistics.runs, statistics.fallbacks)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in (0, 10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {0: (0, 50), 10: (50, 0)}
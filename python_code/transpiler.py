@@ -0,0 +1,352 @@
+# ELISA COCEANI SM3201340
+
+import ast
+import weakref
+
+from expressions import (Expression, Variable, Constant, Operation,
+                         Addition, Subtraction, Division, Multiplication, Power, Modulus,
+                         Reciprocal, AbsoluteValue, Grater, GraterEq, Equal, NotEqual, Less, LessEq,
+                         Alloc, Valloc, Setq, Setv, Prog, If, While, For, DefSub, Call, Print, Nop,
+                         MissingVariableException, MissingFunctionException, InvalidIndexError, writable_array)
+from bytecode import divide, reciprocal
+import output
+import sparse
+
+
+# Operatori di Python usati per le operazioni binarie del dizionario d
+BINARY_OPERATORS = {Addition: "+", Subtraction: "-", Multiplication: "*", Power: "**", Modulus: "%",
+                    Grater: ">", GraterEq: ">=", Equal: "==", NotEqual: "!=", Less: "<", LessEq: "<="}
+
+# Funzioni usate per le operazioni che devono sollevare l'eccezione ZeroDivisionError del modulo expressions
+FUNCTIONS = {Division: "_divide", Reciprocal: "_reciprocal", AbsoluteValue: "abs"}
+
+# Oltre questa profondità le sottoespressioni vengono salvate in variabili temporanee
+# (il parser di Python non accetta espressioni con troppe parentesi annidate)
+MAX_DEPTH = 50
+
+# Oltre questo numero di blocchi annidati (for, while, if) il sottoalbero diventa una funzione separata
+# (Python non permette più di 20 blocchi annidati)
+MAX_BLOCKS = 15
+
+
+# Risultato di Transpiler.literal per il codice che non è un letterale
+_NOT_LITERAL = object()
+
+
+def _missing(exception, message):
+    raise exception(message)
+
+
+class Transpiler:
+    """
+    Il Transpiler traduce un albero di espressioni nel codice sorgente di una funzione Python f(env).
+
+    Le operazioni aritmetiche e i confronti diventano operatori di Python, For diventa un ciclo for su range,
+    While un ciclo while e If un costrutto if/else. Ogni metodo di traduzione emette le istruzioni necessarie
+    e ritorna una coppia (codice, profondità) con l'espressione Python che contiene il valore del nodo;
+    profondità zero indica un'espressione senza effetti (costante o variabile temporanea).
+
+    I controlli e i messaggi d'errore sono gli stessi dei metodi evaluate, così come l'ordine di valutazione:
+    se un argomento richiede delle istruzioni, gli argomenti precedenti vengono prima salvati in temporanee.
+    """
+    def __init__(self):
+        self.lines = []
+        self.indent = 1
+        self.blocks = 0
+        self.temps = 0
+        self.constants = {}     # nome -> oggetto, diventano globali della funzione generata
+
+    # --- funzioni di supporto ---
+
+    def emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    def temp(self, code=None):
+        # nuova variabile temporanea, eventualmente inizializzata con code
+        name = f"_t{self.temps}"
+        self.temps += 1
+        if code is not None:
+            self.emit(f"{name} = {code}")
+        return name
+
+    def const(self, value):
+        # costante nel codice: letterale se possibile, altrimenti globale della funzione
+        if value is None or type(value) in (bool, int, str) or (type(value) is float and value == value
+                                                                 and abs(value) != float("inf")):
+            return repr(value)
+        name = f"_k{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def name(self, key, message, exception="MissingVariableException"):
+        # lettura di una variabile dall'ambiente con lo stesso controllo dei metodi evaluate
+        key = self.const(key)
+        return (f"(env[{key}] if {key} in env else _missing({exception}, {message!r}))", 1)
+
+    def atomic(self, value):
+        # salva il valore in una temporanea se non è già un'espressione senza effetti
+        code, depth = value
+        return value if depth == 0 else (self.temp(code), 0)
+
+    def literal(self, value):
+        # valore del codice se è un letterale scritto nel sorgente (costanti di const), altrimenti _NOT_LITERAL
+        code, depth = value
+        if depth > 0 or code.startswith("_"):
+            return _NOT_LITERAL
+        return ast.literal_eval(code)
+
+    def discard(self, value):
+        # il valore non viene usato, ma l'espressione va comunque valutata (può sollevare eccezioni)
+        code, depth = value
+        if depth > 0:
+            self.emit(code)
+
+    def sequence(self, nodes, translate):
+        """
+        Traduce gli argomenti di un nodo rispettando l'ordine di valutazione.
+        translate è la funzione di traduzione (expr, value o lookup) per ogni argomento.
+        """
+        values = []
+        for node, method in zip(nodes, translate):
+            mark = len(self.lines)
+            value = method(node)
+            if len(self.lines) > mark:
+                # l'argomento ha emesso istruzioni: i precedenti vanno valutati prima
+                saved = []
+                for i, (code, depth) in enumerate(values):
+                    if depth > 0:
+                        name = f"_t{self.temps}"
+                        self.temps += 1
+                        saved.append("    " * self.indent + f"{name} = {code}")
+                        values[i] = (name, 0)
+                self.lines[mark:mark] = saved
+            values.append(value)
+        return values
+
+    def combine(self, code, *values):
+        # nuova espressione costruita dagli argomenti, salvata in una temporanea se troppo annidata
+        depth = 1 + max((d for _, d in values), default=0)
+        if depth > MAX_DEPTH:
+            return (self.temp(code), 0)
+        return (code, depth)
+
+    def block(self, node):
+        # True se il sottoalbero va tradotto come funzione separata per non superare il limite di blocchi annidati
+        return self.blocks >= MAX_BLOCKS
+
+    # --- traduzione dei nodi ---
+
+    def translate(self, tree):
+        code, _ = self.expr(tree)
+        self.emit(f"return {code}")
+        return "def _program(env):\n" + "\n".join(self.lines) + "\n"
+
+    # argomento valutato sempre con il suo metodo evaluate
+    def expr(self, node):
+        kind = type(node)
+
+        if kind is Constant:
+            return (self.const(node.value), 0)
+
+        if kind is Variable:
+            return self.name(node.name, f"La variabile {node.name} non è presente nell'ambiente")
+
+        if isinstance(node, Operation) and type(node).evaluate is Operation.evaluate:
+            args = self.sequence(node.args, [self.operand] * len(node.args))
+            codes = [code for code, _ in args]
+            if kind in BINARY_OPERATORS and len(args) == 2:
+                return self.combine(f"({codes[0]} {BINARY_OPERATORS[kind]} {codes[1]})", *args)
+            function = FUNCTIONS.get(kind) or self.const(node.op)
+            return self.combine(f"{function}({', '.join(codes)})", *args)
+
+        if kind in (If, While, For) and self.block(node):
+            return (f"{self.const(transpile(node))}(env)", 1)
+
+        if kind is Alloc:
+            self.emit(f"env[{self.const(node.var)}] = 0")
+            return ("None", 0)
+
+        if kind is Valloc:
+            size = self.atomic(self.expr(node.n))[0]
+            self.emit(f"if not isinstance({size}, int) or {size} < 0:")
+            self.emit(f"    raise InvalidIndexError(f\" La dimensione dell'array {{{size}}} deve essere un numero intero positivo\")")
+            self.emit(f"env[{self.const(node.x)}] = _allocate({size})")
+            return ("None", 0)
+
+        if kind is Setq:
+            value = self.atomic(self.value(node.expr))
+            key = self.const(node.x)
+            message = f" La variabile {node.x} non è presente nell'ambiente"
+            self.emit(f"if {key} not in env:")
+            self.emit(f"    raise MissingVariableException({message!r})")
+            self.emit(f"env[{key}] = {value[0]}")
+            return value
+
+        if kind is Setv:
+            index = self.atomic(self.lookup(node.n, "La variabile {} non è presente nell'ambiente"))[0]
+            key = self.const(str(node.x))
+            self.emit(f"if not isinstance({index}, int) or {index} < 0:")
+            self.emit(f"    raise InvalidIndexError(f\" La dimensione dell'array {{{index}}} deve essere un numero intero positivo\")")
+            message = f"L'array {node.x} non è presente nell'ambiente"
+            self.emit(f"if {key} not in env:")
+            self.emit(f"    raise MissingVariableException({message!r})")
+            self.emit(f"if {index} >= len(env[{key}]):")
+            self.emit("    raise IndexError('Errore: si sta provando ad accedere ad un indice che non esiste')")
+            value = self.atomic(self.expr(node.expr))
+            self.emit(f"_writable(env, {key})[{index}] = {value[0]}")
+            return value
+
+        if isinstance(node, Prog) and type(node).evaluate is Prog.evaluate:
+            # le espressioni vengono valutate in ordine inverso, il valore è quello dell'ultima valutata
+            args = node.args[::-1]
+            for arg in args[:-1]:
+                self.discard(self.expr(arg))
+            return self.expr(args[-1])
+
+        if kind is If:
+            cond = self.lookup(node.cond, "La varibaile {} non è presente nell'ambiente")
+            literal = self.literal(cond)
+            if literal is not _NOT_LITERAL:
+                # condizione costante: viene tradotto solo il ramo scelto ("3 is True" darebbe un SyntaxWarning)
+                return self.value(node.true if literal is True else node.false)
+            true_lines, true = self.capture(self.value, node.true)
+            false_lines, false = self.capture(self.value, node.false)
+            if not true_lines and not false_lines:
+                # rami senza istruzioni: espressione condizionale
+                return self.combine(f"({true[0]} if {cond[0]} is True else {false[0]})", cond, true, false)
+            result = self.temp()
+            self.emit(f"if {cond[0]} is True:")
+            self.lines += true_lines
+            self.emit(f"    {result} = {true[0]}")
+            self.emit("else:")
+            self.lines += false_lines
+            self.emit(f"    {result} = {false[0]}")
+            return (result, 0)
+
+        if kind is While:
+            mark = len(self.lines)
+            self.indent += 1
+            cond = self.expr(node.cond)
+            self.indent -= 1
+            if len(self.lines) == mark:
+                self.emit(f"while {cond[0]}:")
+            else:
+                self.lines.insert(mark, "    " * self.indent + "while True:")
+                self.emit(f"    if not {cond[0]}:")
+                self.emit("        break")
+            self.branch(self.expr, node.expr)
+            return ("None", 0)
+
+        if kind is For:
+            start, end = self.sequence([node.start, node.end], [self.value, self.value])
+            i = self.temp()
+            self.emit(f"for {i} in range({start[0]}, {end[0]}):")
+            self.indent += 1
+            self.emit(f"env[{self.const(str(node.i))}] = {i}")
+            self.indent -= 1
+            self.branch(self.expr, node.expr)
+            return ("None", 0)
+
+        if kind is DefSub:
+            self.emit(f"env[{self.const(str(node.var))}] = {self.const(node.expr)}")
+            return ("None", 0)
+
+        if kind is Call:
+            key = self.const(node.f)
+            message = f"La funzione {node.f} non è presente nell'ambiente"
+            self.emit(f"if {key} not in env:")
+            self.emit(f"    raise MissingFunctionException({message!r})")
+            return (self.temp(f"_call(env[{self.const(str(node.f))}], env)"), 0)
+
+        if kind is Print:
+            value = self.atomic(self.lookup(node.expr, "Valore mancante per la variabile '{}'"))
+            self.emit(f"_emit({value[0]})")
+            return value
+
+        if kind is Nop:
+            return ("None", 0)
+
+        # nodo sconosciuto (o valore che non è un'espressione): viene valutato dall'albero
+        return (self.temp(f"{self.const(node)}.evaluate(env)"), 0)
+
+    def capture(self, method, node):
+        # traduce il nodo come corpo di un blocco, ritorna le istruzioni emesse e il valore
+        lines = self.lines
+        self.lines = []
+        self.indent += 1
+        self.blocks += 1
+        value = method(node)
+        captured = self.lines
+        self.lines = lines
+        self.blocks -= 1
+        self.indent -= 1
+        return captured, value
+
+    def branch(self, method, node):
+        # corpo di un ciclo: il valore viene scartato
+        lines, value = self.capture(method, node)
+        self.lines += lines
+        self.indent += 1
+        self.discard(value)
+        if not lines and value[1] == 0:
+            self.emit("pass")
+        self.indent -= 1
+
+    # argomento valutato solo se è un'espressione, altrimenti usato così com'è
+    def value(self, node):
+        if isinstance(node, Expression):
+            return self.expr(node)
+        return (self.const(node), 0)
+
+    # argomento che può essere un'espressione, il nome di una variabile o una costante.
+    # message è il messaggio d'errore del nodo, {} viene sostituito con il nome della variabile
+    def lookup(self, node, message):
+        if isinstance(node, Expression):
+            return self.expr(node)
+        if isinstance(node, str):
+            return self.name(node, message.format(node))
+        return (self.const(node), 0)
+
+    def operand(self, node):
+        return self.lookup(node, "Manca il valore della variabile '{}")
+
+
+_subroutines = weakref.WeakKeyDictionary()
+
+
+def _call(body, env):
+    # esegue il corpo di una subroutine, tradotto una sola volta e poi riusato
+    try:
+        function = _subroutines[body]
+    except (KeyError, TypeError):
+        function = transpile(body)
+        try:
+            _subroutines[body] = function
+        except TypeError:
+            pass   # il corpo non supporta riferimenti deboli: non viene memorizzato
+    return function(env)
+
+
+def source(tree):
+    # codice sorgente Python generato per l'albero e costanti che usa
+    transpiler = Transpiler()
+    return transpiler.translate(tree), transpiler.constants
+
+
+def transpile(tree):
+    """
+    Traduce l'albero in una funzione Python f(env) compilata una sola volta con compile().
+    La funzione ritorna lo stesso valore di tree.evaluate(env); il sorgente è disponibile in f.source.
+    """
+    text, constants = source(tree)
+    namespace = {"_missing": _missing, "_divide": divide, "_reciprocal": reciprocal, "_call": _call,
+                 "_writable": writable_array, "_emit": output.emit,
+                 "_allocate": sparse.allocate, "MissingVariableException": MissingVariableException,
+                 "MissingFunctionException": MissingFunctionException,
+                 "InvalidIndexError": InvalidIndexError}
+    namespace.update(constants)
+    exec(compile(text, "<expression>", "exec"), namespace)
+    function = namespace["_program"]
+    function.source = text
+    function.tree = tree
+    return function
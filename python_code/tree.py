@@ -0,0 +1,84 @@
+# ELISA COCEANI SM3201340
+
+"""
+Funzioni di supporto per le passate che analizzano o trasformano gli alberi di espressioni.
+
+Gli argomenti di un nodo sono quelli passati al suo costruttore, nello stesso ordine:
+possono essere altri nodi, nomi di variabili (stringhe) o valori costanti.
+"""
+
+
+def arguments(node):
+    # argomenti del costruttore del nodo, lista vuota per le foglie e per i nodi sconosciuti
+    kind = type(node)
+    if isinstance(node, (Operation, Prog, ArrayOperation)):
+        return list(node.args)
+    if isinstance(node, Setq):
+        return [node.expr, node.x]
+    if isinstance(node, Setv):
+        return [node.expr, node.n, node.x]
+    if isinstance(node, If):
+        return [node.false, node.true, node.cond]
+    if isinstance(node, While):
+        return [node.expr, node.cond]
+    if isinstance(node, For):
+        return [node.expr, node.end, node.start, node.i]
+    if kind is DefSub:
+        return [node.expr, node.var]
+    if isinstance(node, Valloc):
+        return [node.n, node.x]
+    if isinstance(node, Alloc):
+        return [node.var]
+    if isinstance(node, Call):
+        return [node.f]
+    if kind is Print:
+        return [node.expr]
+    return []
+
+
+def is_node(value):
+    # True se il valore è un nodo dell'albero
+    return isinstance(value, Expression)
+
+
+def target(node):
+    # nome della variabile assegnata dal nodo (setq, alloc, valloc, desub, variabile del for), None altrimenti
+    if isinstance(node, (Setq, Valloc)):
+        return str(node.x)
+    if isinstance(node, (Alloc, DefSub)):
+        return str(node.var)
+    if isinstance(node, For):
+        return str(node.i)
+    return None
+
+
+def children(node):
+    # sottoalberi del nodo, esclusi nomi di variabili e costanti
+    return [arg for arg in arguments(node) if is_node(arg)]
+
+
+def rebuild(node, args):
+    # nuovo nodo dello stesso tipo con gli argomenti args; se non cambiano viene ritornato il nodo stesso
+    old = arguments(node)
+    if len(old) == len(args) and all(a is b for a, b in zip(old, args)):
+        return node
+    return type(node)(args)
+
+
+def walk(node):
+    # tutti i nodi dell'albero in ordine anticipato, senza ricorsione
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(children(node)))
+
+
+def size(node):
+    # numero di nodi dell'albero
+    return sum(1 for _ in walk(node))
+
+
+# Importato dopo le funzioni: expressions importa arrays e pfor, che importano queste funzioni (arrays attraverso batch)
+from expressions import (Expression, Operation, ArrayOperation, Alloc, Valloc, Setq, Setv, Prog,
+                         If, While, For, DefSub, Call, Print)
@@ -0,0 +1,207 @@
+# ELISA COCEANI SM3201340
+
+"""
+Vettorizzazione dei cicli for che riempiono un array.
+
+Un ciclo del tipo "espressione i x setv  fine inizio i for" scrive x[i] per ogni i dell'intervallo. Se l'espressione
+usa solo costanti, la variabile del ciclo e variabili che il ciclo non modifica, le iterazioni non dipendono l'una
+dall'altra e il ciclo può essere eseguito con una sola operazione NumPy su tutto l'intervallo (con BatchEvaluator).
+Nel linguaggio non esiste un'operazione che legge un elemento di un array: l'unico modo in cui un'iterazione può
+dipendere da un'altra è leggere l'array scritto dal ciclo, e in quel caso il ciclo non viene vettorizzato.
+
+Prima di eseguire il calcolo vettoriale vengono controllati i valori dell'ambiente (estremi, array, variabili);
+se qualcosa non va bene, o se un'iterazione solleverebbe un'eccezione, il ciclo viene eseguito un'iterazione alla volta
+come For.evaluate, con le stesse eccezioni e le stesse scritture parziali nell'array.
+
+I nodi non vengono modificati durante la valutazione, quindi lo stesso albero può essere valutato da più thread.
+Le esecuzioni vettoriali e quelle un'iterazione alla volta vengono contate solo nel blocco with di collect, per il
+thread che lo esegue:
+
+    with vectorize.collect() as statistics:
+        tree.evaluate(env)
+    print(statistics)
+"""
+
+import contextlib
+import threading
+
+from expressions import Expression, Variable, If, For, Setv, writable_array
+from tree import arguments, rebuild, is_node, walk
+import batch
+from batch import np
+from pfor import SharedArray
+
+
+def reads(expr):
+    # nomi delle variabili lette dall'espressione
+    names = set()
+    for node in walk(expr):
+        if type(node) is Variable:
+            names.add(node.name)
+        elif type(node) is If:
+            if isinstance(node.cond, str):
+                names.add(node.cond)
+        else:
+            names.update(arg for arg in getattr(node, "args", []) if isinstance(arg, str))
+    return names
+
+
+def analyze(loop):
+    # motivo per cui il ciclo non può essere vettorizzato, None se può esserlo
+    body = loop.expr
+    if type(body) is not Setv:
+        return "il corpo del ciclo non è un singolo setv"
+    i = str(loop.i)
+    if body.n != i:
+        return "l'indice di setv non è la variabile del ciclo"
+    if str(body.x) == i:
+        return "l'array scritto è la variabile del ciclo"
+    if not isinstance(body.expr, Expression):
+        return "il valore scritto da setv non è un'espressione"
+    reason = batch.unsupported(body.expr)
+    if reason is not None:
+        return reason
+    if str(body.x) in reads(body.expr):
+        return f"l'espressione legge l'array {body.x} scritto dal ciclo: le iterazioni non sono indipendenti"
+    if np is None:
+        return "numpy non è installato"
+    return None
+
+
+class Statistics:
+    """
+    Esecuzioni dei cicli vettorizzati nel blocco with di collect: runs e fallbacks contano le esecuzioni vettoriali e
+    quelle un'iterazione alla volta, reasons associa a ogni ciclo eseguito un'iterazione alla volta il motivo
+    dell'ultima esecuzione non vettoriale.
+    """
+    def __init__(self):
+        self.runs = 0
+        self.fallbacks = 0
+        self.reasons = {}
+
+    def __str__(self):
+        lines = [f"esecuzioni vettoriali: {self.runs}, un'iterazione alla volta: {self.fallbacks}"]
+        lines += [f"  {loop}: {reason}" for loop, reason in self.reasons.items()]
+        return "\n".join(lines)
+
+
+class _State(threading.local):
+    statistics = None   # Statistics del blocco collect in corso in questo thread
+
+
+_state = _State()
+
+
+@contextlib.contextmanager
+def collect():
+    # conta le esecuzioni dei cicli vettorizzati valutati da questo thread nel blocco with
+    previous = _state.statistics
+    _state.statistics = statistics = Statistics()
+    try:
+        yield statistics
+    finally:
+        _state.statistics = previous
+
+
+class VectorizedFor(For):
+    # Ciclo for che scrive x[i] = espressione, eseguito con NumPy quando i valori dell'ambiente lo permettono
+    __slots__ = ("name", "array", "reads")
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.name = str(self.i)
+        self.array = str(self.expr.x)
+        self.reads = reads(self.expr.expr) - {self.name}
+
+    def evaluate(self, env):
+        start = self.start.evaluate(env) if isinstance(self.start, Expression) else self.start
+        end = self.end.evaluate(env) if isinstance(self.end, Expression) else self.end
+
+        reason = self.vectorized(env, start, end)
+        statistics = _state.statistics
+        if reason is None:
+            if statistics is not None:
+                statistics.runs += 1
+            return
+        if statistics is not None:
+            statistics.fallbacks += 1
+            statistics.reasons[self] = reason
+        # stesso ciclo di For.evaluate, con start e end già valutati
+        for i in range(start, end):
+            env[self.name] = i
+            self.expr.evaluate(env)
+
+    def vectorized(self, env, start, end):
+        # esegue il ciclo con NumPy e ritorna None, oppure ritorna il motivo per cui non è possibile
+        if type(start) is not int or type(end) is not int or end >= batch.INT_LIMIT:
+            return "gli estremi del ciclo non sono interi"
+        if start >= end:
+            return "il ciclo non esegue iterazioni"
+        if start < 0:
+            return "l'indice iniziale è negativo"
+        # anche gli array spostati in memoria condivisa da pfor, che hanno gli stessi elementi della lista
+        if self.array not in env or type(env[self.array]) not in (list, SharedArray):
+            return f"{self.array} non è un array"
+        array = env[self.array]
+        if end > len(array):
+            return f"il ciclo supera la dimensione dell'array {self.array}"
+
+        rows = end - start
+        columns = {self.name: np.arange(start, end, dtype=np.int64)}
+        for name in self.reads:
+            if name not in env or not batch.scalar(env[name]):
+                return f"la variabile {name} non è presente o non è un numero"
+            columns[name] = np.full(rows, env[name])
+
+        evaluator = batch.BatchEvaluator(self.expr.expr, columns, rows)
+        with np.errstate(all="ignore"):
+            values, flags = evaluator.visit(self.expr.expr)
+        if flags.any():
+            return "alcune iterazioni sollevano un'eccezione o hanno un risultato diverso in NumPy"
+
+        # come setv: in un ambiente a livelli l'array condiviso viene copiato prima di essere modificato
+        writable_array(env, self.array)[start:end] = values.tolist()
+        env[self.name] = end - 1   # valore della variabile dopo l'ultima iterazione
+        return None
+
+
+class LoopVectorizer:
+    """
+    Passata che sostituisce i cicli for vettorizzabili con VectorizedFor.
+    Per ogni ciclo non vettorizzato reasons contiene il ciclo e il motivo.
+    L'albero originale non viene modificato.
+    """
+    def __init__(self):
+        self.vectorized = 0
+        self.reasons = []
+
+    def run(self, tree):
+        return self.visit(tree)
+
+    def visit(self, node):
+        if not is_node(node):
+            return node
+        node = rebuild(node, [self.visit(arg) for arg in arguments(node)])
+        if type(node) is For:
+            reason = analyze(node)
+            if reason is None:
+                self.vectorized += 1
+                return VectorizedFor(arguments(node))
+            self.reasons.append((node, reason))
+        return node
+
+    def __str__(self):
+        lines = [f"cicli vettorizzati: {self.vectorized}, non vettorizzati: {len(self.reasons)}"]
+        lines += [f"  {loop}: {reason}" for loop, reason in self.reasons]
+        return "\n".join(lines)
+
+
+def explain(tree):
+    # per ogni ciclo for dell'albero: (ciclo, motivo per cui non è vettorizzabile oppure None)
+    return [(node, analyze(node)) for node in walk(tree) if isinstance(node, For)]
+
+
+def vectorize_loops(tree):
+    # ritorna l'albero con i cicli vettorizzati e la passata con le statistiche
+    vectorizer = LoopVectorizer()
+    return vectorizer.run(tree), vectorizer